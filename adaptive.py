@@ -0,0 +1,296 @@
+"""Adaptive quiz mode: questions are weighted towards a user's weak spots.
+
+Each question gets the weight ``question_error * chapter_factor`` where both
+error rates come from the user's ``UserQuestionStats`` counts, smoothed so
+that unseen questions and chapters still get drawn:
+
+* ``question_error = (wrong + 1) / (served + 2)``
+* ``chapter_factor = 0.5 + (chapter_wrong + 1) / (chapter_served + 2)``
+
+Sampling is two-level: a chapter is drawn in proportion to its total
+weight, then a question inside it from a Fenwick tree of question errors.
+Drawn questions are zeroed for the rest of the quiz (no replacement) and
+restored afterwards, so building a quiz costs O(k * (log n + chapters)).
+
+Samplers are cached per user with LRU eviction.  They are updated in place
+when the same process records a submitted quiz, and rebuilt when the bank
+changes or the user's quiz count shows that another worker recorded one.
+"""
+import random
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, delete, insert, text, update
+
+from models import db, UserQuestionStats, UserStats
+
+
+class FenwickTree:
+    """Binary indexed tree over non-negative weights"""
+
+    def __init__(self, weights):
+        self.weights = list(weights)
+        self.size = len(self.weights)
+        self.tree = [0.0] * (self.size + 1)
+        for i, weight in enumerate(self.weights, start=1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.weights)
+        self._top_bit = 1 << (self.size.bit_length() - 1) if self.size else 0
+
+    def set(self, index, weight):
+        delta = weight - self.weights[index]
+        self.weights[index] = weight
+        self.total += delta
+        i = index + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def find(self, target):
+        """Index of the weight where the running sum first exceeds ``target``"""
+        position = 0
+        step = self._top_bit
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] <= target:
+                position = nxt
+                target -= self.tree[nxt]
+            step >>= 1
+        index = min(position, self.size - 1)
+        if self.weights[index] == 0:
+            # Float drift landed on a removed weight; take the nearest live one
+            live = [i for i, weight in enumerate(self.weights) if weight > 0]
+            index = min(live, key=lambda i: abs(i - index)) if live else index
+        return index
+
+
+def question_error(served, correct):
+    return (served - correct + 1) / (served + 2)
+
+
+def chapter_factor(served, correct):
+    return 0.5 + question_error(served, correct)
+
+
+class AdaptiveSampler:
+    """Per-user weighted sampler over one question bank snapshot"""
+
+    def __init__(self, snapshot, stats_version, counts):
+        self.snapshot = snapshot
+        self.stats_version = stats_version
+        self._lock = threading.Lock()
+        self.chapters = list(snapshot.positions_by_chapter)
+        self.positions = [snapshot.positions_by_chapter[c] for c in self.chapters]
+        # Question ID -> (chapter index, index inside that chapter)
+        self.location = {}
+        for ci, positions in enumerate(self.positions):
+            for li, position in enumerate(positions):
+                self.location[snapshot.ids[position]] = (ci, li)
+
+        self.counts = {}
+        self.chapter_counts = [[0, 0] for _ in self.chapters]
+        for question_id, served, correct in counts:
+            where = self.location.get(question_id)
+            if where is None:
+                continue
+            self.counts[question_id] = [served, correct]
+            self.chapter_counts[where[0]][0] += served
+            self.chapter_counts[where[0]][1] += correct
+
+        self.trees = []
+        for positions in self.positions:
+            weights = []
+            for position in positions:
+                served, correct = self.counts.get(snapshot.ids[position], (0, 0))
+                weights.append(question_error(served, correct))
+            self.trees.append(FenwickTree(weights))
+        self.factors = [chapter_factor(*counts) for counts in self.chapter_counts]
+
+    def sample(self, k):
+        """Return ``k`` distinct question payloads drawn by weight"""
+        with self._lock:
+            removed = []
+            picked = []
+            try:
+                for _ in range(min(k, len(self.snapshot))):
+                    chapter_weights = [
+                        factor * tree.total for factor, tree in zip(self.factors, self.trees)
+                    ]
+                    target = random.random() * sum(chapter_weights)
+                    ci = None
+                    for index, weight in enumerate(chapter_weights):
+                        if weight <= 0:
+                            continue
+                        ci = index
+                        if target < weight:
+                            break
+                        target -= weight
+                    tree = self.trees[ci]
+                    li = tree.find(random.random() * tree.total)
+                    removed.append((ci, li, tree.weights[li]))
+                    tree.set(li, 0.0)
+                    picked.append(self.positions[ci][li])
+            finally:
+                for ci, li, weight in reversed(removed):
+                    self.trees[ci].set(li, weight)
+        return [self.snapshot.payloads[position] for position in picked]
+
+    def update(self, outcomes, stats_version):
+        """Apply the outcomes of a submitted quiz to the weights"""
+        with self._lock:
+            for question_id, _, is_correct, _ in outcomes:
+                where = self.location.get(question_id)
+                if where is None:
+                    continue
+                ci, li = where
+                counts = self.counts.setdefault(question_id, [0, 0])
+                counts[0] += 1
+                self.chapter_counts[ci][0] += 1
+                if is_correct:
+                    counts[1] += 1
+                    self.chapter_counts[ci][1] += 1
+                self.trees[ci].set(li, question_error(*counts))
+                self.factors[ci] = chapter_factor(*self.chapter_counts[ci])
+            self.stats_version = stats_version
+
+
+class AdaptiveCache:
+    """LRU cache of per-user samplers"""
+
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._samplers = OrderedDict()
+
+    def init_app(self, app):
+        self.max_size = app.config["ADAPTIVE_CACHE_SIZE"]
+
+    def get(self, user_id, snapshot):
+        stats_version = UserStats.for_user(user_id).total_quizzes
+        with self._lock:
+            sampler = self._samplers.get(user_id)
+            if sampler is not None:
+                self._samplers.move_to_end(user_id)
+        if (
+            sampler is not None
+            and sampler.snapshot is snapshot
+            and sampler.stats_version == stats_version
+        ):
+            return sampler
+
+        counts = db.session.execute(
+            db.select(
+                UserQuestionStats.question_id,
+                UserQuestionStats.times_served,
+                UserQuestionStats.times_correct,
+            ).where(UserQuestionStats.user_id == user_id)
+        ).all()
+        sampler = AdaptiveSampler(snapshot, stats_version, counts)
+        with self._lock:
+            self._samplers[user_id] = sampler
+            self._samplers.move_to_end(user_id)
+            while len(self._samplers) > self.max_size:
+                self._samplers.popitem(last=False)
+        return sampler
+
+    def update(self, user_id, outcomes, stats_version):
+        """Update a cached sampler after the user's quiz count went up by one"""
+        with self._lock:
+            sampler = self._samplers.get(user_id)
+        if sampler is None:
+            return
+        if sampler.stats_version == stats_version - 1:
+            sampler.update(outcomes, stats_version)
+        else:
+            self.evict(user_id)
+
+    def evict(self, user_id):
+        with self._lock:
+            self._samplers.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._samplers.clear()
+
+
+adaptive_cache = AdaptiveCache()
+
+
+def record_attempt(user_id, outcomes, stats_version):
+    """Add a scored quiz to the user's per-question counts (caller commits)"""
+    counts = {}
+    for question_id, _, is_correct, _ in outcomes:
+        served, correct = counts.get(question_id, (0, 0))
+        counts[question_id] = (served + 1, correct + int(is_correct))
+    if not counts:
+        return
+
+    existing = set(
+        db.session.execute(
+            db.select(UserQuestionStats.question_id).where(
+                UserQuestionStats.user_id == user_id,
+                UserQuestionStats.question_id.in_(list(counts)),
+            )
+        ).scalars()
+    )
+    missing = [
+        {"user_id": user_id, "question_id": q_id, "times_served": 0, "times_correct": 0}
+        for q_id in counts
+        if q_id not in existing
+    ]
+    if missing:
+        db.session.execute(insert(UserQuestionStats), missing)
+
+    table = UserQuestionStats.__table__
+    db.session.execute(
+        update(table)
+        .where(
+            table.c.user_id == bindparam("b_user_id"),
+            table.c.question_id == bindparam("b_question_id"),
+        )
+        .values(
+            times_served=table.c.times_served + bindparam("b_served"),
+            times_correct=table.c.times_correct + bindparam("b_correct"),
+        ),
+        [
+            {"b_user_id": user_id, "b_question_id": q_id, "b_served": s, "b_correct": c}
+            for q_id, (s, c) in counts.items()
+        ],
+    )
+    adaptive_cache.update(user_id, outcomes, stats_version)
+
+
+def reset_user(user_id):
+    """Forget a user's per-question history (caller commits)"""
+    db.session.execute(delete(UserQuestionStats).where(UserQuestionStats.user_id == user_id))
+    adaptive_cache.evict(user_id)
+
+
+def rebuild_user_question_stats():
+    """Recompute all per-user question counts from attempt_question rows.
+
+    Done with a single INSERT ... SELECT ... GROUP BY inside the database.
+    Attempts still stored as legacy JSON snapshots are not included; run
+    scripts/migrate_attempt_questions.py first.
+    """
+    db.session.execute(delete(UserQuestionStats))
+    db.session.execute(
+        text(
+            """
+            INSERT INTO user_question_stats
+                (user_id, question_id, times_served, times_correct)
+            SELECT qa.user_id, aq.question_id, COUNT(*),
+                   SUM(CASE WHEN aq.answer = qr.correct_answer THEN 1 ELSE 0 END)
+            FROM attempt_question aq
+            JOIN quiz_attempt qa ON qa.id = aq.attempt_id
+            JOIN question_revision qr ON qr.id = aq.revision_id
+            WHERE qa.is_completed
+            GROUP BY qa.user_id, aq.question_id
+            """
+        )
+    )
+    db.session.commit()
+    adaptive_cache.clear()
@@ -0,0 +1,142 @@
+"""Write-coalescing journal for quiz answers.
+
+The quiz page sends answers in batches to ``/submit_answers``.  Instead of
+committing every batch, each worker process buffers the newest answer per
+(attempt, question) in memory and writes everything it has collected in a
+single transaction every ``ANSWER_JOURNAL_FLUSH_SECONDS``, when a quiz is
+submitted and when the process exits.
+
+Every answer carries a client-side sequence number that is stored with it,
+so a late flush from another worker can never overwrite a newer answer.
+Answers are also re-sent by the client with ``/submit_quiz``, so nothing
+buffered in another worker can be lost when a quiz is scored.
+"""
+import atexit
+import os
+import threading
+import time
+
+from sqlalchemy import bindparam, exists, or_, update
+
+from db_profile import database_profile
+from models import db, AttemptQuestion, QuizAttempt
+
+answer_question = AttemptQuestion.__table__
+
+UPDATE_ANSWER = (
+    update(answer_question)
+    .where(
+        answer_question.c.attempt_id == bindparam("b_attempt_id"),
+        answer_question.c.question_id == bindparam("b_question_id"),
+        or_(
+            answer_question.c.answer_seq.is_(None),
+            answer_question.c.answer_seq < bindparam("b_seq"),
+        ),
+        # Answers arriving after the quiz was scored are ignored
+        ~exists().where(
+            QuizAttempt.id == answer_question.c.attempt_id,
+            QuizAttempt.is_completed.is_(True),
+        ),
+    )
+    .values(answer=bindparam("b_answer"), answer_seq=bindparam("b_seq"))
+)
+
+
+class AnswerJournal:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        # attempt_id -> {question_id: (seq, answer)}
+        self._pending = {}
+        self._flusher_pid = None
+        self.app = None
+        self.flush_interval = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config["ANSWER_JOURNAL_FLUSH_SECONDS"]
+        atexit.register(self.flush_all)
+
+    def record(self, attempt_id, answers):
+        """Buffer ``(question_id, answer, seq)`` entries for an attempt.
+
+        Only the entry with the highest sequence number is kept per question.
+        """
+        with self._lock:
+            pending = self._pending.setdefault(attempt_id, {})
+            for question_id, answer, seq in answers:
+                current = pending.get(question_id)
+                if current is None or seq > current[0]:
+                    pending[question_id] = (seq, answer)
+        self._ensure_flusher()
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(answers) for answers in self._pending.values())
+
+    def flush(self, attempt_id):
+        """Write the buffered answers of one attempt; the caller commits"""
+        with self._lock:
+            pending = self._pending.pop(attempt_id, None)
+        if pending:
+            self._apply({attempt_id: pending})
+
+    def flush_all(self):
+        """Write every buffered answer in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        with self.app.app_context():
+            try:
+                database_profile.run_write(self._write, pending)
+            except Exception:
+                db.session.rollback()
+                for attempt_id, answers in pending.items():
+                    self.record(
+                        attempt_id,
+                        ((q_id, answer, seq) for q_id, (seq, answer) in answers.items()),
+                    )
+                raise
+        return sum(len(answers) for answers in pending.values())
+
+    def _write(self, pending):
+        self._apply(pending)
+        db.session.commit()
+
+    def _apply(self, pending):
+        rows = [
+            {
+                "b_attempt_id": attempt_id,
+                "b_question_id": question_id,
+                "b_answer": answer,
+                "b_seq": seq,
+            }
+            for attempt_id, answers in pending.items()
+            for question_id, (seq, answer) in answers.items()
+        ]
+        db.session.execute(UPDATE_ANSWER, rows)
+
+    def _ensure_flusher(self):
+        # Checked by PID so that forked workers start their own thread
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        thread = threading.Thread(target=self._run, name="answer-journal", daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush_all()
+            except Exception as e:
+                print(f"Error flushing answer journal: {e}")
+
+
+answer_journal = AnswerJournal()
@@ -8,6 +8,8 @@ from flask import (
     jsonify,
     session,
     abort,
+    make_response,
+    stream_with_context,
 )
 from flask_login import (
     LoginManager,
@@ -17,21 +19,50 @@ from flask_login import (
     current_user,
 )
 from functools import wraps
-from models import db, User, Question, QuizAttempt
+from models import db, User, Question, QuizAttempt, UserStats
+from question_bank import question_bank, mark_questions_changed
+from question_import import import_questions_file
+from question_upload import question_uploads, UploadError, UploadExpired, UploadChanged
+from question_search import question_search
+from answer_journal import answer_journal
+from pagination import paginate_attempts, paginate_by_id
+import question_analytics
+import exports
+import leaderboard
+import spaced_repetition
+import adaptive
+from adaptive import adaptive_cache
+from static_assets import static_assets, DirectoryListing, send_study_file
+from metrics import request_metrics
+from db_profile import database_profile, write_transaction
+from user_cache import user_cache, mark_users_changed
+from password_hashing import password_hasher, login_limiter, HashingBusy
 from config import Config
 import json
-import random
+import math
 from datetime import datetime
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import generate_password_hash
 import os
-from flask import send_from_directory
 import pytz
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Part of the /api/quiz ETag; bump when the shape of that payload changes
+QUIZ_PAYLOAD_VERSION = 1
+
 # Initialize extensions
+database_profile.init_app(app)
 db.init_app(app)
+answer_journal.init_app(app)
+adaptive_cache.init_app(app)
+static_assets.init_app(app)
+request_metrics.init_app(app, db)
+user_cache.init_app(app)
+password_hasher.init_app(app)
+login_limiter.init_app(app)
+question_uploads.init_app(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = "login"
@@ -48,7 +79,7 @@ def inject_timezone_functions():
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    return user_cache.get(int(user_id))
 
 
 def superuser_required(f):
@@ -82,37 +113,26 @@ def to_athens_time(utc_datetime):
     return athens_time
 
 
+def check_exam_blueprint():
+    """Warn when the exam blueprint cannot be served from the question bank"""
+    blueprint = app.config["EXAM_BLUEPRINT"]
+    if not blueprint:
+        return
+    problems = question_bank.snapshot().blueprint_problems(
+        blueprint, app.config["QUESTIONS_PER_QUIZ"]
+    )
+    for problem in problems:
+        print(f"WARNING: {problem}")
+    if problems:
+        print("Quizzes will draw questions uniformly until the blueprint is fixed.")
+
+
 def load_questions_from_file():
     """Load questions from JSON file into database"""
     try:
-        with open("questions.json", "r", encoding="utf-8") as f:
-            questions_data = json.load(f)
-
-        count = 0
-        for q_data in questions_data:
-            # Format question text to include chapter and relative question number
-            chapter = q_data.get("chapter", "")
-            question_number_rel = q_data.get("question_number_rel", "")
-            formatted_question = f"[Κεφ. {chapter}, Ερ. {question_number_rel}] {q_data['question']}"
-            
-            existing = Question.query.filter_by(
-                question_text=formatted_question
-            ).first()
-            if not existing:
-                question = Question(
-                    question_text=formatted_question,
-                    option_a=q_data["options"]["a"],
-                    option_b=q_data["options"]["b"],
-                    option_c=q_data["options"]["c"],
-                    option_d="", # Adding empty option_d since it's required
-                    correct_answer=q_data["correct_answer"],
-                    category=q_data.get("chapter", None),  # Use chapter as category
-                )
-                db.session.add(question)
-                count += 1
-
-        db.session.commit()
-        print(f"Questions loaded successfully! Added {count} new questions.")
+        report = import_questions_file("questions.json")
+        print(report)
+        check_exam_blueprint()
     except FileNotFoundError:
         print("WARNING: questions.json file not found. Please create it with your questions.")
         # Check if there are any questions in the database already
@@ -125,9 +145,27 @@ def load_questions_from_file():
         print(f"Error loading questions: {e}")
 
 
-with app.app_context():
+def create_schema():
+    """Create missing tables and sync the search index"""
     db.create_all()
+    question_search.ensure_index()
+
+
+def init_database():
+    """Create the schema and import questions.json.
+
+    Runs once per start: in the gunicorn master before workers are forked
+    (see gunicorn.conf.py) or before the development server starts.  It is
+    not run on import, so workers and scripts never race to do it; scripts
+    that may run against a fresh database call ``create_schema`` themselves.
+    """
+    create_schema()
     load_questions_from_file()
+    if leaderboard.is_empty():
+        # First start with leaderboards: fill them from the quiz history
+        attempts, entries = database_profile.run_write(leaderboard.rebuild)
+        if attempts:
+            print(f"Leaderboards built from {attempts} attempts ({entries} entries).")
 
 
 @app.route("/")
@@ -137,6 +175,26 @@ def index():
     return redirect(url_for("login"))
 
 
+def try_again_later(template, status, seconds):
+    """Re-render a login or registration form with a Retry-After header"""
+    seconds = max(1, math.ceil(seconds))
+    if status == 429:
+        flash(
+            f"Πάρα πολλές προσπάθειες. Δοκιμάστε ξανά σε {seconds} δευτερόλεπτα.",
+            "warning",
+        )
+    else:
+        flash("Ο διακομιστής είναι απασχολημένος. Δοκιμάστε ξανά σε λίγο.", "warning")
+    response = make_response(render_template(template), status)
+    response.headers["Retry-After"] = str(seconds)
+    return response
+
+
+def save_new_user(user):
+    db.session.add(user)
+    db.session.commit()
+
+
 @app.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
@@ -144,6 +202,10 @@ def register():
         email = request.form["email"]
         password = request.form["password"]
 
+        wait = login_limiter.check(request.remote_addr)
+        if wait:
+            return try_again_later("register.html", 429, wait)
+
         # Check if user exists
         if User.query.filter_by(username=username).first():
             flash("Το όνομα χρήστη υπάρχει ήδη", "danger")
@@ -155,17 +217,23 @@ def register():
 
         # Create new user
         user = User(username=username, email=email)
-        user.set_password(password)
+        try:
+            user.password_hash = password_hasher.hash(password)
+        except HashingBusy:
+            login_limiter.refund(request.remote_addr)
+            return try_again_later("register.html", 503, 1)
 
         # Check if superuser code was provided and is correct
         superuser_code = request.form.get("superuser_code", "")
         if superuser_code and superuser_code == app.config["SUPERUSER_CODE"]:
             user.is_superuser = True
-            flash("Δημιουργήθηκε λογαριασμός διαχειριστή", "success")
-
-        db.session.add(user)
-        db.session.commit()
 
+        # Hashing the password is slow, so the write transaction starts after it
+        database_profile.run_write(save_new_user, user)
+        # A deleted user's ID may be reused by SQLite
+        user_cache.invalidate(user.id)
+        if user.is_superuser:
+            flash("Δημιουργήθηκε λογαριασμός διαχειριστή", "success")
         flash("Η εγγραφή ολοκληρώθηκε με επιτυχία", "success")
         return redirect(url_for("login"))
 
@@ -177,9 +245,19 @@ def login():
     if request.method == "POST":
         username = request.form["username"]
         password = request.form["password"]
+
+        wait = login_limiter.check(request.remote_addr, username)
+        if wait:
+            return try_again_later("login.html", 429, wait)
+
         user = User.query.filter_by(username=username).first()
+        try:
+            valid = user is not None and password_hasher.check(user.password_hash, password)
+        except HashingBusy:
+            login_limiter.refund(request.remote_addr, username)
+            return try_again_later("login.html", 503, 1)
 
-        if user and user.check_password(password):
+        if valid:
             login_user(user)
             next_page = request.args.get("next")
             return redirect(next_page) if next_page else redirect(url_for("dashboard"))
@@ -200,12 +278,7 @@ def logout():
 @login_required
 def dashboard():
     stats = current_user.get_statistics()
-    recent_attempts = (
-        QuizAttempt.query.filter_by(user_id=current_user.id, is_completed=True)
-        .order_by(QuizAttempt.completed_at.desc())
-        .limit(5)
-        .all()
-    )
+    recent_attempts = QuizAttempt.recent_completed(current_user.id, 5).all()
 
     return render_template(
         "dashboard.html", stats=stats, recent_attempts=recent_attempts
@@ -214,26 +287,31 @@ def dashboard():
 
 @app.route("/start_quiz")
 @login_required
+@write_transaction
 def start_quiz():
-    # Get random 20 questions
-    total_questions = Question.query.count()
-    if total_questions < app.config["QUESTIONS_PER_QUIZ"]:
+    # Get random 20 questions from the in-memory question bank
+    bank = question_bank.snapshot()
+    if len(bank) < app.config["QUESTIONS_PER_QUIZ"]:
         flash(
             f"Δεν υπάρχουν αρκετές ερωτήσεις στη βάση δεδομένων. Χρειάζονται τουλάχιστον {app.config['QUESTIONS_PER_QUIZ']} ερωτήσεις.",
             "warning",
         )
         return redirect(url_for("dashboard"))
 
-    # Get random questions
-    questions = (
-        Question.query.order_by(db.func.random())
-        .limit(app.config["QUESTIONS_PER_QUIZ"])
-        .all()
-    )
+    blueprint = app.config["EXAM_BLUEPRINT"]
+    if request.args.get("mode") == "adaptive":
+        # Weighted towards the questions and chapters the user gets wrong
+        sampler = adaptive_cache.get(current_user.id, bank)
+        questions = sampler.sample(app.config["QUESTIONS_PER_QUIZ"])
+    elif blueprint and not bank.blueprint_problems(blueprint, app.config["QUESTIONS_PER_QUIZ"]):
+        # Fixed number of questions per chapter, like the real exam
+        questions = bank.sample_stratified(blueprint)
+    else:
+        questions = bank.sample(app.config["QUESTIONS_PER_QUIZ"])
 
     # Create quiz attempt
     quiz_attempt = QuizAttempt(user_id=current_user.id)
-    quiz_attempt.set_questions([q.to_dict() for q in questions])
+    quiz_attempt.set_questions(questions)
     db.session.add(quiz_attempt)
     db.session.commit()
 
@@ -256,39 +334,135 @@ def take_quiz():
     if quiz_attempt.is_completed:
         return redirect(url_for("quiz_results", quiz_id=quiz_id))
 
-    questions = quiz_attempt.get_questions()
-    user_answers = quiz_attempt.get_user_answers()
-
+    # The questions themselves are fetched by the page from /api/quiz/<id>
     return render_template(
         "quiz.html",
-        questions=questions,
-        user_answers=user_answers,
+        user_answers=quiz_attempt.get_saved_answers(),
         quiz_id=quiz_id,
         quiz_time_minutes=app.config["QUIZ_TIME_MINUTES"],
     )
 
 
+@app.route("/api/quiz/<int:quiz_id>")
+@login_required
+def api_quiz(quiz_id):
+    """Questions of an attempt without the correct answers.
+
+    They never change during an attempt, so the response carries a strong
+    ETag and page reloads are answered with 304 Not Modified.
+    """
+    quiz_attempt = QuizAttempt.query.options(
+        db.defer(QuizAttempt.questions_data), db.defer(QuizAttempt.user_answers)
+    ).get_or_404(quiz_id)
+    if quiz_attempt.user_id != current_user.id:
+        return jsonify({"success": False, "message": "Unauthorized"})
+
+    started = quiz_attempt.started_at.strftime("%Y%m%d%H%M%S%f") if quiz_attempt.started_at else ""
+    etag = f"quiz-v{QUIZ_PAYLOAD_VERSION}-{quiz_attempt.id}-{started}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        payload = {
+            "success": True,
+            "quiz_id": quiz_attempt.id,
+            "questions": [
+                {
+                    "id": question["id"],
+                    "question_text": question["question_text"],
+                    "options": question["options"],
+                }
+                for question in quiz_attempt.get_questions()
+            ],
+        }
+        response = app.response_class(
+            json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+            mimetype="application/json",
+        )
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route("/submit_answer", methods=["POST"])
 @login_required
+@write_transaction
 def submit_answer():
     quiz_id = request.json.get("quiz_id")
-    question_id = request.json.get("question_id")
     answer = request.json.get("answer")
+    try:
+        question_id = int(request.json.get("question_id"))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "Invalid answer"}), 400
+    if answer not in ("a", "b", "c", "d"):
+        return jsonify({"success": False, "message": "Invalid answer"}), 400
 
     quiz_attempt = QuizAttempt.query.get_or_404(quiz_id)
     if quiz_attempt.user_id != current_user.id:
         return jsonify({"success": False, "message": "Unauthorized"})
 
-    user_answers = quiz_attempt.get_user_answers()
-    user_answers[str(question_id)] = answer
-    quiz_attempt.set_user_answers(user_answers)
+    quiz_attempt.set_answer(question_id, answer)
     db.session.commit()
 
     return jsonify({"success": True})
 
 
+def parse_answers(items):
+    """Validate a list of {question_id, answer, seq} dicts from the client.
+
+    Returns a list of (question_id, answer, seq) tuples, or None if invalid.
+    """
+    if not isinstance(items, list):
+        return None
+    answers = []
+    for item in items:
+        try:
+            question_id = int(item["question_id"])
+            seq = int(item["seq"])
+            answer = item["answer"]
+        except (KeyError, TypeError, ValueError):
+            return None
+        if answer not in ("a", "b", "c", "d"):
+            return None
+        answers.append((question_id, answer, seq))
+    return answers
+
+
+def record_answers(quiz_attempt, answers):
+    """Hand answers to the journal, or write them directly for legacy attempts"""
+    if quiz_attempt.questions_data:
+        for question_id, answer, _ in answers:
+            quiz_attempt.set_answer(question_id, answer)
+        db.session.commit()
+    else:
+        answer_journal.record(quiz_attempt.id, answers)
+
+
+@app.route("/submit_answers", methods=["POST"])
+@login_required
+def submit_answers():
+    """Accept a batch of answers; they are written by the answer journal.
+
+    Batches may be replayed by the offline answer queue, in any order: an
+    answer only replaces the stored one when its sequence number is higher.
+    """
+    quiz_id = request.json.get("quiz_id")
+    answers = parse_answers(request.json.get("answers"))
+    if answers is None:
+        return jsonify({"success": False, "message": "Invalid answers"}), 400
+
+    quiz_attempt = QuizAttempt.query.get_or_404(quiz_id)
+    if quiz_attempt.user_id != current_user.id:
+        return jsonify({"success": False, "message": "Unauthorized"})
+    if quiz_attempt.is_completed:
+        return jsonify({"success": False, "message": "Quiz already submitted"})
+
+    record_answers(quiz_attempt, answers)
+    return jsonify({"success": True, "seq": max((seq for _, _, seq in answers), default=0)})
+
+
 @app.route("/submit_quiz", methods=["POST"])
 @login_required
+@write_transaction
 def submit_quiz():
     quiz_id = request.json.get("quiz_id")
     quiz_attempt = QuizAttempt.query.get_or_404(quiz_id)
@@ -296,10 +470,26 @@ def submit_quiz():
     if quiz_attempt.user_id != current_user.id:
         return jsonify({"success": False, "message": "Unauthorized"})
 
+    if quiz_attempt.is_completed:
+        return jsonify(
+            {"success": True, "redirect": url_for("quiz_results", quiz_id=quiz_id)}
+        )
+
+    # Apply the final answers sent by the client and any still buffered here
+    answers = parse_answers(request.json.get("answers", []))
+    if answers is None:
+        return jsonify({"success": False, "message": "Invalid answers"}), 400
+    record_answers(quiz_attempt, answers)
+    answer_journal.flush(quiz_attempt.id)
+
     # Calculate score and mark as completed
     quiz_attempt.calculate_score()
     quiz_attempt.is_completed = True
     quiz_attempt.completed_at = datetime.utcnow()
+    stats = UserStats.record_attempt(quiz_attempt)
+    outcomes = question_analytics.record_attempt(quiz_attempt)
+    adaptive.record_attempt(quiz_attempt.user_id, outcomes, stats.total_quizzes)
+    leaderboard.record_attempt(quiz_attempt)
     db.session.commit()
 
     # Clear session
@@ -310,6 +500,72 @@ def submit_quiz():
     )
 
 
+@app.route("/practice")
+@login_required
+def practice():
+    """Spaced-repetition practice; cards are fetched by the page.
+
+    This GET writes: on the first visit and after the question bank changes,
+    it creates the user's missing cards and drops those of deleted questions
+    in a write transaction.  Otherwise it only reads, and repeating it is
+    harmless.
+    """
+    spaced_repetition.ensure_cards(current_user.id, question_bank.snapshot())
+    return render_template(
+        "practice.html",
+        due=spaced_repetition.due_count(current_user.id),
+        batch_size=app.config["PRACTICE_BATCH_SIZE"],
+    )
+
+
+@app.route("/api/practice/cards")
+@login_required
+def api_practice_cards():
+    """The next due practice questions, with their correct answers"""
+    cards = spaced_repetition.due_cards(
+        current_user.id, question_bank.snapshot(), app.config["PRACTICE_BATCH_SIZE"]
+    )
+    next_due_at = None
+    if not cards:
+        due_at = spaced_repetition.next_due_at(current_user.id)
+        if due_at is not None:
+            next_due_at = to_athens_time(due_at).strftime("%d/%m/%Y %H:%M")
+    return jsonify(
+        {
+            "success": True,
+            "cards": [
+                {
+                    "id": card["id"],
+                    "question_text": card["question_text"],
+                    "options": card["options"],
+                    "correct_answer": card["correct_answer"],
+                }
+                for card in cards
+            ],
+            "due": spaced_repetition.due_count(current_user.id),
+            "next_due_at": next_due_at,
+        }
+    )
+
+
+@app.route("/api/practice/reviews", methods=["POST"])
+@login_required
+@write_transaction
+def api_practice_reviews():
+    """Apply a batch of practice answers to the user's schedule"""
+    data = request.json
+    reviews = spaced_repetition.parse_reviews(
+        data.get("reviews") if isinstance(data, dict) else None
+    )
+    if reviews is None:
+        return jsonify({"success": False, "message": "Invalid reviews"}), 400
+
+    applied = spaced_repetition.record_reviews(
+        current_user.id, reviews, question_bank.snapshot()
+    )
+    return jsonify({"success": True, "applied": applied})
+
+
 @app.route("/results/<int:quiz_id>")
 @login_required
 def quiz_results(quiz_id):
@@ -346,25 +602,29 @@ def quiz_results(quiz_id):
     )
 
 
+def build_chart_data(stats):
+    """Prepare the score chart from the last scores kept in the user's stats"""
+    chart_data = {"dates": [], "scores": [], "categories": {}}
+
+    for completed_at, score in stats["recent_scores"]:
+        chart_data["dates"].append(to_athens_time(completed_at).strftime("%Y-%m-%d"))
+        chart_data["scores"].append(score)
+
+    return chart_data
+
+
 @app.route("/statistics")
 @login_required
 def statistics():
     stats = current_user.get_statistics()
-    all_attempts = (
-        QuizAttempt.query.filter_by(user_id=current_user.id, is_completed=True)
-        .order_by(QuizAttempt.completed_at.desc())
-        .all()
+    attempts = paginate_attempts(
+        current_user.id, request.args.get("cursor"), app.config["ATTEMPTS_PER_PAGE"]
     )
 
-    # Prepare data for charts
-    chart_data = {"dates": [], "scores": [], "categories": {}}
-
-    for attempt in all_attempts[-10:]:  # Last 10 attempts for chart
-        chart_data["dates"].append(to_athens_time(attempt.completed_at).strftime("%Y-%m-%d"))
-        chart_data["scores"].append(attempt.score)
+    chart_data = build_chart_data(stats)
 
     return render_template(
-        "statistics.html", stats=stats, all_attempts=all_attempts, chart_data=chart_data, viewed_user=None
+        "statistics.html", stats=stats, attempts=attempts, chart_data=chart_data, viewed_user=None
     )
 
 
@@ -375,33 +635,99 @@ def user_statistics(user_id):
     # Only superusers can view other users' statistics
     user = User.query.get_or_404(user_id)
     stats = user.get_statistics()
-    all_attempts = (
-        QuizAttempt.query.filter_by(user_id=user.id, is_completed=True)
-        .order_by(QuizAttempt.completed_at.desc())
-        .all()
+    attempts = paginate_attempts(
+        user.id, request.args.get("cursor"), app.config["ATTEMPTS_PER_PAGE"]
     )
 
-    # Prepare data for charts
-    chart_data = {"dates": [], "scores": [], "categories": {}}
-
-    for attempt in all_attempts[-10:]:  # Last 10 attempts for chart
-        chart_data["dates"].append(to_athens_time(attempt.completed_at).strftime("%Y-%m-%d"))
-        chart_data["scores"].append(attempt.score)
+    chart_data = build_chart_data(stats)
 
     return render_template(
         "statistics.html", 
         stats=stats, 
-        all_attempts=all_attempts, 
+        attempts=attempts, 
         chart_data=chart_data,
         viewed_user=user  # Pass the user being viewed
     )
 
 
+def attempt_to_json(attempt):
+    return {
+        "id": attempt.id,
+        "completed_at": attempt.completed_at.isoformat(),
+        "score": attempt.score,
+        "correct_answers": attempt.correct_answers,
+        "total_questions": attempt.total_questions,
+        "url": url_for("quiz_results", quiz_id=attempt.id),
+    }
+
+
+@app.route("/api/attempts")
+@login_required
+def api_attempts():
+    """JSON variant of the attempts list for incremental loading"""
+    user_id = request.args.get("user_id", current_user.id, type=int)
+    if user_id != current_user.id and not current_user.is_superuser:
+        return jsonify({"success": False, "message": "Unauthorized"}), 403
+
+    page = paginate_attempts(
+        user_id, request.args.get("cursor"), app.config["ATTEMPTS_PER_PAGE"]
+    )
+    return jsonify(
+        {
+            "success": True,
+            "items": [attempt_to_json(a) for a in page.items],
+            "next_cursor": page.next_cursor,
+        }
+    )
+
+
+@app.route("/leaderboard")
+@login_required
+def leaderboard_view():
+    period = request.args.get("period", "week")
+    metric = request.args.get("metric", "best")
+    if period not in leaderboard.PERIODS or metric not in leaderboard.METRICS:
+        abort(404)
+
+    return render_template(
+        "leaderboard.html",
+        period=period,
+        metric=metric,
+        rows=leaderboard.top(period, metric, app.config["LEADERBOARD_SIZE"]),
+        mine=leaderboard.rank(current_user.id, period, metric),
+    )
+
+
+@app.route("/api/leaderboard")
+@login_required
+def api_leaderboard():
+    """Top of a board and the current user's rank, as JSON"""
+    period = request.args.get("period", "week")
+    metric = request.args.get("metric", "best")
+    if period not in leaderboard.PERIODS or metric not in leaderboard.METRICS:
+        return jsonify({"success": False, "message": "Unknown leaderboard"}), 404
+
+    return jsonify(
+        {
+            "success": True,
+            "period": period,
+            "metric": metric,
+            "items": leaderboard.top(period, metric, app.config["LEADERBOARD_SIZE"]),
+            "me": leaderboard.rank(current_user.id, period, metric),
+        }
+    )
+
+
 @app.route("/reset_statistics", methods=["POST"])
 @login_required
+@write_transaction
 def reset_statistics():
     # Delete all quiz attempts for the current user
-    QuizAttempt.query.filter_by(user_id=current_user.id).delete()
+    QuizAttempt.delete_for_user(current_user.id)
+    UserStats.reset(current_user.id)
+    adaptive.reset_user(current_user.id)
+    leaderboard.remove_user(current_user.id)
+    spaced_repetition.reset_user(current_user.id)
     db.session.commit()
 
     flash("Τα στατιστικά σας μηδενίστηκαν με επιτυχία", "success")
@@ -411,12 +737,17 @@ def reset_statistics():
 @app.route("/reset_user_statistics/<int:user_id>", methods=["POST"])
 @login_required
 @superuser_required
+@write_transaction
 def reset_user_statistics(user_id):
     # Get user or 404
     user = User.query.get_or_404(user_id)
     
     # Delete all quiz attempts for the specified user
-    QuizAttempt.query.filter_by(user_id=user_id).delete()
+    QuizAttempt.delete_for_user(user_id)
+    UserStats.reset(user_id)
+    adaptive.reset_user(user_id)
+    leaderboard.remove_user(user_id)
+    spaced_repetition.reset_user(user_id)
     db.session.commit()
 
     flash(f"Τα στατιστικά του χρήστη {user.username} μηδενίστηκαν με επιτυχία", "success")
@@ -427,14 +758,146 @@ def reset_user_statistics(user_id):
 @login_required
 @superuser_required
 def admin_panel():
-    users = User.query.all()
-    questions = Question.query.all()
+    users = paginate_by_id(
+        User, request.args.get("users_cursor"), app.config["ADMIN_PAGE_SIZE"]
+    )
+    questions = paginate_by_id(
+        Question, request.args.get("questions_cursor"), app.config["ADMIN_PAGE_SIZE"]
+    )
     return render_template("admin.html", users=users, questions=questions)
 
 
+@app.route("/admin/questions/analytics")
+@login_required
+@superuser_required
+def question_analytics_view():
+    sort = request.args.get("sort", "hardest")
+    if sort not in question_analytics.SORTS:
+        sort = "hardest"
+    min_served = request.args.get("min_served", 5, type=int)
+    report = question_analytics.question_report(sort=sort, min_served=min_served)
+    return render_template(
+        "question_analytics.html", report=report, sort=sort, min_served=min_served
+    )
+
+
+@app.route("/admin/questions/search")
+@login_required
+@superuser_required
+def search_questions():
+    query = request.args.get("q", "").strip()
+    results = question_search.search(
+        query, request.args.get("cursor"), app.config["ADMIN_PAGE_SIZE"]
+    )
+    return render_template("question_search.html", query=query, results=results)
+
+
+@app.route("/admin/api/questions/search")
+@login_required
+@superuser_required
+def api_search_questions():
+    results = question_search.search(
+        request.args.get("q", ""), request.args.get("cursor"), app.config["ADMIN_PAGE_SIZE"]
+    )
+    return jsonify(
+        {
+            "success": True,
+            "items": results.items,
+            "next_cursor": results.next_cursor,
+        }
+    )
+
+
+@app.route("/admin/api/users")
+@login_required
+@superuser_required
+def api_users():
+    page = paginate_by_id(User, request.args.get("cursor"), app.config["ADMIN_PAGE_SIZE"])
+    return jsonify(
+        {
+            "success": True,
+            "items": [
+                {
+                    "id": user.id,
+                    "username": user.username,
+                    "email": user.email,
+                    "created_at": user.created_at.isoformat(),
+                    "is_superuser": user.is_superuser,
+                }
+                for user in page.items
+            ],
+            "next_cursor": page.next_cursor,
+        }
+    )
+
+
+@app.route("/admin/api/questions")
+@login_required
+@superuser_required
+def api_questions():
+    page = paginate_by_id(
+        Question, request.args.get("cursor"), app.config["ADMIN_PAGE_SIZE"]
+    )
+    return jsonify(
+        {
+            "success": True,
+            "items": [
+                {
+                    "id": question.id,
+                    "question_text": question.question_text,
+                    "category": question.category,
+                }
+                for question in page.items
+            ],
+            "next_cursor": page.next_cursor,
+        }
+    )
+
+
+@app.route("/admin/export/<dataset>")
+@login_required
+@superuser_required
+def export_data(dataset):
+    """Stream users, attempts or answers as CSV or NDJSON, optionally gzipped"""
+    fmt = request.args.get("format", "csv")
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        abort(404)
+    try:
+        filters = exports.parse_filters(
+            request.args.get("user_id"), request.args.get("since"), request.args.get("until")
+        )
+    except ValueError:
+        abort(400)
+    compress = request.args.get("gzip") == "1"
+    chunks = exports.stream(
+        dataset, fmt, filters, app.config["EXPORT_CHUNK_SIZE"], compress
+    )
+    response = app.response_class(
+        stream_with_context(chunks),
+        mimetype=exports.GZIP_MIMETYPE if compress else exports.FORMATS[fmt],
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={exports.filename(dataset, fmt, compress)}"
+    )
+    return response
+
+
+@app.route("/metrics")
+@login_required
+@superuser_required
+def metrics():
+    """Request latency and SQL counters of this worker process, for Prometheus"""
+    if not request_metrics.enabled:
+        abort(404)
+    return app.response_class(
+        request_metrics.render(), mimetype="text/plain; version=0.0.4"
+    )
+
+
 @app.route("/admin/user/delete/<int:user_id>", methods=["POST"])
 @login_required
 @superuser_required
+@write_transaction
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
 
@@ -443,8 +906,15 @@ def delete_user(user_id):
         flash("Δεν μπορείτε να διαγράψετε τον εαυτό σας", "danger")
         return redirect(url_for("admin_panel"))
 
+    QuizAttempt.delete_for_user(user.id)
+    UserStats.query.filter_by(user_id=user.id).delete()
+    adaptive.reset_user(user.id)
+    leaderboard.remove_user(user.id)
+    spaced_repetition.reset_user(user.id)
     db.session.delete(user)
+    mark_users_changed()
     db.session.commit()
+    user_cache.invalidate(user.id)
     flash(f"Ο χρήστης {user.username} διαγράφηκε με επιτυχία", "success")
     return redirect(url_for("admin_panel"))
 
@@ -452,6 +922,7 @@ def delete_user(user_id):
 @app.route("/admin/user/toggle_superuser/<int:user_id>", methods=["POST"])
 @login_required
 @superuser_required
+@write_transaction
 def toggle_superuser(user_id):
     user = User.query.get_or_404(user_id)
 
@@ -464,7 +935,9 @@ def toggle_superuser(user_id):
         return redirect(url_for("admin_panel"))
 
     user.is_superuser = not user.is_superuser
+    mark_users_changed()
     db.session.commit()
+    user_cache.invalidate(user.id)
     flash(
         f"Τα δικαιώματα του χρήστη {user.username} ενημερώθηκαν με επιτυχία", "success"
     )
@@ -474,9 +947,12 @@ def toggle_superuser(user_id):
 @app.route("/admin/question/delete/<int:question_id>", methods=["POST"])
 @login_required
 @superuser_required
+@write_transaction
 def delete_question(question_id):
     question = Question.query.get_or_404(question_id)
     db.session.delete(question)
+    question_search.remove_questions([question_id])
+    mark_questions_changed()
     db.session.commit()
     flash("Η ερώτηση διαγράφηκε με επιτυχία", "success")
     return redirect(url_for("admin_panel"))
@@ -485,6 +961,7 @@ def delete_question(question_id):
 @app.route("/admin/question/add", methods=["GET", "POST"])
 @login_required
 @superuser_required
+@write_transaction
 def add_question():
     if request.method == "POST":
         question_text = request.form["question_text"]
@@ -504,6 +981,9 @@ def add_question():
         )
 
         db.session.add(question)
+        db.session.flush()
+        question_search.index_questions([question])
+        mark_questions_changed()
         db.session.commit()
         flash("Η ερώτηση προστέθηκε με επιτυχία", "success")
         return redirect(url_for("admin_panel"))
@@ -511,9 +991,75 @@ def add_question():
     return render_template("add_question.html")
 
 
+@app.route("/admin/questions/upload", methods=["GET", "POST"])
+@login_required
+@superuser_required
+def upload_questions():
+    if request.method == "POST":
+        upload = request.files.get("file")
+        delete_missing = request.form.get("delete_missing") == "1"
+        if upload is None or not upload.filename:
+            flash("Επιλέξτε ένα αρχείο JSON ή CSV", "danger")
+            return render_template("question_upload.html")
+
+        try:
+            token, errors = question_uploads.save(upload)
+            if errors:
+                return render_template("question_upload.html", errors=errors)
+            preview = question_uploads.preview(token, delete_missing)
+        except UploadError as e:
+            flash(f"Το αρχείο δεν μπορεί να διαβαστεί: {e}", "danger")
+            return render_template("question_upload.html")
+        return render_template("question_upload.html", preview=preview)
+
+    return render_template("question_upload.html")
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Bodies over MAX_CONTENT_LENGTH are refused while they are read"""
+    if request.endpoint == "upload_questions":
+        flash("Το αρχείο είναι πολύ μεγάλο", "danger")
+        return render_template("question_upload.html"), 413
+    return error
+
+
+@app.route("/admin/questions/upload/apply", methods=["POST"])
+@login_required
+@superuser_required
+def apply_question_upload():
+    token = request.form.get("token", "")
+    delete_missing = request.form.get("delete_missing") == "1"
+    if request.form.get("action") == "cancel":
+        question_uploads.discard(token)
+        return redirect(url_for("upload_questions"))
+
+    try:
+        preview = question_uploads.apply(token, delete_missing, request.form.get("digest"))
+    except UploadExpired:
+        flash("Η μεταφόρτωση δεν βρέθηκε. Ανεβάστε ξανά το αρχείο.", "warning")
+        return redirect(url_for("upload_questions"))
+    except UploadChanged:
+        flash(
+            "Οι ερωτήσεις άλλαξαν μετά την προεπισκόπηση. Ελέγξτε ξανά τις αλλαγές.",
+            "warning",
+        )
+        return render_template(
+            "question_upload.html", preview=question_uploads.preview(token, delete_missing)
+        )
+
+    flash(
+        f"Ερωτήσεις: {preview.added} προστέθηκαν, {preview.changed} ενημερώθηκαν, "
+        f"{preview.removed} διαγράφηκαν",
+        "success",
+    )
+    return redirect(url_for("admin_panel"))
+
+
 @app.route("/admin/question/edit/<int:question_id>", methods=["GET", "POST"])
 @login_required
 @superuser_required
+@write_transaction
 def edit_question(question_id):
     question = Question.query.get_or_404(question_id)
 
@@ -525,6 +1071,8 @@ def edit_question(question_id):
         question.option_d = ""  # Empty string for option_d
         question.correct_answer = request.form["correct_answer"]
 
+        question_search.index_questions([question])
+        mark_questions_changed()
         db.session.commit()
         flash("Η ερώτηση ενημερώθηκε με επιτυχία", "success")
         return redirect(url_for("admin_panel"))
@@ -532,26 +1080,44 @@ def edit_question(question_id):
     return render_template("edit_question.html", question=question)
 
 
+@app.route("/service-worker.js")
+def service_worker():
+    """Service worker script, served from the root so that it controls every page"""
+    script = render_template(
+        "service_worker.js",
+        version=static_assets.version(),
+        precache_urls=[url_for("static", filename=name) for name in sorted(static_assets.assets)],
+        answer_queue_url=url_for("static", filename="js/answer_queue.js"),
+    )
+    response = app.response_class(script, mimetype="text/javascript")
+    # Browsers check for a new version on every navigation
+    response.cache_control.no_cache = True
+    return response
+
+
+files_listing = DirectoryListing(os.path.join(os.getcwd(), "files"))
+
+
 @app.route("/files")
 @login_required
 def list_files():
     """List all files in the files directory for download"""
-    files_dir = os.path.join(os.getcwd(), "files")
-    files = []
-    
-    # Ensure the directory exists
-    if os.path.exists(files_dir) and os.path.isdir(files_dir):
-        # Get all files (not directories) in the files folder
-        files = [f for f in os.listdir(files_dir) if os.path.isfile(os.path.join(files_dir, f))]
-    
-    return render_template("files.html", files=files)
+    return render_template("files.html", files=files_listing.files())
 
 @app.route("/download/<filename>")
 @login_required
 def download_file(filename):
     """Download a file from the files directory"""
-    return send_from_directory("files", filename, as_attachment=True)
+    return send_study_file("files", filename, True, app.config["FILES_MAX_AGE"])
+
+@app.route("/files/view/<filename>")
+@login_required
+def view_file(filename):
+    """Open a file from the files directory in the browser"""
+    return send_study_file("files", filename, False, app.config["FILES_MAX_AGE"])
 
 
 if __name__ == "__main__":
+    with app.app_context():
+        init_database()
     app.run(debug=True, host="0.0.0.0", port=6789)
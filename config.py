@@ -7,6 +7,44 @@ class Config:
     )
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or "sqlite:///quiz_app.db"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    DB_POOL_SIZE = 5  # Connections kept open per worker process
+    DB_MAX_OVERFLOW = 10  # Extra connections a worker may open under load
+    DB_POOL_RECYCLE = 1800  # Seconds before a server database connection is replaced
+    DB_WRITE_RETRIES = 5  # Attempts of a write transaction that finds the database locked
+    SQLITE_BUSY_TIMEOUT_MS = 5000  # How long SQLite waits for the write lock
+    SQLITE_CACHE_SIZE_KB = 16384  # SQLite page cache per connection
+    SQLITE_MMAP_SIZE = 268435456  # Bytes of the SQLite file read through mmap
     QUESTIONS_PER_QUIZ = 20
+    # Questions drawn from each chapter (Question.category), e.g.
+    # {"1": 3, "2": 3, ...} with the per-chapter counts of the official exam.
+    # Counts must add up to QUESTIONS_PER_QUIZ; empty draws uniformly from
+    # the whole bank.
+    EXAM_BLUEPRINT = {}
     QUIZ_TIME_MINUTES = 45  # Quiz time limit in minutes
+    PRACTICE_BATCH_SIZE = 10  # Due questions fetched at a time in practice mode
+    ADAPTIVE_CACHE_SIZE = 256  # Users whose adaptive quiz weights are kept in memory
+    USER_CACHE_SIZE = 1024  # Logged-in users kept in memory per worker
+    USER_CACHE_TTL = 60  # Seconds before a cached user is read again even if unchanged
+    # Keep PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE below the gunicorn
+    # threads per worker so that logins never occupy all of them
+    PASSWORD_HASH_WORKERS = 1  # Password hashes computed at once per worker process
+    PASSWORD_HASH_QUEUE = 2  # Hashes that may wait; further logins are told to retry
+    PASSWORD_HASH_NICE = 10  # CPU niceness of hashing threads (Linux), 0 to disable
+    LOGIN_IP_BURST = 200  # Login/registration attempts per IP before throttling
+    LOGIN_IP_PER_MINUTE = 120  # Rate at which an IP regains attempts
+    LOGIN_USERNAME_BURST = 5  # Login attempts per username before throttling
+    LOGIN_USERNAME_PER_MINUTE = 5  # Rate at which a username regains attempts
+    ATTEMPTS_PER_PAGE = 20  # Quiz attempts per statistics page
+    LEADERBOARD_SIZE = 20  # Users shown on a leaderboard page
+    ADMIN_PAGE_SIZE = 50  # Users/questions per admin panel page
+    EXPORT_CHUNK_SIZE = 1000  # Rows fetched and written at a time by data exports
+    QUESTION_UPLOAD_MAX_BYTES = 16 * 1024 * 1024  # Largest bulk question upload
+    # Largest request body of any kind, enforced by Flask while the body is
+    # read (also without a Content-Length); the bulk upload is the largest
+    MAX_CONTENT_LENGTH = QUESTION_UPLOAD_MAX_BYTES
+    QUESTION_UPLOAD_CHUNK_SIZE = 500  # Questions written per transaction by a bulk upload
+    ANSWER_JOURNAL_FLUSH_SECONDS = 5  # How often buffered quiz answers are written
+    FILES_MAX_AGE = 3600  # Seconds browsers may cache study materials before revalidating
+    METRICS_ENABLED = True  # Record request latency and SQL counts for /metrics
+    N_PLUS_ONE_THRESHOLD = 10  # Same statement this many times in one request is flagged
     SUPERUSER_CODE = "boat-licence-admin-2025"  # Secret code to create superuser
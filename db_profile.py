@@ -0,0 +1,155 @@
+"""Database engine settings for running several gunicorn workers.
+
+SQLite connections are switched to WAL, so readers never block the writer
+and the writer never blocks readers, with ``synchronous=NORMAL``, a busy
+timeout, a larger page cache and a memory-mapped database file.
+
+pysqlite normally opens every transaction with a deferred ``BEGIN`` and
+takes the write lock at the first INSERT/UPDATE.  When another worker has
+committed in between, that upgrade fails at once with "database is locked",
+whatever the busy timeout.  Write paths therefore run through
+``run_write``/``write_transaction``: their transaction starts with
+``BEGIN IMMEDIATE``, which waits up to the busy timeout for the write lock,
+and is retried a few times with jittered backoff if it still fails.  On
+PostgreSQL the same wrappers retry serialization failures and deadlocks.
+
+Pool settings suit both a SQLite file and a ``DATABASE_URL`` pointing at
+PostgreSQL.  Settings in ``SQLALCHEMY_ENGINE_OPTIONS`` take precedence.
+"""
+import random
+import sqlite3
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import DBAPIError
+
+from models import db
+
+# Errors worth retrying: SQLite lock contention and PostgreSQL
+# serialization failures, deadlocks and lock timeouts
+SQLITE_LOCK_MESSAGES = ("database is locked", "database table is locked")
+POSTGRES_RETRY_CODES = {"40001", "40P01", "55P03"}
+RETRY_BASE_SECONDS = 0.05
+
+_immediate = ContextVar("begin_immediate", default=False)
+
+
+def is_lock_error(exc):
+    if not isinstance(exc, DBAPIError):
+        return False
+    if getattr(exc.orig, "pgcode", None) in POSTGRES_RETRY_CODES:
+        return True
+    message = str(exc.orig)
+    return any(text in message for text in SQLITE_LOCK_MESSAGES)
+
+
+def engine_options(config):
+    """Engine and pool options for the configured database URL"""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        if url.database in (None, "", ":memory:"):
+            # Flask-SQLAlchemy uses a single shared connection here
+            return {}
+        # Connections are cheap; the pool only bounds how many threads of a
+        # worker hold one at the same time
+        return {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+        }
+    return {
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": 30,
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        # Connections dropped by the server or a proxy are replaced
+        "pool_pre_ping": True,
+    }
+
+
+class DatabaseProfile:
+    def __init__(self):
+        self.pragmas = ()
+        self.retries = 5
+        self.logger = None
+
+    def init_app(self, app):
+        """Set the engine options; call before ``db.init_app(app)``"""
+        options = engine_options(app.config)
+        options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+        self.retries = app.config["DB_WRITE_RETRIES"]
+        self.logger = app.logger
+        self.pragmas = (
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            f"PRAGMA busy_timeout={int(app.config['SQLITE_BUSY_TIMEOUT_MS'])}",
+            # Negative sizes are in KiB
+            f"PRAGMA cache_size=-{int(app.config['SQLITE_CACHE_SIZE_KB'])}",
+            f"PRAGMA mmap_size={int(app.config['SQLITE_MMAP_SIZE'])}",
+        )
+        if not event.contains(Engine, "connect", self._on_connect):
+            event.listen(Engine, "connect", self._on_connect)
+            event.listen(Engine, "begin", self._on_begin)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        # Transactions are started by _on_begin instead of pysqlite
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in self.pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    def _on_begin(self, conn):
+        if conn.dialect.name != "sqlite":
+            return
+        if conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+            return
+        conn.exec_driver_sql("BEGIN IMMEDIATE" if _immediate.get() else "BEGIN")
+
+    def run_write(self, fn, *args, **kwargs):
+        """Call ``fn`` in a write transaction, retrying it if the database is locked.
+
+        ``fn`` makes its changes and commits.  A transaction that is still open
+        when this is called (reads done so far) is ended first, so call this
+        before making changes.  On a lock error the session is rolled back and
+        ``fn`` runs again from the start.
+        """
+        if db.session().in_transaction():
+            db.session.commit()
+        token = _immediate.set(True)
+        try:
+            for attempt in range(1, self.retries + 1):
+                try:
+                    return fn(*args, **kwargs)
+                except DBAPIError as e:
+                    db.session.rollback()
+                    if not is_lock_error(e) or attempt == self.retries:
+                        raise
+                    delay = random.uniform(0, RETRY_BASE_SECONDS * 2 ** attempt)
+                    self.logger.warning(
+                        "Database locked, retrying write transaction in %.0f ms (attempt %d of %d)",
+                        delay * 1000,
+                        attempt + 1,
+                        self.retries,
+                    )
+                    time.sleep(delay)
+        finally:
+            _immediate.reset(token)
+
+
+database_profile = DatabaseProfile()
+
+
+def write_transaction(f):
+    """Run a view as one short BEGIN IMMEDIATE transaction, retried when locked"""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        return database_profile.run_write(f, *args, **kwargs)
+
+    return decorated_function
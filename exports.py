@@ -0,0 +1,186 @@
+"""Streaming CSV/NDJSON exports of users, quiz attempts and answers.
+
+Every dataset is one SELECT over plain columns, ordered by primary key and
+read with ``yield_per`` so that SQLAlchemy fetches ``EXPORT_CHUNK_SIZE``
+rows at a time from a server-side cursor.  Rows are encoded and yielded
+chunk by chunk, optionally through an incremental gzip compressor, so
+memory stays flat however many attempts there are.  Used by the
+``/admin/export/<dataset>`` views and scripts/export_data.py.
+
+Filters: ``user_id`` and a ``since``/``until`` date range on the user's
+registration time (users) or the attempt's start time (attempts, answers).
+Attempts that only exist as legacy JSON snapshots have no answer rows until
+scripts/migrate_attempt_questions.py has run.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime, timedelta
+
+from models import db, AttemptQuestion, QuestionRevision, QuizAttempt, User, UserStats
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+GZIP_MIMETYPE = "application/gzip"
+
+
+def _users(filters):
+    query = (
+        db.select(
+            User.id,
+            User.username,
+            User.email,
+            User.created_at,
+            User.is_superuser,
+            db.func.coalesce(UserStats.total_quizzes, 0).label("total_quizzes"),
+            db.func.coalesce(UserStats.score_sum, 0).label("score_sum"),
+            db.func.coalesce(UserStats.correct_answers, 0).label("correct_answers"),
+            db.func.coalesce(UserStats.total_questions, 0).label("total_questions"),
+        )
+        .outerjoin(UserStats, UserStats.user_id == User.id)
+        .order_by(User.id)
+    )
+    return _filter(query, User.id, User.created_at, filters)
+
+
+def _attempts(filters):
+    query = (
+        db.select(
+            QuizAttempt.id,
+            QuizAttempt.user_id,
+            User.username,
+            QuizAttempt.started_at,
+            QuizAttempt.completed_at,
+            QuizAttempt.is_completed,
+            QuizAttempt.score,
+            QuizAttempt.correct_answers,
+            QuizAttempt.total_questions,
+        )
+        .join(User, User.id == QuizAttempt.user_id)
+        .order_by(QuizAttempt.id)
+    )
+    return _filter(query, QuizAttempt.user_id, QuizAttempt.started_at, filters)
+
+
+def _answers(filters):
+    query = (
+        db.select(
+            AttemptQuestion.attempt_id,
+            QuizAttempt.user_id,
+            QuizAttempt.started_at,
+            QuizAttempt.is_completed,
+            AttemptQuestion.position,
+            AttemptQuestion.question_id,
+            AttemptQuestion.revision_id,
+            AttemptQuestion.answer,
+            QuestionRevision.correct_answer,
+            (AttemptQuestion.answer == QuestionRevision.correct_answer).label("is_correct"),
+        )
+        .join(QuizAttempt, QuizAttempt.id == AttemptQuestion.attempt_id)
+        .join(QuestionRevision, QuestionRevision.id == AttemptQuestion.revision_id)
+        .order_by(AttemptQuestion.attempt_id, AttemptQuestion.position)
+    )
+    return _filter(query, QuizAttempt.user_id, QuizAttempt.started_at, filters)
+
+
+DATASETS = {
+    "users": _users,
+    "attempts": _attempts,
+    "answers": _answers,
+}
+
+
+def _filter(query, user_column, date_column, filters):
+    if filters.get("user_id") is not None:
+        query = query.where(user_column == filters["user_id"])
+    if filters.get("since") is not None:
+        query = query.where(date_column >= filters["since"])
+    if filters.get("until") is not None:
+        query = query.where(date_column < filters["until"])
+    return query
+
+
+def parse_filters(user_id=None, since=None, until=None):
+    """Filters from request or command line strings; raises ValueError.
+
+    ``since`` and ``until`` are ISO dates or date-times in UTC.  A plain date
+    as ``until`` includes that whole day.
+    """
+    return {
+        "user_id": int(user_id) if user_id not in (None, "") else None,
+        "since": _parse_bound(since) if since else None,
+        "until": _parse_bound(until, end_of_day=True) if until else None,
+    }
+
+
+def _parse_bound(text, end_of_day=False):
+    try:
+        day = date.fromisoformat(text)
+    except ValueError:
+        return datetime.fromisoformat(text)
+    start = datetime.combine(day, datetime.min.time())
+    return start + timedelta(days=1) if end_of_day else start
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(columns, partitions):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in partitions:
+        writer.writerows([_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns, partitions):
+    for rows in partitions:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def _gzip(chunks):
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(dataset, fmt, filters, chunk_size=1000, compress=False):
+    """Yield the export of ``dataset`` as encoded byte chunks.
+
+    Must be iterated inside an app context; the rows are read while the
+    chunks are consumed.
+    """
+    result = db.session.execute(
+        DATASETS[dataset](filters).execution_options(yield_per=chunk_size)
+    )
+    columns = list(result.keys())
+    encode = _csv_chunks if fmt == "csv" else _ndjson_chunks
+    chunks = (text.encode("utf-8") for text in encode(columns, result.partitions()))
+    if compress:
+        chunks = _gzip(chunks)
+    try:
+        yield from chunks
+    finally:
+        result.close()
+
+
+def filename(dataset, fmt, compress=False):
+    return f"{dataset}.{fmt}" + (".gz" if compress else "")
@@ -0,0 +1,55 @@
+"""Production gunicorn settings, used by entrypoint.sh.
+
+The app is imported once in the master (``preload_app``).  Then, before
+any worker is forked, ``when_ready`` creates missing tables, imports
+questions.json and loads the question bank.  Workers inherit the loaded
+question bank and the precompressed static assets copy-on-write instead
+of each building their own.  Workers are replaced gracefully after
+``max_requests`` requests, with jitter so they do not all restart at once.
+
+Every setting can be overridden on the command line or with the
+environment variables below.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:6789")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# Threads let a worker serve other requests while one hashes a password or
+# waits for the database
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+preload_app = True
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    from app import app, init_database
+    from models import db
+    from question_bank import question_bank
+
+    with app.app_context():
+        init_database()
+        question_bank.snapshot()
+        # Forked workers must not share the master's database connections
+        db.engine.dispose()
+
+    # Keep the objects loaded so far out of the garbage collector's scans,
+    # which would otherwise write to their pages and unshare them
+    gc.collect()
+    gc.freeze()
+    server.log.info("Question bank loaded, forking %d workers", server.num_workers)
+
+
+def post_fork(server, worker):
+    from models import db
+    from app import app
+
+    with app.app_context():
+        # Drop any pooled connection objects copied from the master
+        db.engine.dispose(close=False)
@@ -0,0 +1,294 @@
+"""Weekly, monthly and all-time leaderboards of best and average score.
+
+Every completed quiz updates one ``LeaderboardEntry`` per period it falls in
+(its week and month in Athens time, and "all").  Scores are kept in buckets
+of a hundredth of a percent, and for each period and metric a Fenwick tree
+stored in ``LeaderboardNode`` counts the users per bucket.  Moving a user to
+another bucket touches O(log n) nodes, and a user's rank is one plus the
+number of users in higher buckets, read from O(log n) nodes.  Users with the
+same score share a rank.  The top of a board is an index range scan.
+
+``record_attempt`` runs in the submit_quiz transaction and ``remove_user``
+in the ones that reset statistics or delete users.  ``rebuild`` recomputes
+everything from the attempt history in one streaming pass.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pytz
+from sqlalchemy import bindparam, delete, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, LeaderboardEntry, LeaderboardNode, QuizAttempt, User
+
+PERIODS = ("week", "month", "all")
+METRICS = ("best", "average")
+# Scores are percentages; buckets are hundredths of a percent
+SCALE = 100
+BUCKETS = 100 * SCALE + 1
+REBUILD_CHUNK_SIZE = 1000
+TIMEZONE = pytz.timezone("Europe/Athens")
+
+
+def period_keys(moment):
+    """Period keys of a naive UTC datetime, by period kind"""
+    day = pytz.UTC.localize(moment).astimezone(TIMEZONE).date()
+    monday = day - timedelta(days=day.weekday())
+    return {
+        "week": f"week-{monday.isoformat()}",
+        "month": f"month-{day:%Y-%m}",
+        "all": "all",
+    }
+
+
+def current_period(kind):
+    return period_keys(datetime.utcnow())[kind]
+
+
+def bucket(score):
+    return min(BUCKETS - 1, max(0, round(score * SCALE)))
+
+
+def _set_buckets(entry):
+    entry.best_bucket = bucket(entry.best_score)
+    entry.average_bucket = bucket(entry.average_score)
+
+
+def _update_path(position):
+    """Fenwick nodes that count bucket ``position``"""
+    node = position + 1
+    while node <= BUCKETS:
+        yield node
+        node += node & -node
+
+
+def _prefix_path(position):
+    """Fenwick nodes whose counts add up to buckets 0..position"""
+    node = position + 1
+    while node > 0:
+        yield node
+        node -= node & -node
+
+
+def _count(changes, period, entry, delta):
+    """Add ``delta`` to the nodes counting the entry's buckets"""
+    for metric in METRICS:
+        for node in _update_path(getattr(entry, f"{metric}_bucket")):
+            changes[(period, metric, node)] += delta
+
+
+def _insert_missing(keys):
+    existing = set(
+        db.session.execute(
+            db.select(LeaderboardNode.period, LeaderboardNode.metric, LeaderboardNode.node).where(
+                db.tuple_(
+                    LeaderboardNode.period, LeaderboardNode.metric, LeaderboardNode.node
+                ).in_(keys)
+            )
+        ).all()
+    )
+    missing = [key for key in keys if key not in existing]
+    if missing:
+        with db.session.begin_nested():
+            db.session.execute(
+                insert(LeaderboardNode),
+                [
+                    {"period": period, "metric": metric, "node": node, "count": 0}
+                    for period, metric, node in missing
+                ],
+            )
+
+
+def apply_changes(changes):
+    """Add ``{(period, metric, node): delta}`` to the stored tree nodes"""
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    keys = list(changes)
+    try:
+        _insert_missing(keys)
+    except IntegrityError:
+        # Another submission created some of the nodes first
+        _insert_missing(keys)
+
+    table = LeaderboardNode.__table__
+    db.session.execute(
+        update(table)
+        .where(
+            table.c.period == bindparam("b_period"),
+            table.c.metric == bindparam("b_metric"),
+            table.c.node == bindparam("b_node"),
+        )
+        .values(count=table.c.count + bindparam("b_delta")),
+        [
+            {"b_period": period, "b_metric": metric, "b_node": node, "b_delta": delta}
+            for (period, metric, node), delta in changes.items()
+        ],
+    )
+
+
+def record_attempt(attempt):
+    """Add a just-completed attempt to the user's boards (caller commits)"""
+    periods = list(period_keys(attempt.completed_at).values())
+    entries = {
+        entry.period: entry
+        for entry in LeaderboardEntry.query.filter(
+            LeaderboardEntry.user_id == attempt.user_id,
+            LeaderboardEntry.period.in_(periods),
+        )
+    }
+    changes = defaultdict(int)
+    for period in periods:
+        entry = entries.get(period)
+        if entry is None:
+            entry = LeaderboardEntry(
+                period=period, user_id=attempt.user_id, attempts=0, score_sum=0, best_score=0
+            )
+            db.session.add(entry)
+        else:
+            _count(changes, period, entry, -1)
+        entry.attempts += 1
+        entry.score_sum += attempt.score
+        entry.best_score = max(entry.best_score, attempt.score)
+        _set_buckets(entry)
+        _count(changes, period, entry, 1)
+    apply_changes(changes)
+
+
+def remove_user(user_id):
+    """Take a user off every board, for reset or deleted statistics (caller commits)"""
+    entries = LeaderboardEntry.query.filter_by(user_id=user_id).all()
+    changes = defaultdict(int)
+    for entry in entries:
+        _count(changes, entry.period, entry, -1)
+    apply_changes(changes)
+    db.session.execute(delete(LeaderboardEntry).where(LeaderboardEntry.user_id == user_id))
+
+
+def top_query(period, metric, limit):
+    column = getattr(LeaderboardEntry, f"{metric}_bucket")
+    return (
+        db.select(LeaderboardEntry, User.username)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .where(LeaderboardEntry.period == period)
+        .order_by(column.desc(), LeaderboardEntry.user_id)
+        .limit(limit)
+    )
+
+
+def top(kind, metric, limit):
+    """The first ``limit`` rows of a current board as dicts with their rank"""
+    results = db.session.execute(top_query(current_period(kind), metric, limit)).all()
+
+    rows = []
+    previous = None
+    for position, (entry, username) in enumerate(results, start=1):
+        score = getattr(entry, f"{metric}_bucket")
+        # Competition ranking: ties share the rank of the first of them
+        if score != previous:
+            rank_of_score, previous = position, score
+        rows.append(_row(entry, rank_of_score) | {"username": username})
+    return rows
+
+
+def rank(user_id, kind, metric):
+    """The user's row on a current board with rank and board size, or None"""
+    period = current_period(kind)
+    entry = db.session.get(LeaderboardEntry, (period, user_id))
+    if entry is None:
+        return None
+
+    own = list(_prefix_path(getattr(entry, f"{metric}_bucket")))
+    everyone = list(_prefix_path(BUCKETS - 1))
+    counts = dict(
+        db.session.execute(
+            db.select(LeaderboardNode.node, LeaderboardNode.count).where(
+                LeaderboardNode.period == period,
+                LeaderboardNode.metric == metric,
+                LeaderboardNode.node.in_(set(own + everyone)),
+            )
+        ).all()
+    )
+    total = sum(counts.get(node, 0) for node in everyone)
+    at_or_below = sum(counts.get(node, 0) for node in own)
+    return _row(entry, total - at_or_below + 1) | {"total": total}
+
+
+def _row(entry, rank):
+    return {
+        "rank": rank,
+        "user_id": entry.user_id,
+        "attempts": entry.attempts,
+        "best_score": round(entry.best_score, 2),
+        "average_score": round(entry.average_score, 2),
+    }
+
+
+def is_empty():
+    return db.session.execute(db.select(LeaderboardEntry.user_id).limit(1)).first() is None
+
+
+def rebuild(chunk_size=REBUILD_CHUNK_SIZE, progress=None):
+    """Recompute every board from the completed attempts (commits).
+
+    Attempts are streamed once in ID order and folded into per-period
+    totals in memory, which then replace the stored entries and trees.
+    Run it inside ``database_profile.run_write`` so that no quiz is
+    submitted in the meantime.
+    """
+    result = db.session.execute(
+        db.select(
+            QuizAttempt.user_id,
+            QuizAttempt.completed_at,
+            QuizAttempt.started_at,
+            QuizAttempt.score,
+        )
+        .where(QuizAttempt.is_completed.is_(True))
+        .order_by(QuizAttempt.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    # (period, user_id) -> [attempts, score_sum, best_score]
+    totals = {}
+    attempts = 0
+    for rows in result.partitions():
+        for user_id, completed_at, started_at, score in rows:
+            for period in period_keys(completed_at or started_at).values():
+                current = totals.get((period, user_id))
+                if current is None:
+                    totals[(period, user_id)] = [1, score, score]
+                else:
+                    current[0] += 1
+                    current[1] += score
+                    current[2] = max(current[2], score)
+        attempts += len(rows)
+        if progress:
+            progress(attempts)
+
+    entries = []
+    changes = defaultdict(int)
+    for (period, user_id), (count, score_sum, best_score) in totals.items():
+        row = {
+            "period": period,
+            "user_id": user_id,
+            "attempts": count,
+            "score_sum": score_sum,
+            "best_score": best_score,
+            "best_bucket": bucket(best_score),
+            "average_bucket": bucket(score_sum / count),
+        }
+        entries.append(row)
+        for metric in METRICS:
+            for node in _update_path(row[f"{metric}_bucket"]):
+                changes[(period, metric, node)] += 1
+    nodes = [
+        {"period": period, "metric": metric, "node": node, "count": count}
+        for (period, metric, node), count in changes.items()
+    ]
+
+    db.session.execute(delete(LeaderboardNode))
+    db.session.execute(delete(LeaderboardEntry))
+    for model, rows in ((LeaderboardEntry, entries), (LeaderboardNode, nodes)):
+        for start in range(0, len(rows), REBUILD_CHUNK_SIZE):
+            db.session.execute(insert(model), rows[start : start + REBUILD_CHUNK_SIZE])
+    db.session.commit()
+    return attempts, len(entries)
@@ -0,0 +1,234 @@
+"""Request and SQL instrumentation exposed in the Prometheus text format.
+
+Every request is timed into a latency histogram per endpoint.  SQLAlchemy
+engine events count the statements each request issues and the time spent
+in them.  When one request runs the same statement ``N_PLUS_ONE_THRESHOLD``
+times or more (executemany batches excluded), that is almost always a lazy
+load inside a loop.  It is counted per endpoint and statement and logged
+once per process.
+
+Recording costs a few dictionary updates per request and per statement, so
+it stays enabled in production.  Metrics are kept per process; with several
+gunicorn workers each scrape of ``/metrics`` reports the worker that
+served it.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from flask import request
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+STATEMENT_LABEL_LENGTH = 120
+BACKGROUND = "background"
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """(le, cumulative count) pairs ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield ("+Inf" if bound == float("inf") else repr(bound)), total
+
+
+class _RequestStats:
+    __slots__ = ("endpoint", "method", "started", "queries", "sql_seconds", "statements")
+
+    def __init__(self, endpoint, method):
+        self.endpoint = endpoint
+        self.method = method
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.statements = defaultdict(int)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _statement_label(statement):
+    return re.sub(r"\s+", " ", statement).strip()[:STATEMENT_LABEL_LENGTH]
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.n_plus_one_threshold = 10
+        # (endpoint, method) -> Histogram of seconds
+        self.latency = {}
+        # (endpoint, method, status) -> count
+        self.responses = defaultdict(int)
+        # endpoint -> Histogram of statements per request
+        self.queries_per_request = {}
+        self.sql_statements = defaultdict(int)
+        self.sql_seconds = defaultdict(float)
+        # (endpoint, statement) -> requests in which it repeated
+        self.repeated_statements = defaultdict(int)
+
+    def init_app(self, app, db):
+        self.enabled = app.config["METRICS_ENABLED"]
+        self.n_plus_one_threshold = app.config["N_PLUS_ONE_THRESHOLD"]
+        self.logger = app.logger
+        if not self.enabled:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._finish_response)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", self._before_execute)
+        event.listen(engine, "after_cursor_execute", self._after_execute)
+
+    # -- requests ------------------------------------------------------------
+
+    def _start_request(self):
+        _current.set(_RequestStats(request.endpoint or "unmatched", request.method))
+
+    def _finish_response(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        # Only still set when the request failed before after_request ran
+        if _current.get() is not None:
+            self._record(500)
+
+    def _record(self, status):
+        stats = _current.get()
+        if stats is None:
+            return
+        _current.set(None)
+        elapsed = time.perf_counter() - stats.started
+        key = (stats.endpoint, stats.method)
+        repeated = [
+            statement
+            for statement, count in stats.statements.items()
+            if count >= self.n_plus_one_threshold
+        ]
+
+        with self._lock:
+            histogram = self.latency.get(key)
+            if histogram is None:
+                histogram = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(elapsed)
+            self.responses[(stats.endpoint, stats.method, status)] += 1
+
+            histogram = self.queries_per_request.get(stats.endpoint)
+            if histogram is None:
+                histogram = self.queries_per_request[stats.endpoint] = Histogram(
+                    QUERY_COUNT_BUCKETS
+                )
+            histogram.observe(stats.queries)
+
+            first_seen = []
+            for statement in repeated:
+                repeated_key = (stats.endpoint, _statement_label(statement))
+                if repeated_key not in self.repeated_statements:
+                    first_seen.append((statement, stats.statements[statement]))
+                self.repeated_statements[repeated_key] += 1
+
+        for statement, count in first_seen:
+            self.logger.warning(
+                "Possible N+1 queries in %s: statement ran %d times in one request: %s",
+                stats.endpoint,
+                count,
+                _statement_label(statement),
+            )
+
+    # -- SQL -----------------------------------------------------------------
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["metrics_query_start"].pop()
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.sql_seconds += elapsed
+            if not executemany:
+                stats.statements[statement] += 1
+            endpoint = stats.endpoint
+        else:
+            endpoint = BACKGROUND
+        with self._lock:
+            self.sql_statements[endpoint] += 1
+            self.sql_seconds[endpoint] += elapsed
+
+    # -- exposition ----------------------------------------------------------
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP app_request_duration_seconds Request latency by endpoint")
+            lines.append("# TYPE app_request_duration_seconds histogram")
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+                total = 0
+                for le, total in histogram.samples():
+                    lines.append(f'app_request_duration_seconds_bucket{{{labels},le="{le}"}} {total}')
+                lines.append(f"app_request_duration_seconds_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"app_request_duration_seconds_count{{{labels}}} {total}")
+
+            lines.append("# HELP app_responses_total Responses by endpoint and status code")
+            lines.append("# TYPE app_responses_total counter")
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                lines.append(
+                    f'app_responses_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                    f'status="{status}"}} {count}'
+                )
+
+            lines.append("# HELP app_request_sql_statements SQL statements issued per request")
+            lines.append("# TYPE app_request_sql_statements histogram")
+            for endpoint, histogram in sorted(self.queries_per_request.items()):
+                labels = f'endpoint="{_label(endpoint)}"'
+                total = 0
+                for le, total in histogram.samples():
+                    lines.append(f'app_request_sql_statements_bucket{{{labels},le="{le}"}} {total}')
+                lines.append(f"app_request_sql_statements_sum{{{labels}}} {histogram.sum:g}")
+                lines.append(f"app_request_sql_statements_count{{{labels}}} {total}")
+
+            lines.append("# HELP app_sql_statements_total SQL statements executed by endpoint")
+            lines.append("# TYPE app_sql_statements_total counter")
+            for endpoint, count in sorted(self.sql_statements.items()):
+                lines.append(f'app_sql_statements_total{{endpoint="{_label(endpoint)}"}} {count}')
+
+            lines.append("# HELP app_sql_seconds_total Time spent executing SQL by endpoint")
+            lines.append("# TYPE app_sql_seconds_total counter")
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'app_sql_seconds_total{{endpoint="{_label(endpoint)}"}} {seconds}')
+
+            lines.append(
+                "# HELP app_n_plus_one_total Requests that ran one statement "
+                f"{self.n_plus_one_threshold} or more times"
+            )
+            lines.append("# TYPE app_n_plus_one_total counter")
+            for (endpoint, statement), count in sorted(self.repeated_statements.items()):
+                lines.append(
+                    f'app_n_plus_one_total{{endpoint="{_label(endpoint)}",'
+                    f'statement="{_label(statement)}"}} {count}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
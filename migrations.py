@@ -0,0 +1,190 @@
+"""Versioned schema migrations, applied at deploy time by scripts/migrate.py.
+
+Each migration has a version number, idempotent SQL statements and query
+plan checks.  A check runs EXPLAIN QUERY PLAN on one of the application's own
+hot queries and fails if SQLite would scan a whole table or sort the result
+in a temporary B-tree instead of reading it from an index.  A migration and
+its checks run in one transaction, so a migration whose index the planner
+does not use is rolled back and not recorded.
+
+New tables still come from ``db.create_all()``; migrations change existing
+ones.  Indexes added here are also declared on the models, so a fresh
+database already has them and the migration only records its version.
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+
+from answer_journal import UPDATE_ANSWER
+from leaderboard import top_query
+from models import db, QuizAttempt, SchemaMigration
+from pagination import attempts_query, encode_cursor
+from spaced_repetition import due_query
+
+PLAN_SCAN = "SCAN "
+
+
+class PlanCheck:
+    """A query that must be answered from an index.
+
+    ``require`` is text that must also appear in the plan, such as
+    "COVERING INDEX" for a query that should not read the table at all.
+    """
+
+    def __init__(self, description, build, require=None):
+        self.description = description
+        # Called inside an app context; returns a statement or ORM query
+        self.build = build
+        self.require = require
+
+    def statement(self):
+        built = self.build()
+        return getattr(built, "statement", built)
+
+
+class Migration:
+    def __init__(self, version, name, statements, checks=()):
+        self.version = version
+        self.name = name
+        self.statements = statements
+        self.checks = checks
+
+
+def _cursor_after_first_page():
+    return encode_cursor(["2025-01-01T00:00:00", 1])
+
+
+MIGRATIONS = [
+    Migration(
+        1,
+        "Index completed attempts by user and completion time",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_quiz_attempt_user_completed "
+            "ON quiz_attempt (user_id, is_completed, completed_at)",
+        ],
+        [
+            PlanCheck("dashboard: latest attempts", lambda: QuizAttempt.recent_completed(1, 5)),
+            PlanCheck("statistics: first page", lambda: attempts_query(1)),
+            PlanCheck(
+                "statistics: next page",
+                lambda: attempts_query(1, _cursor_after_first_page()),
+            ),
+        ],
+    ),
+    Migration(
+        2,
+        "Covering index for the answers of an attempt",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_attempt_question_answer "
+            "ON attempt_question (attempt_id, question_id, answer)",
+        ],
+        [
+            PlanCheck(
+                "quiz page: saved answers",
+                lambda: QuizAttempt.saved_answers_select(1),
+                require="USING COVERING INDEX ix_attempt_question_answer",
+            ),
+            PlanCheck(
+                "answer journal: answer update",
+                lambda: UPDATE_ANSWER,
+                require="(attempt_id=? AND question_id=?)",
+            ),
+        ],
+    ),
+    Migration(
+        3,
+        "Leaderboard entries ordered by score within a period",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_leaderboard_entry_best "
+            "ON leaderboard_entry (period, best_bucket DESC, user_id)",
+            "CREATE INDEX IF NOT EXISTS ix_leaderboard_entry_average "
+            "ON leaderboard_entry (period, average_bucket DESC, user_id)",
+        ],
+        [
+            PlanCheck(
+                "leaderboard: top by best score",
+                lambda: top_query("all", "best", 20),
+                require="INDEX ix_leaderboard_entry_best",
+            ),
+            PlanCheck(
+                "leaderboard: top by average score",
+                lambda: top_query("all", "average", 20),
+                require="INDEX ix_leaderboard_entry_average",
+            ),
+        ],
+    ),
+    Migration(
+        4,
+        "Due practice cards of a user in due order",
+        [
+            "CREATE INDEX IF NOT EXISTS ix_review_card_due "
+            "ON review_card (user_id, due_at, question_id)",
+        ],
+        [
+            PlanCheck(
+                "practice: next due cards",
+                lambda: due_query(1, datetime(2025, 1, 1), 10),
+                require="USING COVERING INDEX ix_review_card_due",
+            ),
+        ],
+    ),
+]
+
+
+def explain(connection, statement):
+    """EXPLAIN QUERY PLAN lines of a statement on SQLite"""
+    compiled = statement.compile(dialect=connection.dialect)
+    params = tuple(compiled.params.get(name) for name in compiled.positiontup or ())
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).all()
+    return [row[-1] for row in rows]
+
+
+def plan_problems(connection, checks):
+    """(check, plan) pairs of the checks whose plan scans, sorts or misses its index"""
+    problems = []
+    for check in checks:
+        plan = explain(connection, check.statement())
+        scans = any(line.startswith(PLAN_SCAN) or "TEMP B-TREE" in line for line in plan)
+        if scans or (check.require and not any(check.require in line for line in plan)):
+            problems.append((check, plan))
+    return problems
+
+
+def applied_versions():
+    return set(db.session.execute(select(SchemaMigration.version)).scalars())
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [migration for migration in MIGRATIONS if migration.version not in applied]
+
+
+def apply(migration):
+    """Run a migration and its plan checks in one transaction and record it.
+
+    Returns the failed checks with their plans; the migration is rolled back
+    if there are any.
+    """
+    connection = db.session.connection()
+    for statement in migration.statements:
+        connection.exec_driver_sql(statement)
+    problems = []
+    if connection.dialect.name == "sqlite":
+        problems = plan_problems(connection, migration.checks)
+    if problems:
+        db.session.rollback()
+        return problems
+    db.session.add(SchemaMigration(version=migration.version, name=migration.name))
+    db.session.commit()
+    return []
+
+
+def check_all():
+    """Plan check results of every applied migration, as (migration, problems)"""
+    connection = db.session.connection()
+    applied = applied_versions()
+    return [
+        (migration, plan_problems(connection, migration.checks))
+        for migration in MIGRATIONS
+        if migration.version in applied
+    ]
@@ -1,7 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import hashlib
 import json
 
 db = SQLAlchemy()
@@ -27,8 +29,155 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def get_statistics(self):
-        attempts = self.quiz_attempts
-        if not attempts:
+        return UserStats.for_user(self.id).to_dict()
+
+
+class Question(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    question_text = db.Column(db.Text, nullable=False)
+    option_a = db.Column(db.String(255), nullable=False)
+    option_b = db.Column(db.String(255), nullable=False)
+    option_c = db.Column(db.String(255), nullable=False)
+    option_d = db.Column(db.String(255), nullable=False)
+    correct_answer = db.Column(db.String(1), nullable=False)  # 'a', 'b', 'c', or 'd'
+    category = db.Column(db.String(100))
+    difficulty = db.Column(db.String(20), default="medium")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "question_text": self.question_text,
+            "options": {
+                "a": self.option_a,
+                "b": self.option_b,
+                "c": self.option_c,
+            },
+            "correct_answer": self.correct_answer,
+        }
+
+
+class UserStats(db.Model):
+    """Running totals of a user's completed quizzes.
+
+    Updated in the same transaction as submit_quiz, reset_statistics and
+    delete_user so that dashboards never have to scan a user's attempts.
+    ``rebuild`` recomputes the row from the attempt history.
+    """
+
+    RECENT_SCORES_LIMIT = 10
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    total_quizzes = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+    total_questions = db.Column(db.Integer, nullable=False, default=0)
+    best_attempt_id = db.Column(db.Integer)
+    best_correct = db.Column(db.Integer, nullable=False, default=0)
+    best_total = db.Column(db.Integer, nullable=False, default=0)
+    # JSON list of [completed_at ISO string, score], oldest first
+    recent_scores = db.Column(db.Text)
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Return the user's row, building it from history the first time"""
+        stats = db.session.get(cls, user_id)
+        if stats is None:
+            stats = cls.rebuild(user_id)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Built concurrently by another request
+                db.session.rollback()
+                stats = db.session.get(cls, user_id)
+        return stats
+
+    @classmethod
+    def record_attempt(cls, attempt):
+        """Add a just-completed attempt to the totals (caller commits)"""
+        stats = db.session.get(cls, attempt.user_id)
+        if stats is None:
+            db.session.flush()
+            return cls.rebuild(attempt.user_id)
+
+        stats.total_quizzes = (stats.total_quizzes or 0) + 1
+        stats.score_sum = (stats.score_sum or 0) + attempt.score
+        stats.correct_answers = (stats.correct_answers or 0) + attempt.correct_answers
+        stats.total_questions = (stats.total_questions or 0) + attempt.total_questions
+        if stats.best_attempt_id is None or attempt.correct_answers > stats.best_correct:
+            stats.best_attempt_id = attempt.id
+            stats.best_correct = attempt.correct_answers
+            stats.best_total = attempt.total_questions
+
+        recent = stats.get_recent_scores()
+        recent.append((attempt.completed_at, attempt.score))
+        stats.set_recent_scores(recent)
+        return stats
+
+    @classmethod
+    def reset(cls, user_id):
+        """Zero the totals of a user whose attempts were deleted (caller commits)"""
+        cls.query.filter_by(user_id=user_id).delete()
+        stats = cls(user_id=user_id)
+        db.session.add(stats)
+        return stats
+
+    @classmethod
+    def rebuild(cls, user_id):
+        """Recompute a user's row from their completed attempts (caller commits)"""
+        completed = (QuizAttempt.user_id == user_id) & QuizAttempt.is_completed.is_(True)
+        count, score_sum, correct, total = db.session.execute(
+            db.select(
+                db.func.count(QuizAttempt.id),
+                db.func.sum(QuizAttempt.score),
+                db.func.sum(QuizAttempt.correct_answers),
+                db.func.sum(QuizAttempt.total_questions),
+            ).where(completed)
+        ).one()
+        best = db.session.execute(
+            db.select(
+                QuizAttempt.id, QuizAttempt.correct_answers, QuizAttempt.total_questions
+            )
+            .where(completed)
+            .order_by(QuizAttempt.correct_answers.desc(), QuizAttempt.id)
+            .limit(1)
+        ).first()
+        recent = db.session.execute(
+            db.select(QuizAttempt.completed_at, QuizAttempt.score)
+            .where(completed)
+            .order_by(QuizAttempt.completed_at.desc())
+            .limit(cls.RECENT_SCORES_LIMIT)
+        ).all()
+
+        stats = db.session.get(cls, user_id)
+        if stats is None:
+            stats = cls(user_id=user_id)
+            db.session.add(stats)
+        stats.total_quizzes = count
+        stats.score_sum = score_sum or 0
+        stats.correct_answers = correct or 0
+        stats.total_questions = total or 0
+        stats.best_attempt_id, stats.best_correct, stats.best_total = best or (None, 0, 0)
+        stats.set_recent_scores(reversed(recent))
+        return stats
+
+    def get_recent_scores(self):
+        """Return the last scores as (completed_at, score) tuples, oldest first"""
+        if not self.recent_scores:
+            return []
+        return [
+            (datetime.fromisoformat(completed_at), score)
+            for completed_at, score in json.loads(self.recent_scores)
+        ]
+
+    def set_recent_scores(self, recent):
+        recent = [
+            [completed_at.isoformat(), score] for completed_at, score in recent
+        ]
+        self.recent_scores = json.dumps(recent[-self.RECENT_SCORES_LIMIT :])
+
+    def to_dict(self):
+        if not self.total_quizzes:
             return {
                 "total_quizzes": 0,
                 "average_score": "0.0/20",
@@ -36,49 +185,212 @@ class User(UserMixin, db.Model):
                 "total_questions_answered": 0,
                 "correct_answers": 0,
                 "accuracy_percentage": 0,
+                "recent_scores": [],
             }
 
-        total_quizzes = len(attempts)
-        scores = [attempt.score for attempt in attempts]
-        total_correct = sum(attempt.correct_answers for attempt in attempts)
-        total_questions = sum(attempt.total_questions for attempt in attempts)
-        
-        # Find the best attempt (highest correct answers)
-        best_attempt = max(attempts, key=lambda x: x.correct_answers)
-        best_score_absolute = f"{best_attempt.correct_answers}/{best_attempt.total_questions}"
-        
         # Calculate average score as absolute score (e.g., 17.2/20)
-        average_score_percentage = sum(scores) / total_quizzes
+        average_score_percentage = self.score_sum / self.total_quizzes
         average_correct_answers = (average_score_percentage / 100) * 20  # Assuming 20 questions per quiz
-        average_score_absolute = f"{average_correct_answers:.1f}/20"
 
         return {
-            "total_quizzes": total_quizzes,
-            "average_score": average_score_absolute,
-            "best_score": best_score_absolute,
-            "total_questions_answered": total_questions,
-            "correct_answers": total_correct,
-            "accuracy_percentage": round((total_correct / total_questions * 100), 2)
-            if total_questions > 0
+            "total_quizzes": self.total_quizzes,
+            "average_score": f"{average_correct_answers:.1f}/20",
+            "best_score": f"{self.best_correct}/{self.best_total}",
+            "total_questions_answered": self.total_questions,
+            "correct_answers": self.correct_answers,
+            "accuracy_percentage": round(
+                (self.correct_answers / self.total_questions * 100), 2
+            )
+            if self.total_questions > 0
             else 0,
+            "recent_scores": self.get_recent_scores(),
         }
 
 
-class Question(db.Model):
+class QuestionStats(db.Model):
+    """How a question has fared in submitted quizzes (see question_analytics.py)"""
+
+    # Not a foreign key: statistics outlive deleted questions
+    question_id = db.Column(db.Integer, primary_key=True)
+    times_served = db.Column(db.Integer, nullable=False, default=0)
+    times_correct = db.Column(db.Integer, nullable=False, default=0)
+    times_unanswered = db.Column(db.Integer, nullable=False, default=0)
+    answers_a = db.Column(db.Integer, nullable=False, default=0)
+    answers_b = db.Column(db.Integer, nullable=False, default=0)
+    answers_c = db.Column(db.Integer, nullable=False, default=0)
+    answers_d = db.Column(db.Integer, nullable=False, default=0)
+    # Answers with a measured time-to-answer and the sum of those times
+    timed_answers = db.Column(db.Integer, nullable=False, default=0)
+    total_answer_seconds = db.Column(db.Float, nullable=False, default=0)
+
+    @property
+    def correct_rate(self):
+        return self.times_correct / self.times_served if self.times_served else None
+
+    @property
+    def mean_answer_seconds(self):
+        return self.total_answer_seconds / self.timed_answers if self.timed_answers else None
+
+    def answer_counts(self):
+        return {
+            "a": self.answers_a,
+            "b": self.answers_b,
+            "c": self.answers_c,
+            "d": self.answers_d,
+        }
+
+
+class UserQuestionStats(db.Model):
+    """How often one user was served a question and answered it correctly"""
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    question_id = db.Column(db.Integer, primary_key=True)
+    times_served = db.Column(db.Integer, nullable=False, default=0)
+    times_correct = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LeaderboardEntry(db.Model):
+    """A user's totals in one leaderboard period (see leaderboard.py)"""
+
+    # "all", "month-2025-06" or "week-2025-06-02" (Monday, Athens time)
+    period = db.Column(db.String(16), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+    best_score = db.Column(db.Float, nullable=False, default=0)
+    # Scores in hundredths of a percent, the positions in LeaderboardNode
+    best_bucket = db.Column(db.Integer, nullable=False, default=0)
+    average_bucket = db.Column(db.Integer, nullable=False, default=0)
+
+    @property
+    def average_score(self):
+        return self.score_sum / self.attempts if self.attempts else 0
+
+
+# Top-N of a period is read straight off these, highest score first
+db.Index(
+    "ix_leaderboard_entry_best",
+    LeaderboardEntry.period,
+    LeaderboardEntry.best_bucket.desc(),
+    LeaderboardEntry.user_id,
+)
+db.Index(
+    "ix_leaderboard_entry_average",
+    LeaderboardEntry.period,
+    LeaderboardEntry.average_bucket.desc(),
+    LeaderboardEntry.user_id,
+)
+
+
+class LeaderboardNode(db.Model):
+    """Node of a Fenwick tree counting users per score bucket.
+
+    There is one tree per leaderboard period and metric; a user's rank is
+    one plus the number of users in higher buckets, read from O(log n) nodes.
+    """
+
+    period = db.Column(db.String(16), primary_key=True)
+    metric = db.Column(db.String(8), primary_key=True)
+    node = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ReviewCard(db.Model):
+    """Spaced-repetition schedule of one question for one user (see spaced_repetition.py)"""
+
+    __table_args__ = (
+        # The user's due cards, oldest first, without reading the table
+        db.Index("ix_review_card_due", "user_id", "due_at", "question_id"),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    # Not a foreign key, like UserQuestionStats; cards of deleted questions are dropped
+    question_id = db.Column(db.Integer, primary_key=True)
+    ease = db.Column(db.Float, nullable=False, default=2.5)
+    interval_days = db.Column(db.Integer, nullable=False, default=0)
+    repetitions = db.Column(db.Integer, nullable=False, default=0)
+    lapses = db.Column(db.Integer, nullable=False, default=0)
+    due_at = db.Column(db.DateTime, nullable=False)
+    reviewed_at = db.Column(db.DateTime)
+    # Client-side sequence number of the last review, so replays are ignored
+    review_seq = db.Column(db.BigInteger)
+
+
+class QuestionBankVersion(db.Model):
+    """Single-row counter bumped whenever the question table changes.
+
+    Every worker process keeps its own in-memory copy of the question bank
+    (see question_bank.py) and compares this counter to know when to reload.
+    """
+
     id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserCacheVersion(db.Model):
+    """Single-row counter bumped whenever a user is deleted or changes rights.
+
+    Every worker process caches logged-in users (see user_cache.py) and
+    compares this counter to know when its cached users are stale.
+    """
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SchemaMigration(db.Model):
+    """A versioned schema migration applied to this database (see migrations.py)"""
+
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class QuestionRevision(db.Model):
+    """Immutable copy of a question's content as it was served in quizzes.
+
+    A new revision is created whenever a question's text, options or correct
+    answer change, so old attempts keep showing what was actually asked.
+    """
+
+    __table_args__ = (db.UniqueConstraint("question_id", "content_hash"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: revisions outlive deleted questions
+    question_id = db.Column(db.Integer, nullable=False)
     question_text = db.Column(db.Text, nullable=False)
     option_a = db.Column(db.String(255), nullable=False)
     option_b = db.Column(db.String(255), nullable=False)
     option_c = db.Column(db.String(255), nullable=False)
-    option_d = db.Column(db.String(255), nullable=False)
-    correct_answer = db.Column(db.String(1), nullable=False)  # 'a', 'b', 'c', or 'd'
-    category = db.Column(db.String(100))
-    difficulty = db.Column(db.String(20), default="medium")
+    correct_answer = db.Column(db.String(1), nullable=False)
+    content_hash = db.Column(db.String(40), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    @staticmethod
+    def compute_hash(question_text, options, correct_answer):
+        parts = (question_text, options["a"], options["b"], options["c"], correct_answer)
+        return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    @classmethod
+    def from_dict(cls, question_dict):
+        """Build a revision from a ``Question.to_dict()`` style payload"""
+        options = question_dict["options"]
+        return cls(
+            question_id=question_dict["id"],
+            question_text=question_dict["question_text"],
+            option_a=options["a"],
+            option_b=options["b"],
+            option_c=options["c"],
+            correct_answer=question_dict["correct_answer"],
+            content_hash=cls.compute_hash(
+                question_dict["question_text"], options, question_dict["correct_answer"]
+            ),
+        )
+
     def to_dict(self):
         return {
-            "id": self.id,
+            "id": self.question_id,
+            "revision_id": self.id,
             "question_text": self.question_text,
             "options": {
                 "a": self.option_a,
@@ -89,11 +401,42 @@ class Question(db.Model):
         }
 
 
+class AttemptQuestion(db.Model):
+    """One question of a quiz attempt and the answer the user chose"""
+
+    __table_args__ = (
+        # Covers reading the saved answers of an attempt and single-answer
+        # updates by (attempt, question); see migrations.py
+        db.Index("ix_attempt_question_answer", "attempt_id", "question_id", "answer"),
+    )
+
+    attempt_id = db.Column(
+        db.Integer, db.ForeignKey("quiz_attempt.id"), primary_key=True
+    )
+    position = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, nullable=False)
+    revision_id = db.Column(
+        db.Integer, db.ForeignKey("question_revision.id"), nullable=False
+    )
+    answer = db.Column(db.String(1))
+    # Client-side sequence number of the stored answer (see answer_journal.py)
+    answer_seq = db.Column(db.BigInteger)
+
+    revision = db.relationship("QuestionRevision", lazy="joined")
+
+
 class QuizAttempt(db.Model):
+    __table_args__ = (
+        # Completed attempts of a user, newest first (dashboard, statistics)
+        db.Index("ix_quiz_attempt_user_completed", "user_id", "is_completed", "completed_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    questions_data = db.Column(db.Text, nullable=False)  # JSON string of questions
-    user_answers = db.Column(db.Text)  # JSON string of user answers
+    # Legacy JSON snapshots; new attempts store their questions as AttemptQuestion
+    # rows and leave these empty (see scripts/migrate_attempt_questions.py)
+    questions_data = db.Column(db.Text, nullable=False, default="")
+    user_answers = db.Column(db.Text)
     score = db.Column(db.Float, nullable=False, default=0)
     correct_answers = db.Column(db.Integer, nullable=False, default=0)
     total_questions = db.Column(db.Integer, nullable=False, default=20)
@@ -101,18 +444,85 @@ class QuizAttempt(db.Model):
     completed_at = db.Column(db.DateTime)
     is_completed = db.Column(db.Boolean, default=False)
 
+    question_rows = db.relationship(
+        "AttemptQuestion",
+        order_by="AttemptQuestion.position",
+        lazy=True,
+        cascade="all, delete-orphan",
+    )
+
     def get_questions(self):
+        if self.question_rows:
+            return [row.revision.to_dict() for row in self.question_rows]
         return json.loads(self.questions_data) if self.questions_data else []
 
     def set_questions(self, questions_list):
-        self.questions_data = json.dumps(questions_list)
+        """Store the quiz questions; each needs an ``id`` and ``revision_id``"""
+        self.question_rows = [
+            AttemptQuestion(
+                position=position,
+                question_id=question["id"],
+                revision_id=question["revision_id"],
+            )
+            for position, question in enumerate(questions_list)
+        ]
+        self.questions_data = ""
 
     def get_user_answers(self):
+        if self.question_rows:
+            return {
+                str(row.question_id): row.answer
+                for row in self.question_rows
+                if row.answer
+            }
         return json.loads(self.user_answers) if self.user_answers else {}
 
+    @staticmethod
+    def saved_answers_select(attempt_id):
+        return db.select(AttemptQuestion.question_id, AttemptQuestion.answer).where(
+            AttemptQuestion.attempt_id == attempt_id,
+            AttemptQuestion.answer.is_not(None),
+        )
+
+    def get_saved_answers(self):
+        """Answers chosen so far, read without loading the questions"""
+        rows = db.session.execute(self.saved_answers_select(self.id)).all()
+        if rows or not self.questions_data:
+            return {str(question_id): answer for question_id, answer in rows}
+        return self.get_user_answers()
+
     def set_user_answers(self, answers_dict):
         self.user_answers = json.dumps(answers_dict)
 
+    def set_answer(self, question_id, answer):
+        """Record the answer to one question with a single-row UPDATE"""
+        updated = AttemptQuestion.query.filter_by(
+            attempt_id=self.id, question_id=int(question_id)
+        ).update({"answer": answer})
+        if not updated and self.questions_data:
+            # Attempt started before the attempt_question table existed
+            user_answers = self.get_user_answers()
+            user_answers[str(question_id)] = answer
+            self.set_user_answers(user_answers)
+
+    @classmethod
+    def recent_completed(cls, user_id, limit):
+        """Query for the user's latest completed attempts"""
+        return (
+            cls.query.filter_by(user_id=user_id, is_completed=True)
+            .order_by(cls.completed_at.desc())
+            .limit(limit)
+        )
+
+    @classmethod
+    def delete_for_user(cls, user_id):
+        """Bulk-delete all attempts of a user together with their question rows"""
+        attempt_ids = db.select(cls.id).where(cls.user_id == user_id)
+        AttemptQuestion.query.filter(
+            AttemptQuestion.attempt_id.in_(attempt_ids)
+        ).delete(synchronize_session=False)
+        cls.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+
     def calculate_score(self):
         questions = self.get_questions()
         answers = self.get_user_answers()
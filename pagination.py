@@ -0,0 +1,92 @@
+"""Keyset (cursor) pagination for attempt, user and question listings.
+
+Pages are fetched with ``WHERE sort_key < last_key_seen ORDER BY sort_key
+LIMIT n + 1`` instead of loading everything or using OFFSET, so each page
+costs the same small index range scan however many rows exist.  The cursor
+handed to the client is an opaque, URL-safe encoding of the last sort key.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from models import db, QuizAttempt
+
+
+class Page:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+
+def encode_cursor(values):
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return the list of key values in a cursor, or None if it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, binascii.Error):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def _finish(items, per_page, key):
+    if len(items) <= per_page:
+        return Page(items, None)
+    items = items[:per_page]
+    return Page(items, encode_cursor(key(items[-1])))
+
+
+def attempts_query(user_id, cursor=None, per_page=20):
+    """Query for one page of a user's completed attempts, plus one to detect more"""
+    query = QuizAttempt.query.filter_by(user_id=user_id, is_completed=True).options(
+        db.defer(QuizAttempt.questions_data), db.defer(QuizAttempt.user_answers)
+    )
+
+    key = decode_cursor(cursor)
+    try:
+        completed_at, attempt_id = datetime.fromisoformat(key[0]), int(key[1])
+    except (TypeError, ValueError, IndexError):
+        completed_at = None
+    if completed_at is not None:
+        query = query.filter(
+            db.or_(
+                QuizAttempt.completed_at < completed_at,
+                db.and_(
+                    QuizAttempt.completed_at == completed_at,
+                    QuizAttempt.id < attempt_id,
+                ),
+            )
+        )
+
+    return query.order_by(QuizAttempt.completed_at.desc(), QuizAttempt.id.desc()).limit(
+        per_page + 1
+    )
+
+
+def paginate_attempts(user_id, cursor=None, per_page=20):
+    """Completed attempts of a user, newest first"""
+    items = attempts_query(user_id, cursor, per_page).all()
+    return _finish(items, per_page, lambda a: [a.completed_at, a.id])
+
+
+def paginate_by_id(model, cursor=None, per_page=50):
+    """Rows of ``model`` in ascending ID order"""
+    query = model.query
+    key = decode_cursor(cursor)
+    try:
+        last_id = int(key[0])
+    except (TypeError, ValueError, IndexError):
+        last_id = None
+    if last_id is not None:
+        query = query.filter(model.id > last_id)
+
+    items = query.order_by(model.id).limit(per_page + 1).all()
+    return _finish(items, per_page, lambda row: [row.id])
@@ -0,0 +1,149 @@
+"""Password hashing off the request threads, and login throttling.
+
+Werkzeug's password hashes are slow on purpose.  When a whole class logs in
+at once, hashing inline let every request thread of a worker compute one,
+and quiz requests waited behind them.  ``PasswordHasher`` runs hashes on a
+small thread pool per worker process instead.  At most
+``PASSWORD_HASH_WORKERS`` hashes run at once and at most
+``PASSWORD_HASH_QUEUE`` more wait for a slot; any further login is turned
+away at once with ``HashingBusy``, leaving the other request threads free
+for quiz traffic.  On Linux the hashing threads also run at a lower CPU
+priority (``PASSWORD_HASH_NICE``), so a busy machine serves quiz requests
+first and hashes with the CPU time left over.
+
+``TokenBuckets`` throttles repeated login attempts per client IP and per
+username.  Buckets are kept per worker process, so with several workers the
+limits apply to each worker separately.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue of this worker is full"""
+
+
+class PasswordHasher:
+    def __init__(self):
+        self.max_workers = 1
+        self.max_queued = 2
+        self.nice = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._slots = None
+
+    def init_app(self, app):
+        self.max_workers = app.config["PASSWORD_HASH_WORKERS"]
+        self.max_queued = app.config["PASSWORD_HASH_QUEUE"]
+        self.nice = app.config["PASSWORD_HASH_NICE"]
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def _run(self, fn, *args):
+        executor, slots = self._ensure_executor()
+        if not slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            slots.release()
+
+    def _ensure_executor(self):
+        # Checked by PID so that forked workers start their own pool
+        with self._lock:
+            if self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="password-hash",
+                    initializer=self._lower_priority,
+                )
+                self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queued)
+                self._executor_pid = os.getpid()
+            return self._executor, self._slots
+
+    def _lower_priority(self):
+        # Linux schedules threads separately, so only the hashing thread is reniced
+        if self.nice and hasattr(os, "setpriority"):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
+            except OSError:
+                pass
+
+
+class TokenBuckets:
+    """Token bucket per key, for the most recently seen ``max_keys`` keys"""
+
+    def __init__(self, burst=5, per_minute=5, max_keys=10000):
+        self.burst = burst
+        self.per_minute = per_minute
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> (tokens, monotonic time of the last update)
+        self._buckets = OrderedDict()
+
+    def configure(self, burst, per_minute):
+        self.burst = burst
+        self.per_minute = per_minute
+
+    def take(self, key):
+        """Take a token for ``key``; returns 0 or the seconds until one is available"""
+        now = time.monotonic()
+        rate = self.per_minute / 60
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key):
+        """Give back the token of an attempt that was not served"""
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(self.burst, tokens + 1), updated)
+
+
+class LoginLimiter:
+    def __init__(self):
+        self.by_ip = TokenBuckets()
+        self.by_username = TokenBuckets()
+
+    def init_app(self, app):
+        self.by_ip.configure(app.config["LOGIN_IP_BURST"], app.config["LOGIN_IP_PER_MINUTE"])
+        self.by_username.configure(
+            app.config["LOGIN_USERNAME_BURST"], app.config["LOGIN_USERNAME_PER_MINUTE"]
+        )
+
+    def check(self, ip, username=None):
+        """Seconds the client must wait before trying again, 0 if it may try now"""
+        wait = self.by_ip.take(ip)
+        if username is not None:
+            wait = max(wait, self.by_username.take(username.strip().lower()))
+        return wait
+
+    def refund(self, ip, username=None):
+        """Undo ``check`` for an attempt turned away because hashing was busy"""
+        self.by_ip.refund(ip)
+        if username is not None:
+            self.by_username.refund(username.strip().lower())
+
+
+password_hasher = PasswordHasher()
+login_limiter = LoginLimiter()
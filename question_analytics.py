@@ -0,0 +1,304 @@
+"""Per-question difficulty analytics.
+
+``QuestionStats`` keeps, per question, how often it was served and answered
+correctly, how the answers were distributed over the options and how long
+people took to answer it.  ``record_attempt`` adds one submitted quiz with
+SQL-side increments; ``backfill`` recomputes every figure from the attempt
+history, streaming attempts in ID-ordered chunks and aggregating each chunk
+in one GROUP BY query.  That query applies the same rules as
+``attempt_outcomes`` and ``accumulate``, which score single attempts and
+the legacy JSON ones.
+
+Time-to-answer is estimated from the client timestamps stored as
+``AttemptQuestion.answer_seq``: the gap between an answer and the previous
+answer of the same attempt.  The first answer of an attempt is not timed.
+"""
+import json
+from collections import defaultdict
+
+from sqlalchemy import and_, bindparam, case, delete, func, insert, update
+from sqlalchemy.exc import IntegrityError
+
+from models import db, AttemptQuestion, Question, QuestionRevision, QuestionStats, QuizAttempt
+
+# Longer gaps between two answers are idle time rather than answering time
+MAX_ANSWER_SECONDS = 600
+BACKFILL_CHUNK_SIZE = 1000
+ANSWER_OPTIONS = ("a", "b", "c", "d")
+COUNTERS = (
+    "times_served",
+    "times_correct",
+    "times_unanswered",
+    "answers_a",
+    "answers_b",
+    "answers_c",
+    "answers_d",
+    "timed_answers",
+    "total_answer_seconds",
+)
+
+
+def new_totals():
+    return defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+
+def attempt_outcomes(rows):
+    """Turn one attempt's (question_id, answer, answer_seq, correct_answer)
+    rows into (question_id, answer, is_correct, seconds) outcomes"""
+    timed = sorted((row for row in rows if row[1] and row[2]), key=lambda row: row[2])
+    seconds = {}
+    for previous, current in zip(timed, timed[1:]):
+        gap = (current[2] - previous[2]) / 1000
+        if 0 < gap <= MAX_ANSWER_SECONDS:
+            seconds[current[0]] = gap
+    return [
+        (question_id, answer, answer == correct_answer, seconds.get(question_id))
+        for question_id, answer, _, correct_answer in rows
+    ]
+
+
+def accumulate(totals, outcomes):
+    for question_id, answer, is_correct, seconds in outcomes:
+        counters = totals[question_id]
+        counters["times_served"] += 1
+        if is_correct:
+            counters["times_correct"] += 1
+        if answer in ANSWER_OPTIONS:
+            counters[f"answers_{answer}"] += 1
+        else:
+            counters["times_unanswered"] += 1
+        if seconds is not None:
+            counters["timed_answers"] += 1
+            counters["total_answer_seconds"] += seconds
+
+
+def attempt_rows(attempt):
+    """Outcome rows of one attempt, read from attempt_question or legacy JSON"""
+    if attempt.question_rows:
+        return [
+            (row.question_id, row.answer, row.answer_seq, row.revision.correct_answer)
+            for row in attempt.question_rows
+        ]
+    answers = attempt.get_user_answers()
+    return [
+        (question["id"], answers.get(str(question["id"])), None, question["correct_answer"])
+        for question in attempt.get_questions()
+    ]
+
+
+def record_attempt(attempt):
+    """Add a just-scored attempt to the question statistics (caller commits).
+
+    Returns the attempt's outcomes for other per-question bookkeeping.
+    """
+    outcomes = attempt_outcomes(attempt_rows(attempt))
+    totals = new_totals()
+    accumulate(totals, outcomes)
+    if totals:
+        apply_increments(totals)
+    return outcomes
+
+
+def _insert_missing(question_ids):
+    existing = set(
+        db.session.execute(
+            db.select(QuestionStats.question_id).where(
+                QuestionStats.question_id.in_(question_ids)
+            )
+        ).scalars()
+    )
+    missing = [q_id for q_id in question_ids if q_id not in existing]
+    if missing:
+        with db.session.begin_nested():
+            db.session.execute(
+                insert(QuestionStats),
+                [dict.fromkeys(COUNTERS, 0) | {"question_id": q_id} for q_id in missing],
+            )
+
+
+def apply_increments(totals):
+    """Add per-question counters to the stored rows with UPDATE ... SET x = x + ?"""
+    question_ids = list(totals)
+    try:
+        _insert_missing(question_ids)
+    except IntegrityError:
+        # Another submission created some of the rows first
+        _insert_missing(question_ids)
+
+    table = QuestionStats.__table__
+    statement = (
+        update(table)
+        .where(table.c.question_id == bindparam("b_question_id"))
+        .values({name: table.c[name] + bindparam(f"b_{name}") for name in COUNTERS})
+    )
+    db.session.execute(
+        statement,
+        [
+            {"b_question_id": q_id, **{f"b_{name}": value for name, value in counters.items()}}
+            for q_id, counters in totals.items()
+        ],
+    )
+
+
+def _chunk_totals_query(in_chunk):
+    """Per-question counters of the attempt_question rows of a chunk.
+
+    One GROUP BY over the chunk; answer times come from a window over each
+    attempt's timed answers in ``answer_seq`` order, like ``attempt_outcomes``.
+    """
+    timed = case(
+        (
+            and_(
+                AttemptQuestion.answer.is_not(None),
+                AttemptQuestion.answer != "",
+                AttemptQuestion.answer_seq.is_not(None),
+                AttemptQuestion.answer_seq != 0,
+            ),
+            1,
+        ),
+        else_=0,
+    )
+    rows = (
+        db.select(
+            AttemptQuestion.question_id,
+            AttemptQuestion.answer,
+            (AttemptQuestion.answer == QuestionRevision.correct_answer).label("is_correct"),
+            (
+                AttemptQuestion.answer_seq
+                - func.lag(AttemptQuestion.answer_seq).over(
+                    partition_by=(AttemptQuestion.attempt_id, timed),
+                    order_by=(AttemptQuestion.answer_seq, AttemptQuestion.position),
+                )
+            ).label("gap"),
+            timed.label("timed"),
+        )
+        .join(QuizAttempt, QuizAttempt.id == AttemptQuestion.attempt_id)
+        .join(QuestionRevision, QuestionRevision.id == AttemptQuestion.revision_id)
+        .where(in_chunk)
+        .subquery()
+    )
+    in_time = and_(
+        rows.c.timed == 1, rows.c.gap > 0, rows.c.gap <= MAX_ANSWER_SECONDS * 1000
+    )
+
+    def count(condition):
+        return func.sum(case((condition, 1), else_=0))
+
+    return db.select(
+        rows.c.question_id,
+        func.count().label("times_served"),
+        count(rows.c.is_correct).label("times_correct"),
+        count(~rows.c.answer.in_(ANSWER_OPTIONS) | rows.c.answer.is_(None)).label(
+            "times_unanswered"
+        ),
+        *(count(rows.c.answer == option).label(f"answers_{option}") for option in ANSWER_OPTIONS),
+        count(in_time).label("timed_answers"),
+        func.sum(case((in_time, rows.c.gap), else_=0)).label("total_answer_ms"),
+    ).group_by(rows.c.question_id)
+
+
+def _accumulate_chunk(totals, first_id, last_id):
+    """Fold the completed attempts with first_id <= id <= last_id into totals"""
+    in_chunk = QuizAttempt.id.between(first_id, last_id) & QuizAttempt.is_completed.is_(True)
+
+    for row in db.session.execute(_chunk_totals_query(in_chunk)).mappings():
+        counters = totals[row["question_id"]]
+        for name in COUNTERS:
+            if name != "total_answer_seconds":
+                counters[name] += row[name]
+        counters["total_answer_seconds"] += row["total_answer_ms"] / 1000
+
+    # Attempts that still keep their questions as a JSON snapshot
+    legacy = db.session.execute(
+        db.select(QuizAttempt.questions_data, QuizAttempt.user_answers).where(
+            in_chunk, QuizAttempt.questions_data != ""
+        )
+    )
+    for questions_data, user_answers in legacy:
+        answers = json.loads(user_answers) if user_answers else {}
+        accumulate(
+            totals,
+            attempt_outcomes(
+                [
+                    (q["id"], answers.get(str(q["id"])), None, q["correct_answer"])
+                    for q in json.loads(questions_data)
+                ]
+            ),
+        )
+
+
+def backfill(chunk_size=BACKFILL_CHUNK_SIZE, progress=None):
+    """Recompute all question statistics from the attempt history.
+
+    Attempts are streamed in chunks of ``chunk_size`` IDs and folded into
+    in-memory totals (one entry per question), which then replace the
+    stored statistics in a single transaction.
+    """
+    totals = new_totals()
+    last_id = 0
+    attempts = 0
+    while True:
+        attempt_ids = (
+            db.session.execute(
+                db.select(QuizAttempt.id)
+                .where(QuizAttempt.id > last_id, QuizAttempt.is_completed.is_(True))
+                .order_by(QuizAttempt.id)
+                .limit(chunk_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not attempt_ids:
+            break
+        _accumulate_chunk(totals, attempt_ids[0], attempt_ids[-1])
+        attempts += len(attempt_ids)
+        last_id = attempt_ids[-1]
+        if progress:
+            progress(attempts)
+
+    db.session.execute(delete(QuestionStats))
+    rows = [counters | {"question_id": q_id} for q_id, counters in totals.items()]
+    for start in range(0, len(rows), BACKFILL_CHUNK_SIZE):
+        db.session.execute(insert(QuestionStats), rows[start : start + BACKFILL_CHUNK_SIZE])
+    db.session.commit()
+    return attempts, len(rows)
+
+
+SORTS = {
+    "hardest": lambda row: (row["correct_rate"], -row["times_served"]),
+    "confusing": lambda row: (-row["distractor_rate"], row["correct_rate"]),
+    "slowest": lambda row: -(row["mean_answer_seconds"] or 0),
+    "served": lambda row: -row["times_served"],
+}
+
+
+def question_report(sort="hardest", min_served=5, limit=100):
+    """Rows for the admin analytics view, sorted by one of ``SORTS``"""
+    results = db.session.execute(
+        db.select(QuestionStats, Question.question_text, Question.correct_answer)
+        .join(Question, Question.id == QuestionStats.question_id)
+        .where(QuestionStats.times_served >= min_served)
+    )
+    report = []
+    for stats, question_text, correct_answer in results:
+        counts = stats.answer_counts()
+        wrong = {option: n for option, n in counts.items() if option != correct_answer}
+        distractor = max(wrong, key=wrong.get) if any(wrong.values()) else None
+        report.append(
+            {
+                "question_id": stats.question_id,
+                "question_text": question_text,
+                "correct_answer": correct_answer,
+                "times_served": stats.times_served,
+                "correct_rate": stats.correct_rate,
+                "answer_counts": counts,
+                "unanswered": stats.times_unanswered,
+                "distractor": distractor,
+                "distractor_rate": wrong[distractor] / stats.times_served
+                if distractor
+                else 0,
+                "mean_answer_seconds": stats.mean_answer_seconds,
+            }
+        )
+    report.sort(key=SORTS.get(sort, SORTS["hardest"]))
+    return report[:limit]
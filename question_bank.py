@@ -0,0 +1,173 @@
+"""Process-local cache of the question bank used to build quizzes.
+
+Starting a quiz used to run ``COUNT(*)`` plus ``ORDER BY RANDOM()`` over the
+whole question table and serialize every sampled row.  Instead, each process
+keeps an immutable snapshot of all question IDs and the payloads of their
+current ``QuestionRevision`` and samples from it in memory.  Snapshots are
+versioned through the single ``QuestionBankVersion`` row, so a change made by
+any worker (or by ``scripts/reload_questions.py``) is picked up by every other
+process on its next quiz start.
+"""
+import random
+import threading
+from array import array
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Question, QuestionBankVersion, QuestionRevision
+
+VERSION_ROW_ID = 1
+
+
+class QuestionBankSnapshot:
+    """Immutable, array-backed view of the question bank at one version"""
+
+    def __init__(self, version, ids, chapters, payloads):
+        self.version = version
+        self.ids = ids
+        self.chapters = chapters
+        self.payloads = payloads
+        self.position_of = {question_id: i for i, question_id in enumerate(ids)}
+        # Chapter (Question.category) -> positions of its questions
+        self.positions_by_chapter = {}
+        for i, chapter in enumerate(chapters):
+            self.positions_by_chapter.setdefault(chapter, array("l")).append(i)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sample(self, k):
+        """Return ``k`` distinct question payloads, chosen uniformly in O(k).
+
+        The payloads are shared between callers and must not be modified.
+        """
+        positions = random.sample(range(len(self.ids)), k)
+        return [self.payloads[i] for i in positions]
+
+    def sample_stratified(self, blueprint):
+        """Return ``count`` random payloads from each chapter of ``blueprint``,
+        shuffled together so that the order does not give the chapters away.
+
+        Uses the precomputed chapter index; check ``blueprint_problems``
+        first, as a chapter with too few questions raises ``ValueError``.
+        """
+        payloads = []
+        for chapter, count in blueprint.items():
+            positions = self.positions_by_chapter.get(chapter, ())
+            payloads.extend(self.payloads[i] for i in random.sample(positions, count))
+        random.shuffle(payloads)
+        return payloads
+
+    def blueprint_problems(self, blueprint, questions_per_quiz):
+        """Describe why ``blueprint`` cannot be served from this bank, if it can't"""
+        problems = []
+        total = sum(blueprint.values())
+        if total != questions_per_quiz:
+            problems.append(
+                f"Blueprint asks for {total} questions but a quiz has {questions_per_quiz}."
+            )
+        for chapter, count in blueprint.items():
+            available = len(self.positions_by_chapter.get(chapter, ()))
+            if available < count:
+                problems.append(
+                    f"Chapter {chapter} has {available} questions but the blueprint needs {count}."
+                )
+        return problems
+
+
+class QuestionBank:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def current_version(self):
+        version = (
+            db.session.query(QuestionBankVersion.version)
+            .filter_by(id=VERSION_ROW_ID)
+            .scalar()
+        )
+        return version or 0
+
+    def snapshot(self):
+        """Return the snapshot for the current version, reloading if stale"""
+        version = self.current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._load(version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        """Drop the local snapshot; the next call to snapshot() reloads it"""
+        self._snapshot = None
+
+    def _load(self, version):
+        # Read into plain values first: current_revision_payloads may commit
+        # or roll back, which expires the rows and would reload each one
+        rows = [(q.category, q.to_dict()) for q in Question.query.order_by(Question.id)]
+        revision_payloads = current_revision_payloads([question for _, question in rows])
+        ids = array("l", (question["id"] for _, question in rows))
+        chapters = tuple(chapter for chapter, _ in rows)
+        payloads = tuple(revision_payloads[question["id"]] for _, question in rows)
+        return QuestionBankSnapshot(version, ids, chapters, payloads)
+
+
+question_bank = QuestionBank()
+
+
+def current_revision_payloads(questions):
+    """Map question IDs to the payload of the revision matching their content.
+
+    ``questions`` are ``Question.to_dict()`` payloads.  Revisions are created
+    (and committed) for new or edited questions.
+    """
+    for retry in (False, True):
+        known = {
+            (r.question_id, r.content_hash): r for r in QuestionRevision.query.all()
+        }
+        revisions = {}
+        created = False
+        for question in questions:
+            revision = QuestionRevision.from_dict(question)
+            existing = known.get((question["id"], revision.content_hash))
+            if existing is None:
+                db.session.add(revision)
+                created = True
+                existing = revision
+            revisions[question["id"]] = existing
+
+        try:
+            if created:
+                db.session.flush()
+            # Serialize before committing, which would expire every revision
+            payloads = {
+                question_id: revision.to_dict()
+                for question_id, revision in revisions.items()
+            }
+            if created:
+                db.session.commit()
+            return payloads
+        except IntegrityError:
+            # Another worker created the same revisions concurrently
+            db.session.rollback()
+            if retry:
+                raise
+
+
+def mark_questions_changed():
+    """Bump the bank version in the current transaction.
+
+    Call this alongside any insert, update or delete of ``Question`` rows,
+    before ``db.session.commit()``, so that every process reloads its bank.
+    """
+    state = db.session.get(QuestionBankVersion, VERSION_ROW_ID)
+    if state is None:
+        db.session.add(QuestionBankVersion(id=VERSION_ROW_ID, version=1))
+    else:
+        state.version = QuestionBankVersion.version + 1
+    question_bank.invalidate()
@@ -0,0 +1,273 @@
+"""Shared engine for importing questions.json into the Question table.
+
+The app start-up loader and scripts/reload_questions.py go through
+``import_questions``; the admin bulk upload (question_upload.py) uses the
+same index, diff and apply steps.  It reads the existing bank once into an
+in-memory index keyed by (chapter, question_number_rel), compares content
+hashes against the file and applies the resulting inserts, updates and
+deletes with bulk statements in chunked transactions.  Question IDs of
+unchanged and updated rows are preserved.
+"""
+import hashlib
+import json
+import re
+import time
+
+from sqlalchemy import delete, insert, update
+
+from models import db, Question
+from question_bank import mark_questions_changed
+from question_search import question_search
+
+CHUNK_SIZE = 1000
+
+# Matches the "[Κεφ. 3, Ερ. 12] " prefix that the importer puts in front of
+# every question text.
+QUESTION_PREFIX_RE = re.compile(r"^\[Κεφ\. ([^,\]]*), Ερ\. ([^\]]*)\] ")
+
+
+def format_question_text(chapter, question_number_rel, question):
+    """Canonical question text stored in the database"""
+    return f"[Κεφ. {chapter}, Ερ. {question_number_rel}] {question}"
+
+
+def parse_question_text(question_text):
+    """Split stored question text into (chapter, question_number_rel, text).
+
+    Questions added by hand through the admin panel have no prefix, in which
+    case the chapter and number are ``None``.
+    """
+    match = QUESTION_PREFIX_RE.match(question_text)
+    if not match:
+        return None, None, question_text
+    return match.group(1), match.group(2), question_text[match.end():]
+
+
+def content_hash(row):
+    """Hash of the columns the importer owns"""
+    parts = (
+        row["question_text"],
+        row["option_a"],
+        row["option_b"],
+        row["option_c"],
+        row["option_d"],
+        row["correct_answer"],
+        row["category"] or "",
+    )
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def row_from_json(q_data):
+    """Convert one questions.json entry into Question column values"""
+    chapter = str(q_data.get("chapter", ""))
+    question_number_rel = str(q_data.get("question_number_rel", ""))
+    return {
+        "question_text": format_question_text(
+            chapter, question_number_rel, q_data["question"]
+        ),
+        "option_a": q_data["options"]["a"],
+        "option_b": q_data["options"]["b"],
+        "option_c": q_data["options"]["c"],
+        "option_d": "",  # Adding empty option_d since it's required
+        "correct_answer": q_data["correct_answer"],
+        "category": q_data.get("chapter", None),  # Use chapter as category
+    }
+
+
+class ImportReport:
+    """Row counts and timings of one import run"""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.in_file = 0
+        self.duplicates = 0
+        self.existing = 0
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.timings = {}
+
+    def __str__(self):
+        mode = " (dry run, nothing written)" if self.dry_run else ""
+        timings = ", ".join(
+            f"{name} {seconds * 1000:.1f} ms" for name, seconds in self.timings.items()
+        )
+        return (
+            f"Question import{mode}: {self.in_file} in file, "
+            f"{self.existing} in database, {self.inserted} inserted, "
+            f"{self.updated} updated, {self.deleted} deleted, "
+            f"{self.unchanged} unchanged, {self.duplicates} duplicates (last wins) "
+            f"[{timings}]"
+        )
+
+
+class QuestionDiff:
+    """Inserts, updates and deletes needed to bring the table in line"""
+
+    def __init__(self):
+        self.inserts = []
+        self.updates = []
+        self.deletes = []
+        self.unchanged = 0
+
+
+def build_index():
+    """Index existing questions by key with their content hash.
+
+    Returns ``(keyed, unkeyed)`` where ``keyed`` maps
+    ``(chapter, question_number_rel)`` to ``(id, hash)`` and ``unkeyed`` maps
+    the bare question text of rows without a prefix to their IDs.
+    """
+    columns = (
+        Question.id,
+        Question.question_text,
+        Question.option_a,
+        Question.option_b,
+        Question.option_c,
+        Question.option_d,
+        Question.correct_answer,
+        Question.category,
+    )
+    keyed = {}
+    unkeyed = {}
+    for row in db.session.execute(db.select(*columns)).mappings():
+        chapter, number, text = parse_question_text(row["question_text"])
+        if chapter is None:
+            unkeyed.setdefault(text, []).append(row["id"])
+        else:
+            keyed[(chapter, number)] = (row["id"], content_hash(row))
+    return keyed, unkeyed
+
+
+def compute_diff(rows, keyed, unkeyed, delete_missing):
+    """Diff the file rows (keyed like the index) against the database"""
+    diff = QuestionDiff()
+    seen_ids = set()
+    for key, row in rows.items():
+        existing = keyed.get(key)
+        if existing is None:
+            # Older loaders stored the bare question text without a prefix;
+            # adopt such a row instead of inserting a duplicate.
+            _, _, text = parse_question_text(row["question_text"])
+            candidates = unkeyed.get(text)
+            if candidates:
+                question_id = candidates.pop()
+                diff.updates.append(dict(row, id=question_id))
+                seen_ids.add(question_id)
+            else:
+                diff.inserts.append(row)
+            continue
+
+        question_id, existing_hash = existing
+        seen_ids.add(question_id)
+        if existing_hash == content_hash(row):
+            diff.unchanged += 1
+        else:
+            diff.updates.append(dict(row, id=question_id))
+
+    if delete_missing:
+        diff.deletes = [
+            question_id
+            for question_id, _ in keyed.values()
+            if question_id not in seen_ids
+        ]
+    return diff
+
+
+def apply_diff(diff, chunk_size=CHUNK_SIZE):
+    """Apply a diff with bulk statements, committing every ``chunk_size`` rows"""
+    for start in range(0, len(diff.inserts), chunk_size):
+        chunk = diff.inserts[start : start + chunk_size]
+        question_ids = db.session.scalars(
+            insert(Question).returning(Question.id, sort_by_parameter_order=True), chunk
+        ).all()
+        question_search.index_questions(
+            [dict(row, id=question_id) for row, question_id in zip(chunk, question_ids)]
+        )
+        mark_questions_changed()
+        db.session.commit()
+
+    for start in range(0, len(diff.updates), chunk_size):
+        chunk = diff.updates[start : start + chunk_size]
+        db.session.execute(update(Question), chunk)
+        question_search.index_questions(chunk)
+        mark_questions_changed()
+        db.session.commit()
+
+    for start in range(0, len(diff.deletes), chunk_size):
+        chunk = diff.deletes[start : start + chunk_size]
+        db.session.execute(delete(Question).where(Question.id.in_(chunk)))
+        question_search.remove_questions(chunk)
+        mark_questions_changed()
+        db.session.commit()
+
+
+def question_key(q_data):
+    """(chapter, question_number_rel) of a questions.json entry"""
+    return (
+        str(q_data.get("chapter", "")),
+        str(q_data.get("question_number_rel", "")),
+    )
+
+
+def rows_by_key(questions_data):
+    """Question rows keyed like ``build_index``; later duplicates win.
+
+    Returns ``(rows, duplicates)``.
+    """
+    rows = {}
+    duplicates = 0
+    for q_data in questions_data:
+        key = question_key(q_data)
+        if key in rows:
+            duplicates += 1
+        rows[key] = row_from_json(q_data)
+    return rows, duplicates
+
+
+def import_questions(questions_data, delete_missing=False, dry_run=False):
+    """Synchronise the Question table with a list of questions.json entries.
+
+    Rows are matched by chapter and relative question number.  New entries
+    are inserted and changed ones updated in place; with ``delete_missing``,
+    imported questions that are no longer in the file are deleted.  Questions
+    added by hand in the admin panel are never deleted.
+    """
+    report = ImportReport(dry_run)
+    started = time.perf_counter()
+
+    rows, report.duplicates = rows_by_key(questions_data)
+    report.in_file = len(questions_data)
+
+    keyed, unkeyed = build_index()
+    report.existing = len(keyed) + sum(len(ids) for ids in unkeyed.values())
+    report.timings["index"] = time.perf_counter() - started
+
+    checkpoint = time.perf_counter()
+    diff = compute_diff(rows, keyed, unkeyed, delete_missing)
+    report.inserted = len(diff.inserts)
+    report.updated = len(diff.updates)
+    report.deleted = len(diff.deletes)
+    report.unchanged = diff.unchanged
+    report.timings["diff"] = time.perf_counter() - checkpoint
+
+    checkpoint = time.perf_counter()
+    if not dry_run:
+        try:
+            apply_diff(diff)
+        except Exception:
+            db.session.rollback()
+            raise
+    report.timings["apply"] = time.perf_counter() - checkpoint
+    report.timings["total"] = time.perf_counter() - started
+    return report
+
+
+def import_questions_file(path="questions.json", delete_missing=False, dry_run=False):
+    """Load a questions.json file and import it; see ``import_questions``"""
+    with open(path, "r", encoding="utf-8") as f:
+        questions_data = json.load(f)
+    return import_questions(
+        questions_data, delete_missing=delete_missing, dry_run=dry_run
+    )
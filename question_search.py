@@ -0,0 +1,276 @@
+"""Accent-insensitive full-text search over the question bank.
+
+Question text and options are indexed after Greek normalisation (accents and
+other diacritics stripped, lowercase, final sigma folded into σ), so that
+"ΠΛΟΙΟ", "πλοίο" and "πλοιο" all match each other.  Every query word is a
+prefix match and all words must match; results are ranked by BM25 with the
+question text weighted twice as much as the options.
+
+On SQLite the index is an FTS5 table, ``question_search``, whose rowid is the
+question ID.  It is written in the same transaction as the questions through
+``index_questions`` and ``remove_questions``, which the admin routes and the
+importer call.  On other databases an in-process inverted index is built from
+the question bank snapshot and rebuilt whenever the bank version changes.
+"""
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from collections.abc import Mapping
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Question
+from pagination import Page, decode_cursor, encode_cursor
+from question_bank import question_bank
+
+TABLE = "question_search"
+MAX_QUERY_WORDS = 10
+REBUILD_CHUNK_SIZE = 1000
+TEXT_WEIGHT = 2.0
+OPTIONS_WEIGHT = 1.0
+WORD_RE = re.compile(r"\w+")
+
+
+# Combining diacritical marks: Greek tonos, dialytika and the polytonic
+# accents once the text is NFD-decomposed
+DIACRITICS_RE = re.compile("[\u0300-\u036f]")
+
+
+def normalize(value):
+    """Lowercase, strip diacritics and fold final sigma"""
+    decomposed = unicodedata.normalize("NFD", (value or "").lower())
+    return DIACRITICS_RE.sub("", decomposed).replace("ς", "σ")
+
+
+def query_words(query):
+    return WORD_RE.findall(normalize(query))[:MAX_QUERY_WORDS]
+
+
+def _document(question):
+    """(question_id, normalised text, normalised options) of a Question or row dict"""
+    if isinstance(question, Mapping):
+        get = question.get
+    else:
+        get = lambda name: getattr(question, name)  # noqa: E731
+    options = " ".join(get(name) or "" for name in ("option_a", "option_b", "option_c"))
+    return get("id"), normalize(get("question_text")), normalize(options)
+
+
+class FTS5Index:
+    """Search backed by an SQLite FTS5 table kept in sync by the callers"""
+
+    def ensure(self):
+        db.session.execute(
+            text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5(question_text, options)")
+        )
+        indexed, last_indexed = db.session.execute(
+            text(f"SELECT COUNT(*), MAX(rowid) FROM {TABLE}")
+        ).one()
+        stored, last_stored = db.session.execute(
+            db.select(db.func.count(Question.id), db.func.max(Question.id))
+        ).one()
+        if (indexed, last_indexed) != (stored, last_stored):
+            self.rebuild()
+        db.session.commit()
+
+    def rebuild(self):
+        db.session.execute(text(f"DELETE FROM {TABLE}"))
+        questions = db.session.execute(
+            db.select(
+                Question.id,
+                Question.question_text,
+                Question.option_a,
+                Question.option_b,
+                Question.option_c,
+            ).execution_options(yield_per=REBUILD_CHUNK_SIZE)
+        )
+        for chunk in questions.mappings().partitions():
+            self._insert([_document(row) for row in chunk])
+
+    def index(self, questions):
+        documents = [_document(question) for question in questions]
+        self.remove([question_id for question_id, _, _ in documents])
+        self._insert(documents)
+
+    def _insert(self, documents):
+        if not documents:
+            return
+        db.session.execute(
+            text(f"INSERT INTO {TABLE} (rowid, question_text, options) VALUES (:id, :text, :options)"),
+            [
+                {"id": question_id, "text": question_text, "options": options}
+                for question_id, question_text, options in documents
+            ],
+        )
+
+    def remove(self, question_ids):
+        if question_ids:
+            db.session.execute(
+                text(f"DELETE FROM {TABLE} WHERE rowid = :id"),
+                [{"id": question_id} for question_id in question_ids],
+            )
+
+    def search(self, words, offset, limit):
+        match = " ".join(f'"{word}"*' for word in words)
+        rows = db.session.execute(
+            text(
+                f"""
+                SELECT q.id, q.question_text, q.category,
+                       bm25({TABLE}, {TEXT_WEIGHT}, {OPTIONS_WEIGHT}) AS score
+                FROM {TABLE}
+                JOIN {Question.__tablename__} q ON q.id = {TABLE}.rowid
+                WHERE {TABLE} MATCH :match
+                ORDER BY score, q.id
+                LIMIT :limit OFFSET :offset
+                """
+            ),
+            {"match": match, "limit": limit, "offset": offset},
+        )
+        return [dict(row) for row in rows.mappings()]
+
+
+class InvertedIndex:
+    """In-process BM25 index over one question bank snapshot"""
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        # term -> {position in snapshot: weighted term frequency}
+        self.postings = defaultdict(dict)
+        self.lengths = []
+        for position, payload in enumerate(snapshot.payloads):
+            weighted = defaultdict(float)
+            length = 0.0
+            fields = (
+                (payload["question_text"], TEXT_WEIGHT),
+                (" ".join(payload["options"].values()), OPTIONS_WEIGHT),
+            )
+            for value, weight in fields:
+                for word in WORD_RE.findall(normalize(value)):
+                    weighted[word] += weight
+                    length += weight
+            for word, frequency in weighted.items():
+                self.postings[word][position] = frequency
+            self.lengths.append(length)
+        self.terms = sorted(self.postings)
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    def _prefix_terms(self, word):
+        start = bisect.bisect_left(self.terms, word)
+        end = bisect.bisect_left(self.terms, word + "\uffff")
+        return self.terms[start:end]
+
+    def search(self, words, offset, limit):
+        scores = None
+        total = len(self.lengths)
+        for word in words:
+            word_scores = defaultdict(float)
+            for term in self._prefix_terms(word):
+                postings = self.postings[term]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for position, frequency in postings.items():
+                    norm = 1 - self.B + self.B * self.lengths[position] / self.average_length
+                    word_scores[position] += (
+                        idf * frequency * (self.K1 + 1) / (frequency + self.K1 * norm)
+                    )
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {p: s + word_scores[p] for p, s in scores.items() if p in word_scores}
+            if not scores:
+                return []
+
+        # Negated like bm25() in FTS5, so that lower scores rank first
+        ranked = sorted(
+            ((-score, self.snapshot.ids[position], position) for position, score in scores.items())
+        )
+        return [
+            {
+                "id": question_id,
+                "question_text": self.snapshot.payloads[position]["question_text"],
+                "category": self.snapshot.chapters[position],
+                "score": score,
+            }
+            for score, question_id, position in ranked[offset : offset + limit]
+        ]
+
+
+class QuestionSearch:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fts = None
+        self._memory = None
+
+    def _use_fts(self):
+        if self._fts is None:
+            self._fts = False
+            if db.engine.dialect.name == "sqlite":
+                try:
+                    with db.engine.connect() as connection:
+                        connection.exec_driver_sql(
+                            "CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)"
+                        )
+                    self._fts = FTS5Index()
+                except OperationalError:
+                    print("WARNING: SQLite was built without FTS5, using an in-process search index.")
+        return self._fts
+
+    def ensure_index(self):
+        """Create the search index and rebuild it if it is out of sync"""
+        fts = self._use_fts()
+        if fts:
+            fts.ensure()
+
+    def index_questions(self, questions):
+        """(Re)index Questions or row dicts with an ``id``; the caller commits"""
+        fts = self._use_fts()
+        if fts:
+            fts.index(questions)
+
+    def remove_questions(self, question_ids):
+        """Drop questions from the index; the caller commits"""
+        fts = self._use_fts()
+        if fts:
+            fts.remove(question_ids)
+
+    def _memory_index(self):
+        snapshot = question_bank.snapshot()
+        index = self._memory
+        if index is None or index.snapshot is not snapshot:
+            with self._lock:
+                index = self._memory
+                if index is None or index.snapshot is not snapshot:
+                    index = InvertedIndex(snapshot)
+                    self._memory = index
+        return index
+
+    def search(self, query, cursor=None, per_page=20):
+        """A page of matching questions, best match first.
+
+        Matches are ranked as a whole, so the cursor is the offset of the
+        next page in the ranking.
+        """
+        words = query_words(query)
+        if not words:
+            return Page([], None)
+        key = decode_cursor(cursor)
+        try:
+            offset = max(int(key[0]), 0)
+        except (TypeError, ValueError, IndexError):
+            offset = 0
+
+        fts = self._use_fts()
+        backend = fts if fts else self._memory_index()
+        items = backend.search(words, offset, per_page + 1)
+        if len(items) <= per_page:
+            return Page(items, None)
+        return Page(items[:per_page], encode_cursor([offset + per_page]))
+
+
+question_search = QuestionSearch()
@@ -0,0 +1,311 @@
+"""Bulk question upload from the admin panel.
+
+An upload is a JSON array in the questions.json format or a CSV file with
+the columns ``chapter, question_number_rel, question, option_a, option_b,
+option_c, correct_answer``.  It is parsed incrementally: JSON objects are
+decoded one at a time from the request stream and CSV rows are read as they
+come, and every valid entry is appended to a per-upload NDJSON file under
+the instance folder.  Nothing is written to the database at that point.
+
+The preview is the diff of question_import.py: rows are matched by
+(chapter, question_number_rel), so questions are added or updated in place
+and keep their IDs.  Removing questions that are missing from the file is
+optional.  Applying diffs again inside the write transaction, checks that
+the diff still matches the one that was previewed, then writes it in chunked
+transactions.
+"""
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import secrets
+import time
+
+from db_profile import database_profile
+from models import db, Question
+from question_import import (
+    apply_diff,
+    build_index,
+    compute_diff,
+    content_hash,
+    parse_question_text,
+    rows_by_key,
+)
+
+CSV_COLUMNS = (
+    "chapter",
+    "question_number_rel",
+    "question",
+    "option_a",
+    "option_b",
+    "option_c",
+    "correct_answer",
+)
+ANSWER_OPTIONS = ("a", "b", "c")
+TOKEN_RE = re.compile(r"^[0-9a-f]{32}$")
+# Separators skipped between the objects of a JSON array
+JSON_SKIP = " \t\r\n,"
+MAX_ERRORS = 20
+PREVIEW_LIMIT = 50
+# Uploads that were never applied are removed after this long
+UPLOAD_MAX_AGE = 24 * 3600
+
+
+class UploadError(Exception):
+    """The uploaded file cannot be read as questions"""
+
+
+class UploadExpired(Exception):
+    """The upload was applied, removed or never existed"""
+
+
+class UploadChanged(Exception):
+    """The question bank changed between preview and apply"""
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Yield the items of a JSON array read from a binary stream, one at a time"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer, pos, eof, opened = "", 0, False, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        data = stream.read(chunk_size)
+        eof = not data
+        buffer = buffer[pos:] + utf8.decode(data, final=eof)
+        pos = 0
+
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in JSON_SKIP:
+                pos += 1
+            if pos < len(buffer) or eof:
+                break
+            fill()
+        if pos == len(buffer):
+            raise UploadError("the JSON array is not closed")
+        if not opened:
+            if buffer[pos] != "[":
+                raise UploadError("expected a JSON array of questions")
+            opened = True
+            pos += 1
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            item, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise UploadError(f"invalid JSON: {e.msg}") from None
+            # The item continues in the next chunk
+            fill()
+            continue
+        yield item
+
+
+def iter_csv(stream):
+    """Yield questions.json style entries from the rows of a CSV file"""
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or ())]
+    if missing:
+        raise UploadError(f"missing CSV columns: {', '.join(missing)}")
+    for row in reader:
+        yield {
+            "chapter": row["chapter"],
+            "question_number_rel": row["question_number_rel"],
+            "question": row["question"],
+            "options": {option: row[f"option_{option}"] for option in ANSWER_OPTIONS},
+            "correct_answer": row["correct_answer"],
+        }
+
+
+def normalize(item):
+    """Clean up one entry; returns ``(entry, None)`` or ``(None, error)``"""
+    if not isinstance(item, dict):
+        return None, "not an object"
+    options = item.get("options")
+    if not isinstance(options, dict):
+        return None, "missing options"
+    entry = {
+        "chapter": str(item.get("chapter") or "").strip(),
+        "question_number_rel": str(item.get("question_number_rel") or "").strip(),
+        "question": str(item.get("question") or "").strip(),
+        "options": {option: str(options.get(option) or "").strip() for option in ANSWER_OPTIONS},
+        "correct_answer": str(item.get("correct_answer") or "").strip().lower(),
+    }
+    if not entry["chapter"] or not entry["question_number_rel"]:
+        return None, "missing chapter or question_number_rel"
+    if not entry["question"]:
+        return None, "empty question"
+    if not all(entry["options"].values()):
+        return None, "options a, b and c are required"
+    if entry["correct_answer"] not in ANSWER_OPTIONS:
+        return None, "correct_answer must be a, b or c"
+    return entry, None
+
+
+class UploadPreview:
+    """What applying an upload would change"""
+
+    def __init__(self, token, delete_missing, rows, duplicates, diff):
+        self.token = token
+        self.delete_missing = delete_missing
+        self.in_file = len(rows) + duplicates
+        self.duplicates = duplicates
+        self.unchanged = diff.unchanged
+        self.added = len(diff.inserts)
+        self.changed = len(diff.updates)
+        self.removed = len(diff.deletes)
+        self.digest = diff_digest(diff)
+        self.limit = PREVIEW_LIMIT
+        self.added_rows = [_summary(row) for row in diff.inserts[:PREVIEW_LIMIT]]
+        self.changed_rows = _with_current_text(diff.updates[:PREVIEW_LIMIT])
+        self.removed_rows = _current_rows(diff.deletes[:PREVIEW_LIMIT])
+
+
+def diff_digest(diff):
+    """Fingerprint of a diff, to tell whether it changed since the preview"""
+    digest = hashlib.sha1()
+    for row in diff.inserts:
+        digest.update(f"+{content_hash(row)}".encode("ascii"))
+    for row in diff.updates:
+        digest.update(f"~{row['id']}:{content_hash(row)}".encode("ascii"))
+    for question_id in diff.deletes:
+        digest.update(f"-{question_id}".encode("ascii"))
+    return digest.hexdigest()
+
+
+def _summary(row):
+    chapter, number, text = parse_question_text(row["question_text"])
+    return {"chapter": chapter, "question_number_rel": number, "question": text}
+
+
+def _current_rows(question_ids):
+    rows = db.session.execute(
+        db.select(Question.id, Question.question_text).where(Question.id.in_(question_ids))
+    ).all()
+    return [dict(_summary({"question_text": text}), id=question_id) for question_id, text in rows]
+
+
+def _with_current_text(updates):
+    current = {row["id"]: row["question"] for row in _current_rows([row["id"] for row in updates])}
+    return [
+        dict(_summary(row), id=row["id"], old_question=current.get(row["id"]))
+        for row in updates
+    ]
+
+
+class QuestionUploads:
+    def __init__(self):
+        self.directory = None
+        self.chunk_size = 500
+
+    def init_app(self, app):
+        self.directory = os.path.join(app.instance_path, "question_uploads")
+        self.chunk_size = app.config["QUESTION_UPLOAD_CHUNK_SIZE"]
+
+    def save(self, upload):
+        """Parse an uploaded file into a new upload.
+
+        Returns ``(token, errors)``; errors name the entry and what is wrong
+        with it, and the upload is discarded when there are any.
+        """
+        name = (upload.filename or "").lower()
+        if name.endswith(".json"):
+            items = iter_json_array(upload.stream)
+        elif name.endswith(".csv"):
+            items = iter_csv(upload.stream)
+        else:
+            raise UploadError("only .json and .csv files are supported")
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._remove_stale()
+        token = secrets.token_hex(16)
+        path = self._path(token)
+        errors = []
+        try:
+            with open(path, "w", encoding="utf-8") as out:
+                for number, item in enumerate(items, start=1):
+                    entry, error = normalize(item)
+                    if error:
+                        errors.append(f"#{number}: {error}")
+                        if len(errors) >= MAX_ERRORS:
+                            break
+                        continue
+                    out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except (UploadError, UnicodeDecodeError, csv.Error) as e:
+            os.remove(path)
+            raise UploadError(str(e)) from None
+        if errors:
+            os.remove(path)
+        return token, errors
+
+    def entries(self, token):
+        if not TOKEN_RE.match(token or ""):
+            raise UploadExpired()
+        try:
+            with open(self._path(token), "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f]
+        except FileNotFoundError:
+            raise UploadExpired() from None
+
+    def preview(self, token, delete_missing):
+        rows, duplicates = rows_by_key(self.entries(token))
+        if not rows:
+            raise UploadError("the file has no questions")
+        keyed, unkeyed = build_index()
+        diff = compute_diff(rows, keyed, unkeyed, delete_missing)
+        return UploadPreview(token, delete_missing, rows, duplicates, diff)
+
+    def apply(self, token, delete_missing, digest):
+        """Apply a previewed upload; returns the preview that was applied"""
+        rows, duplicates = rows_by_key(self.entries(token))
+        if not rows:
+            raise UploadError("the file has no questions")
+        # The preview that matched the digest, set by the first attempt
+        applied = []
+        database_profile.run_write(
+            self._apply_rows, token, rows, duplicates, delete_missing, digest, applied
+        )
+        os.remove(self._path(token))
+        return applied[0]
+
+    def _apply_rows(self, token, rows, duplicates, delete_missing, digest, applied):
+        # Diffed inside the write transaction, so that the diff applied is the
+        # one that was previewed.  A retried attempt diffs again without the
+        # check, so chunks committed before a lock error are not applied twice.
+        keyed, unkeyed = build_index()
+        diff = compute_diff(rows, keyed, unkeyed, delete_missing)
+        if not applied:
+            preview = UploadPreview(token, delete_missing, rows, duplicates, diff)
+            if preview.digest != digest:
+                db.session.rollback()
+                raise UploadChanged()
+            applied.append(preview)
+        apply_diff(diff, self.chunk_size)
+
+    def discard(self, token):
+        if TOKEN_RE.match(token or ""):
+            try:
+                os.remove(self._path(token))
+            except FileNotFoundError:
+                pass
+
+    def _path(self, token):
+        return os.path.join(self.directory, f"{token}.ndjson")
+
+    def _remove_stale(self):
+        cutoff = time.time() - UPLOAD_MAX_AGE
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".ndjson") and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+question_uploads = QuestionUploads()
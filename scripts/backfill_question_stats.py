@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Script to recompute the per-question analytics and the per-user question
+counts used by adaptive quizzes from all completed quiz attempts
+"""
+import argparse
+
+from app import app
+import adaptive
+import question_analytics
+
+
+def backfill_question_stats(chunk_size):
+    with app.app_context():
+        attempts, questions = question_analytics.backfill(
+            chunk_size=chunk_size,
+            progress=lambda done: print(f"Processed {done} attempts..."),
+        )
+        print(f"Question statistics rebuilt from {attempts} attempts ({questions} questions).")
+        adaptive.rebuild_user_question_stats()
+        print("Per-user question counts rebuilt.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=question_analytics.BACKFILL_CHUNK_SIZE,
+        help="attempts read per query",
+    )
+    args = parser.parse_args()
+    backfill_question_stats(args.chunk_size)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Benchmark of quiz latency while a whole class logs in at once
+
+Starts gunicorn against a copy of a seeded database and has a few clients
+take quizzes back to back (see stress_database.py) in two phases of equal
+length.  The first phase is quiz traffic only.  At the start of the second,
+``--logins`` more clients all post to /login at the same moment, each as a
+different seed user.  A login turned away with 429 or 503 is retried a second later, the
+way a candidate would press the button again.
+
+Prints p50/p95/p99 per quiz route for both phases, the login responses and
+how long it took until every candidate was logged in.  Password hashes run
+on a bounded pool (password_hashing.py), so the quiz p99 of the second phase
+should stay close to the first.
+
+Example (from the repository root):
+    PYTHONPATH=. python scripts/benchmark_login_storm.py --workers 2 --threads 4
+    PYTHONPATH=. python scripts/benchmark_login_storm.py --seed 100k --logins 100
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+
+from benchmark_quiz import (
+    BENCH_DIR,
+    SEED_ATTEMPTS_PER_USER,
+    SEED_PASSWORD,
+    SEED_SIZES,
+    HTTPSession,
+    ensure_seed,
+    start_gunicorn,
+    summarize,
+)
+from stress_database import take_quizzes
+
+QUIZ_ROUTES = ("GET /quiz", "POST /submit_answer", "POST /submit_answers", "POST /submit_quiz")
+
+
+def log_in(session, username, deadline, responses):
+    """Log in, retrying when asked to; returns seconds taken or None"""
+    started = time.perf_counter()
+    while time.monotonic() < deadline:
+        status, _ = session.request(
+            "POST", "/login", form={"username": username, "password": SEED_PASSWORD}
+        )
+        responses[status] += 1
+        if status == 302:
+            return time.perf_counter() - started
+        if status not in (429, 503):
+            return None
+        time.sleep(1)
+    return None
+
+
+def print_phase(name, timings, duration):
+    print(f"{name}: {len(timings)} quiz requests in {duration:.0f}s")
+    print(f"  {'route':<24}{'req':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    summary = summarize(timings, duration)
+    for route in QUIZ_ROUTES:
+        row = summary.get(route)
+        if row:
+            print(
+                f"  {route:<24}{row['requests']:>7}{row['errors']:>5}"
+                f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+            )
+    return summary
+
+
+def storm(args):
+    users = -(-SEED_SIZES[args.seed] // SEED_ATTEMPTS_PER_USER)
+    if max(args.clients, args.logins) > users:
+        sys.exit(f"ERROR: the {args.seed} seed has {users} users, fewer than --clients or --logins.")
+
+    template = ensure_seed(args.seed)
+    run_db = os.path.join(BENCH_DIR, "run_login_storm.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(run_db + suffix):
+            os.remove(run_db + suffix)
+    shutil.copyfile(template, run_db)
+
+    log_path = os.path.join(BENCH_DIR, "login_storm_gunicorn.log")
+    server, base_url = start_gunicorn(f"sqlite:///{run_db}", args.workers, log_path, args.threads)
+
+    phases = {"quiz only": [], "login storm": []}
+    login_times, responses, failures = [], Counter(), []
+    clock = {}
+
+    def start_phase():
+        clock["deadline"] = time.monotonic() + args.seconds
+
+    # Quiz clients meet before each phase; the storm clients join for the
+    # second one
+    quiz_only = threading.Barrier(args.clients, action=start_phase)
+    with_storm = threading.Barrier(args.clients + args.logins, action=start_phase)
+
+    def quiz_client(index):
+        session = HTTPSession(base_url)
+        log_in(session, f"seed{index + 1}", time.monotonic() + 60, Counter())
+        rng = random.Random(index)
+        for barrier, timings in ((quiz_only, phases["quiz only"]), (with_storm, phases["login storm"])):
+            barrier.wait()
+            try:
+                timings.extend(take_quizzes(session, clock["deadline"], rng))
+            except Exception as e:
+                failures.append(f"seed{index + 1}: {e}")
+
+    def login_client(index):
+        with_storm.wait()
+        # Candidates keep trying for the length of the phase and a bit more
+        seconds = log_in(
+            HTTPSession(base_url), f"seed{index + 1}", clock["deadline"] + 30, responses
+        )
+        if seconds is not None:
+            login_times.append(seconds)
+
+    threads = [threading.Thread(target=quiz_client, args=(i,)) for i in range(args.clients)]
+    threads += [threading.Thread(target=login_client, args=(i,)) for i in range(args.logins)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(f"{args.workers} workers x {args.threads} threads, {args.clients} quiz clients, {args.logins} logins")
+    baseline = print_phase("quiz only", phases["quiz only"], args.seconds)
+    during = print_phase("login storm", phases["login storm"], args.seconds)
+    print("login responses: " + ", ".join(f"{status}: {n}" for status, n in sorted(responses.items())))
+    if login_times:
+        print(
+            f"{len(login_times)}/{args.logins} candidates logged in, "
+            f"the last after {max(login_times):.1f}s"
+        )
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    ratios = [
+        during[route]["p99_ms"] / baseline[route]["p99_ms"]
+        for route in QUIZ_ROUTES
+        if route in baseline and route in during
+    ]
+    worst = max(ratios, default=0)
+    print(f"worst quiz p99 ratio (storm / quiz only): {worst:.2f}")
+    return worst <= args.max_p99_ratio and len(login_times) == args.logins and not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=4, help="threads per worker")
+    parser.add_argument("--clients", type=int, default=8, help="clients taking quizzes")
+    parser.add_argument("--logins", type=int, default=50, help="clients logging in at once")
+    parser.add_argument("--seconds", type=float, default=20, help="length of each phase")
+    parser.add_argument("--seed", choices=SEED_SIZES, default="1k", help="seeded attempts")
+    parser.add_argument(
+        "--max-p99-ratio", type=float, default=3.0,
+        help="fail if a quiz route's p99 grows more than this during the storm",
+    )
+    args = parser.parse_args()
+    sys.exit(0 if storm(args) else 1)
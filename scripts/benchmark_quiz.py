@@ -0,0 +1,559 @@
+#!/usr/bin/env python
+"""
+Load test of the quiz flow against a seeded copy of the database
+
+Every simulated user registers, logs in, starts a quiz, answers its 20
+questions with one /submit_answer call each, submits the quiz and opens the
+results and statistics pages.  Users run concurrently, either through the
+Flask test client in this process or over HTTP against a local gunicorn.
+
+The results hold throughput and p50/p95/p99 latency per route, 5xx
+responses and SQLite "database is locked" errors.  They are written as JSON
+with sorted keys so that runs on two commits can be diffed, or compared
+with the ``compare`` command.  The run exits with status 1 if a user could
+not finish or any request got a 5xx response.
+
+Seeded databases (1k, 100k or 1m completed attempts) are built once under
+instance/benchmark/ and copied for every run.
+
+Examples (from the repository root):
+    PYTHONPATH=. python scripts/benchmark_quiz.py run --seed 1k --users 50
+    PYTHONPATH=. python scripts/benchmark_quiz.py run --driver gunicorn --workers 4 \\
+        --seed 100k --users 200 --concurrency 20 --output before.json
+    python scripts/benchmark_quiz.py compare before.json after.json
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "instance", "benchmark")
+SEED_SIZES = {"0": 0, "1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+SEED_ATTEMPTS_PER_USER = 20
+SEED_USERS_PER_CHUNK = 250
+SEED_PASSWORD = "benchmark"
+QUESTIONS_PER_ATTEMPT = 20
+LOCK_ERROR = "database is locked"
+# Registrations and logins turned away with these are retried after the
+# Retry-After delay, for at most LOGIN_RETRY_SECONDS
+RETRY_STATUSES = (429, 503)
+LOGIN_RETRY_SECONDS = 120
+QUIZ_ID_RE = re.compile(r"const quizId = (\d+);")
+
+
+# -- seeding ----------------------------------------------------------------
+
+
+def seed_path(label):
+    return os.path.join(BENCH_DIR, f"seed_{label}.db")
+
+
+def seed(path, attempts):
+    """Create a database at ``path`` holding ``attempts`` completed attempts.
+
+    Seed users get 20 attempts each, with their UserStats rows filled in.
+    The data is generated from a fixed random seed, so every build of the
+    same size is identical.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from sqlalchemy import insert
+    from werkzeug.security import generate_password_hash
+
+    from app import app, init_database
+    from models import db, AttemptQuestion, QuizAttempt, User, UserStats
+    from question_bank import question_bank
+
+    rng = random.Random(attempts)
+    started = time.perf_counter()
+    with app.app_context():
+        init_database()
+        payloads = question_bank.snapshot().payloads
+        password_hash = generate_password_hash(SEED_PASSWORD)
+        start = datetime.utcnow() - timedelta(days=365)
+        users = -(-attempts // SEED_ATTEMPTS_PER_USER)
+        attempt_id = 0
+
+        for first_user in range(1, users + 1, SEED_USERS_PER_CHUNK):
+            user_rows, attempt_rows, question_rows, stats_rows = [], [], [], []
+            for user_id in range(first_user, min(first_user + SEED_USERS_PER_CHUNK, users + 1)):
+                user_rows.append(
+                    {
+                        "id": user_id,
+                        "username": f"seed{user_id}",
+                        "email": f"seed{user_id}@example.com",
+                        "password_hash": password_hash,
+                        "created_at": start,
+                        "is_superuser": False,
+                    }
+                )
+                stats = UserStats(
+                    user_id=user_id,
+                    total_quizzes=0,
+                    score_sum=0,
+                    correct_answers=0,
+                    total_questions=0,
+                    best_correct=0,
+                    best_total=0,
+                )
+                recent = []
+                for _ in range(min(SEED_ATTEMPTS_PER_USER, attempts - attempt_id)):
+                    attempt_id += 1
+                    completed_at = start + timedelta(seconds=30 * attempt_id)
+                    seq = int(completed_at.timestamp() * 1000)
+                    correct = 0
+                    for position, question in enumerate(rng.sample(payloads, QUESTIONS_PER_ATTEMPT)):
+                        if rng.random() < 0.8:
+                            answer = question["correct_answer"]
+                        else:
+                            answer = rng.choice("abc")
+                        correct += answer == question["correct_answer"]
+                        question_rows.append(
+                            {
+                                "attempt_id": attempt_id,
+                                "position": position,
+                                "question_id": question["id"],
+                                "revision_id": question["revision_id"],
+                                "answer": answer,
+                                "answer_seq": seq + position * 20_000,
+                            }
+                        )
+                    score = round(correct / QUESTIONS_PER_ATTEMPT * 100, 2)
+                    attempt_rows.append(
+                        {
+                            "id": attempt_id,
+                            "user_id": user_id,
+                            "questions_data": "",
+                            "score": score,
+                            "correct_answers": correct,
+                            "total_questions": QUESTIONS_PER_ATTEMPT,
+                            "started_at": completed_at - timedelta(minutes=20),
+                            "completed_at": completed_at,
+                            "is_completed": True,
+                        }
+                    )
+                    stats.total_quizzes += 1
+                    stats.score_sum += score
+                    stats.correct_answers += correct
+                    stats.total_questions += QUESTIONS_PER_ATTEMPT
+                    if stats.best_attempt_id is None or correct > stats.best_correct:
+                        stats.best_attempt_id = attempt_id
+                        stats.best_correct = correct
+                        stats.best_total = QUESTIONS_PER_ATTEMPT
+                    recent.append((completed_at, score))
+                stats.set_recent_scores(recent)
+                stats_rows.append(
+                    {column.name: getattr(stats, column.name) for column in UserStats.__table__.columns}
+                )
+
+            db.session.execute(insert(User), user_rows)
+            db.session.execute(insert(QuizAttempt), attempt_rows)
+            db.session.execute(insert(AttemptQuestion), question_rows)
+            db.session.execute(insert(UserStats), stats_rows)
+            db.session.commit()
+            print(f"Seeded {attempt_id} attempts...")
+
+    print(f"Seeded {attempts} attempts for {users} users in {time.perf_counter() - started:.1f}s")
+
+
+def ensure_seed(label):
+    """Path of the seeded database for ``label``, building it in a subprocess if missing"""
+    path = seed_path(label)
+    if not os.path.exists(path):
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "seed", "--seed", label, "--path", tmp_path],
+            cwd=ROOT,
+            env=dict(os.environ, PYTHONPATH=ROOT),
+            check=True,
+        )
+        os.replace(tmp_path, path)
+    return path
+
+
+# -- clients ----------------------------------------------------------------
+
+
+class ClientSession:
+    """One simulated browser talking to the app through the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.retry_after = None
+
+    def request(self, method, path, form=None, payload=None):
+        response = self.client.open(path, method=method, data=form, json=payload)
+        self.retry_after = response.headers.get("Retry-After")
+        return response.status_code, response.get_data(as_text=True)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Redirects are timed as their own requests, like the test client does
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HTTPSession:
+    """One simulated browser talking to a server over HTTP"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect()
+        )
+        self.retry_after = None
+
+    def request(self, method, path, form=None, payload=None):
+        data, headers = None, {}
+        if form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif payload is not None:
+            data = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(
+            self.base_url + path, data=data, headers=headers, method=method
+        )
+        try:
+            with self.opener.open(request, timeout=120) as response:
+                self.retry_after = response.headers.get("Retry-After")
+                return response.status, response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            self.retry_after = e.headers.get("Retry-After")
+            return e.code, e.read().decode("utf-8", errors="replace")
+
+
+class LockErrorCounter(logging.Handler):
+    """Counts logged exceptions caused by SQLite lock contention"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        if LOCK_ERROR in record.getMessage() or (
+            record.exc_info and LOCK_ERROR in str(record.exc_info[1])
+        ):
+            self.count += 1
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(database_url, workers, log_path, threads=1):
+    port = free_port()
+    log = open(log_path, "w")
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "gunicorn",
+            "--workers", str(workers),
+            "--threads", str(threads),
+            "--bind", f"127.0.0.1:{port}",
+            "app:app",
+        ],
+        cwd=ROOT,
+        # gunicorn.conf.py is read from ROOT; workers are not recycled mid-run
+        env=dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=ROOT, GUNICORN_MAX_REQUESTS="0"),
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited, see {log_path}")
+        try:
+            with urllib.request.urlopen(base_url + "/login", timeout=5):
+                return server, base_url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"gunicorn did not start, see {log_path}")
+
+
+# -- the simulated user -----------------------------------------------------
+
+
+def retry_delay(session):
+    """Seconds to wait before retrying, from the last response's Retry-After"""
+    try:
+        return max(1, int(session.retry_after))
+    except (TypeError, ValueError):
+        return 1
+
+
+def simulate_user(session, name, rng, timings, retried):
+    """Run one user through the quiz flow, appending (route, seconds, status) to ``timings``.
+
+    The timings are appended as the requests are made, so they are kept
+    when the user fails part way.  Registration and login are retried when
+    throttled (429) or when password hashing is busy (503), like a user
+    pressing the button again; each turned-away attempt is appended to
+    ``retried`` as (route, status) instead of being timed.
+    """
+
+    def call(route, method, path, **kwargs):
+        started = time.perf_counter()
+        status, body = session.request(method, path, **kwargs)
+        timings.append((route, time.perf_counter() - started, status))
+        return status, body
+
+    def call_retrying(route, path, form):
+        deadline = time.monotonic() + LOGIN_RETRY_SECONDS
+        while True:
+            started = time.perf_counter()
+            status, body = session.request("POST", path, form=form)
+            if status not in RETRY_STATUSES or time.monotonic() >= deadline:
+                break
+            retried.append((route, status))
+            time.sleep(retry_delay(session))
+        timings.append((route, time.perf_counter() - started, status))
+        return status, body
+
+    call_retrying(
+        "POST /register", "/register",
+        {"username": name, "email": f"{name}@example.com", "password": SEED_PASSWORD},
+    )
+    call_retrying("POST /login", "/login", {"username": name, "password": SEED_PASSWORD})
+    call("GET /start_quiz", "GET", "/start_quiz")
+    _, page = call("GET /quiz", "GET", "/quiz")
+    match = QUIZ_ID_RE.search(page)
+    if match is None:
+        raise RuntimeError(f"{name}: no quiz was started")
+    quiz_id = int(match.group(1))
+
+    _, body = call("GET /api/quiz/<id>", "GET", f"/api/quiz/{quiz_id}")
+    for question in json.loads(body)["questions"]:
+        call(
+            "POST /submit_answer", "POST", "/submit_answer",
+            payload={"quiz_id": quiz_id, "question_id": question["id"], "answer": rng.choice("abc")},
+        )
+    _, body = call("POST /submit_quiz", "POST", "/submit_quiz", payload={"quiz_id": quiz_id})
+    call("GET /results/<id>", "GET", json.loads(body)["redirect"])
+    call("GET /statistics", "GET", "/statistics")
+
+
+# -- results ----------------------------------------------------------------
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    index = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[int(index)]
+
+
+def summarize(timings, duration):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    for route, seconds, status in timings:
+        latencies[route].append(seconds * 1000)
+        if status >= 500:
+            errors[route] += 1
+
+    routes = {}
+    for route, values in latencies.items():
+        values.sort()
+        routes[route] = {
+            "requests": len(values),
+            "errors": errors[route],
+            "throughput_rps": round(len(values) / duration, 2),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2),
+        }
+    return routes
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    template = ensure_seed(args.seed)
+    run_db = os.path.join(BENCH_DIR, f"run_{args.driver}.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(run_db + suffix):
+            os.remove(run_db + suffix)
+    shutil.copyfile(template, run_db)
+    database_url = f"sqlite:///{run_db}"
+
+    server = None
+    if args.driver == "client":
+        os.environ["DATABASE_URL"] = database_url
+        from app import app
+
+        lock_errors = LockErrorCounter()
+        app.logger.addHandler(lock_errors)
+
+        def new_session():
+            return ClientSession(app)
+
+    else:
+        log_path = os.path.join(BENCH_DIR, "gunicorn.log")
+        server, base_url = start_gunicorn(database_url, args.workers, log_path)
+
+        def new_session():
+            return HTTPSession(base_url)
+
+    prefix = f"bench{int(time.time())}"
+    timings, retried, failed_users = [], [], 0
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(simulate_user, new_session(), f"{prefix}_{i}", random.Random(i), timings, retried)
+                for i in range(args.users)
+            ]
+            for future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    failed_users += 1
+                    print(f"User failed: {e}")
+        duration = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if server is None:
+        lock_error_count = lock_errors.count
+    else:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            lock_error_count = f.read().count(LOCK_ERROR)
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.utcnow().isoformat(timespec="seconds"),
+            "driver": args.driver,
+            "workers": args.workers if args.driver == "gunicorn" else None,
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "seed_attempts": SEED_SIZES[args.seed],
+            "python": sys.version.split()[0],
+        },
+        "totals": {
+            "duration_s": round(duration, 2),
+            "requests": len(timings),
+            "throughput_rps": round(len(timings) / duration, 2),
+            "users_completed": args.users - failed_users,
+            "users_failed": failed_users,
+            "server_errors": sum(1 for _, _, status in timings if status >= 500),
+            "retried_429": sum(1 for _, status in retried if status == 429),
+            "retried_503": sum(1 for _, status in retried if status == 503),
+            "lock_errors": lock_error_count,
+        },
+        "routes": summarize(timings, duration),
+    }
+    print_results(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Results written to {args.output}")
+    return not failed_users and not results["totals"]["server_errors"]
+
+
+def print_results(results):
+    totals = results["totals"]
+    print(
+        f"{totals['requests']} requests in {totals['duration_s']}s "
+        f"({totals['throughput_rps']} req/s), {totals['users_completed']} users completed, "
+        f"{totals['users_failed']} failed, "
+        f"{totals['server_errors']} server errors, {totals['lock_errors']} lock errors"
+    )
+    if totals.get("retried_429") or totals.get("retried_503"):
+        print(
+            f"registrations and logins retried: {totals['retried_429']} throttled (429), "
+            f"{totals['retried_503']} hashing busy (503)"
+        )
+    print(f"{'route':<24}{'req':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in sorted(results["routes"].items()):
+        print(
+            f"{route:<24}{row['requests']:>7}{row['errors']:>5}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+
+
+def compare(before_path, after_path):
+    with open(before_path, "r", encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, "r", encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    print(
+        f"throughput: {before['totals']['throughput_rps']} -> {after['totals']['throughput_rps']} req/s, "
+        f"lock errors: {before['totals']['lock_errors']} -> {after['totals']['lock_errors']}"
+    )
+    print(f"{'route':<24}{'p50 ms':>24}{'p95 ms':>24}{'p99 ms':>24}")
+    for route in sorted(set(before["routes"]) | set(after["routes"])):
+        old, new = before["routes"].get(route), after["routes"].get(route)
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            if old and new:
+                change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0
+                cells.append(f"{old[key]:.1f}->{new[key]:.1f} ({change:+.0f}%)")
+            else:
+                cells.append("-")
+        print(f"{route:<24}" + "".join(f"{cell:>24}" for cell in cells))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the load test")
+    run_parser.add_argument("--driver", choices=("client", "gunicorn"), default="client")
+    run_parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    run_parser.add_argument("--users", type=int, default=50, help="simulated users")
+    run_parser.add_argument("--concurrency", type=int, default=10, help="users at a time")
+    run_parser.add_argument("--seed", choices=SEED_SIZES, default="1k", help="seeded attempts")
+    run_parser.add_argument("--output", help="write the results to this JSON file")
+
+    seed_parser = commands.add_parser("seed", help="build a seeded database")
+    seed_parser.add_argument("--seed", choices=SEED_SIZES, default="1k")
+    seed_parser.add_argument("--path", help="database file (default: instance/benchmark/seed_<size>.db)")
+
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(0 if run(args) else 1)
+    elif args.command == "seed":
+        seed(os.path.abspath(args.path or seed_path(args.seed)), SEED_SIZES[args.seed])
+    else:
+        compare(args.before, args.after)
@@ -1,6 +1,8 @@
-from app import app, db, Question
+from app import app, create_schema, db, Question
+from question_bank import question_bank
 
 with app.app_context():
+    create_schema()
     question_count = Question.query.count()
     print(f"Total questions in database: {question_count}")
     
@@ -12,3 +14,17 @@ with app.app_context():
             print(f"{i+1}. {q.question_text}")
     else:
         print("No questions found in the database!")
+
+    # Check that every chapter has enough questions for the exam blueprint
+    blueprint = app.config["EXAM_BLUEPRINT"]
+    if blueprint:
+        snapshot = question_bank.snapshot()
+        print("\nExam blueprint:")
+        for chapter, count in blueprint.items():
+            available = len(snapshot.positions_by_chapter.get(chapter, ()))
+            print(f"  Chapter {chapter}: {count} per quiz, {available} available")
+        problems = snapshot.blueprint_problems(blueprint, app.config["QUESTIONS_PER_QUIZ"])
+        for problem in problems:
+            print(f"PROBLEM: {problem}")
+        if not problems:
+            print("The blueprint can be served from the question bank.")
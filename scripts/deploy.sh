@@ -112,6 +112,23 @@ restore_database() {
   print_message "Database restored from ${BACKUP_PATH}"
 }
 
+# Function to apply pending schema migrations (see migrations.py)
+migrate_database() {
+  print_section "Database Migrations"
+
+  COMPOSE_FILE="docker-compose.yml"
+  if [ "$1" == "dev" ]; then
+    COMPOSE_FILE="docker-compose.dev.yml"
+  fi
+
+  docker-compose -f "${COMPOSE_FILE}" run --rm -e PYTHONPATH=/app web python scripts/migrate.py
+
+  if [ $? -ne 0 ]; then
+    print_error "Database migration failed."
+    exit 1
+  fi
+}
+
 # Function to build and deploy for production
 deploy_production() {
   print_section "Production Deployment"
@@ -126,6 +143,8 @@ deploy_production() {
   if [ $? -eq 0 ]; then
     print_message "Docker image built successfully."
     
+    migrate_database "prod"
+    
     print_message "Starting containers..."
     docker-compose up -d
     
@@ -152,6 +171,8 @@ deploy_development() {
   if [ $? -eq 0 ]; then
     print_message "Development Docker image built successfully."
     
+    migrate_database "dev"
+    
     print_message "Starting development containers..."
     print_message "Press Ctrl+C to stop the containers when done."
     docker-compose -f docker-compose.dev.yml up
@@ -225,6 +246,7 @@ show_usage() {
   echo "  status        Show status of all containers"
   echo "  backup        Backup the database"
   echo "  restore       Restore the database from a backup"
+  echo "  migrate       Apply pending database migrations"
   echo "  clean         Remove all containers and images related to the project"
   echo "  help          Show this help message"
   echo ""
@@ -258,6 +280,10 @@ case "$1" in
   restore)
     restore_database
     ;;
+  migrate)
+    check_docker
+    migrate_database "prod"
+    ;;
   clean)
     check_docker
     clean_environment
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Script to export users, quiz attempts or per-question answers as CSV or NDJSON
+
+Streams the rows from the database in chunks (see exports.py), so it runs in
+constant memory on any database size.  Writes to standard output unless
+--output is given; --gzip compresses on the fly.
+
+Examples (from the repository root):
+    PYTHONPATH=. python scripts/export_data.py attempts --since 2025-01-01 --output attempts.csv
+    PYTHONPATH=. python scripts/export_data.py answers --user 42 --format ndjson --gzip --output answers.ndjson.gz
+"""
+import argparse
+import sys
+
+from app import app
+import exports
+
+
+def export(args):
+    try:
+        filters = exports.parse_filters(args.user, args.since, args.until)
+    except ValueError as e:
+        sys.exit(f"ERROR: {e}")
+
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        with app.app_context():
+            chunks = exports.stream(
+                args.dataset, args.format, filters, app.config["EXPORT_CHUNK_SIZE"], args.gzip
+            )
+            for chunk in chunks:
+                out.write(chunk)
+                written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Wrote {written} bytes to {args.output}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("dataset", choices=exports.DATASETS, help="what to export")
+    parser.add_argument("--format", choices=exports.FORMATS, default="csv", help="output format")
+    parser.add_argument("--user", type=int, help="only this user ID")
+    parser.add_argument("--since", help="from this UTC date or date-time on")
+    parser.add_argument("--until", help="up to this UTC date (inclusive) or date-time")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    parser.add_argument("--output", "-o", help="file to write instead of standard output")
+    export(parser.parse_args())
@@ -0,0 +1,664 @@
+#!/usr/bin/env python
+"""
+Script to build questions.json from the question PDF in files/
+
+Pages are turned into text in parallel with a process pool and parsed in
+order into questions.  The extracted text of every page is cached by a hash
+of the page content, so after a PDF is updated only its changed pages are
+extracted again.  The correct answers come from the PDF's answer table.
+
+The questions are written to a temporary file and checked against
+answers.json (joined on chapter and relative question number) and against
+the current questions.json.  questions.json is only replaced when every
+check passes; otherwise it is left alone and the extracted questions stay in
+questions.json.new for inspection.
+
+Only files/questions_2.pdf is read by default: questions.json and
+answers.json follow its seven chapters and its answer table.
+files/questions_1.pdf is an older list of 112 questions without chapters or
+answer key.  files/corpus_&_questions.pdf is study material built on that
+older list, with unnumbered questions, notes and photos, and marks the
+correct answers only in bold.  Neither can be keyed by chapter and question
+number, so their questions cannot be reconciled with answers.json.
+
+Requires the pypdf package (pip install pypdf), which the web application
+itself does not need.  With --check, only an existing questions.json is
+checked against answers.json.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from pypdf import PdfReader
+    from pypdf.generic import NameObject, StreamObject
+except ImportError:  # only needed for extraction, not for --check
+    PdfReader = None
+
+DEFAULT_PDFS = ("files/questions_2.pdf",)
+CACHE_DIR = os.path.join("instance", "pdf_cache")
+# Part of every cache key; bump when extract_page changes
+EXTRACTOR_VERSION = 2
+
+CHAPTER_RE = re.compile(r"^\s*ΚΕΦΑΛΑΙΟ\s+(\d+)", re.IGNORECASE)
+QUESTION_RE = re.compile(r"^\s*(\d{1,3})\s*[.)]\s*(\S.*)$")
+OPTION_RE = re.compile(r"^\s*([αβγabc])(?:\s*([.)])|\s)\s*(\S.*)$", re.IGNORECASE)
+# The answer table: a "ΕΡΩΤΗΣΗ ΚΕΦ. 1 ΚΕΦ. 2 ..." header, then one row per
+# question number with the answers of the chapters that have that question
+ANSWER_TABLE_RE = re.compile(r"^\s*ΕΡΩΤΗΣΗ((?:\s+ΚΕΦ\.?\s*\d+)+)\s*$", re.IGNORECASE)
+ANSWER_TABLE_CHAPTER_RE = re.compile(r"ΚΕΦ\.?\s*(\d+)", re.IGNORECASE)
+ANSWER_ROW_RE = re.compile(r"^\s*(\d{1,3})((?:\s+[αβγabc])+)\s*$", re.IGNORECASE)
+OPTION_LETTERS = {"α": "a", "β": "b", "γ": "c", "a": "a", "b": "b", "c": "c"}
+# Never found in Greek text, but typical of a font whose ToUnicode map is
+# shifted: the unassigned U+03A2, a final sigma inside a word, or a medial
+# sigma at the end of one
+GREEK = "\u0370-\u03ff\u1f00-\u1fff"
+NOT_GREEK_RE = re.compile(f"\u03a2|ς(?=[{GREEK}])|σ(?![{GREEK}])")
+TYPOGRAPHIC_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"'})
+# Typos in questions_2.pdf that were corrected by hand in questions.json
+ERRATA = (
+    ("στο, μέγιστο", "στο μέγιστο"),
+    ("απαραίτητη για να :", "απαραίτητη για να:"),
+    ("από τo συνηθισμένο", "από το συνηθισμένο"),  # Latin "o"
+    ("είμαστε μα το", "είμαστε με το"),
+    ("Πειραιά- Σουνίου", "Πειραιά-Σουνίου"),
+)
+
+
+# -- extraction (runs in worker processes) ---------------------------------
+
+_readers = {}
+
+
+def _reader(path):
+    # Each worker opens every PDF once
+    reader = _readers.get(path)
+    if reader is None:
+        reader = _readers[path] = PdfReader(path)
+    return reader
+
+
+def page_hash(page):
+    """Hash of what determines a page's text: its content stream and fonts"""
+    digest = hashlib.sha256(f"v{EXTRACTOR_VERSION}".encode())
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+    resources = page.get("/Resources")
+    fonts = resources.get_object().get("/Font") if resources is not None else None
+    fonts = fonts.get_object() if fonts is not None else {}
+    for name in sorted(fonts):
+        font = fonts[name].get_object()
+        digest.update(name.encode())
+        digest.update(str(font.get("/BaseFont")).encode())
+        to_unicode = font.get("/ToUnicode")
+        if to_unicode is not None:
+            digest.update(to_unicode.get_object().get_data())
+    return digest.hexdigest()
+
+
+def _truetype_cmap(data):
+    """Map glyph IDs to the code points of an embedded TrueType font's
+    Unicode cmap (format 4), or {} if it has none"""
+    num_tables = struct.unpack_from(">H", data, 4)[0]
+    offsets = {}
+    for i in range(num_tables):
+        tag, _, offset, _ = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        offsets[tag] = offset
+    cmap = offsets.get(b"cmap")
+    if cmap is None:
+        return {}
+    subtable = None
+    for i in range(struct.unpack_from(">H", data, cmap + 2)[0]):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, cmap + 4 + 8 * i)
+        if (platform, encoding) in ((3, 1), (0, 3)) and struct.unpack_from(
+            ">H", data, cmap + offset
+        )[0] == 4:
+            subtable = cmap + offset
+            break
+    if subtable is None:
+        return {}
+
+    segments = struct.unpack_from(">H", data, subtable + 6)[0] // 2
+    ends = struct.unpack_from(f">{segments}H", data, subtable + 14)
+    starts = struct.unpack_from(f">{segments}H", data, subtable + 16 + 2 * segments)
+    deltas = struct.unpack_from(f">{segments}H", data, subtable + 16 + 4 * segments)
+    range_offsets_at = subtable + 16 + 6 * segments
+    range_offsets = struct.unpack_from(f">{segments}H", data, range_offsets_at)
+    glyphs = {}
+    for i in range(segments):
+        for code in range(starts[i], min(ends[i], 0xFFFE) + 1):
+            if range_offsets[i]:
+                at = range_offsets_at + 2 * i + range_offsets[i] + 2 * (code - starts[i])
+                glyph = struct.unpack_from(">H", data, at)[0]
+                glyph = (glyph + deltas[i]) & 0xFFFF if glyph else 0
+            else:
+                glyph = (code + deltas[i]) & 0xFFFF
+            if glyph:
+                glyphs.setdefault(glyph, []).append(code)
+    return glyphs
+
+
+def _parse_to_unicode(data):
+    """The bfchar/bfrange entries of a ToUnicode CMap as {code: text}"""
+    text = data.decode("latin-1")
+    hex_string = r"<([0-9A-Fa-f]+)>"
+    mapping = {}
+
+    def decode(value):
+        return bytes.fromhex(value).decode("utf-16-be", "replace")
+
+    for block in re.findall(r"beginbfchar(.*?)endbfchar", text, re.S):
+        for code, value in re.findall(hex_string + r"\s*" + hex_string, block):
+            mapping[int(code, 16)] = decode(value)
+    for block in re.findall(r"beginbfrange(.*?)endbfrange", text, re.S):
+        ranges = re.findall(
+            hex_string + r"\s*" + hex_string + r"\s*(\[[^\]]*\]|<[0-9A-Fa-f]+>)", block
+        )
+        for low, high, values in ranges:
+            codes = range(int(low, 16), int(high, 16) + 1)
+            if values.startswith("["):
+                for code, value in zip(codes, re.findall(hex_string, values)):
+                    mapping[code] = decode(value)
+            else:
+                first = bytes.fromhex(values[1:-1])
+                for step, code in enumerate(codes):
+                    if first[-1] + step > 0xFF:
+                        break
+                    mapping[code] = (first[:-1] + bytes([first[-1] + step])).decode(
+                        "utf-16-be", "replace"
+                    )
+    return mapping
+
+
+def _to_unicode_stream(mapping):
+    lines = [
+        "/CIDInit /ProcSet findresource begin",
+        "12 dict begin",
+        "begincmap",
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+        "/CMapName /Adobe-Identity-UCS def",
+        "/CMapType 2 def",
+        "1 begincodespacerange",
+        "<0000> <FFFF>",
+        "endcodespacerange",
+    ]
+    entries = sorted(mapping.items())
+    for start in range(0, len(entries), 100):
+        chunk = entries[start : start + 100]
+        lines.append(f"{len(chunk)} beginbfchar")
+        lines.extend(
+            f"<{code:04X}> <{text.encode('utf-16-be').hex().upper()}>" for code, text in chunk
+        )
+        lines.append("endbfchar")
+    lines += ["endcmap", "CMapName currentdict /CMap defineresource pop", "end", "end"]
+    stream = StreamObject()
+    stream.set_data("\n".join(lines).encode("ascii"))
+    return stream
+
+
+def repair_to_unicode(page):
+    """Correct ToUnicode maps that disagree with their embedded font.
+
+    Some converters write a ToUnicode map that assumes the Greek glyphs of
+    a font are in Unicode order, which shifts every letter after a gap
+    (questions_1.pdf decodes "Το" as "Σν").  For fonts that address the
+    glyphs of an embedded TrueType font directly, the font's own cmap tells
+    which character each glyph is; where it disagrees with a single-character
+    ToUnicode entry, the cmap wins.  Returns how many fonts were corrected.
+    """
+    resources = page.get("/Resources")
+    fonts = resources.get_object().get("/Font") if resources is not None else None
+    repaired = 0
+    for font in (fonts.get_object() if fonts is not None else {}).values():
+        font = font.get_object()
+        if font.get("/Subtype") != "/Type0" or "/ToUnicode" not in font:
+            continue
+        descendant = font["/DescendantFonts"][0].get_object()
+        descriptor = descendant.get("/FontDescriptor")
+        font_file = descriptor.get_object().get("/FontFile2") if descriptor else None
+        if font_file is None or descendant.get("/CIDToGIDMap", "/Identity") != "/Identity":
+            continue
+
+        to_unicode = _parse_to_unicode(font["/ToUnicode"].get_object().get_data())
+        corrected = dict(to_unicode)
+        for glyph, code_points in _truetype_cmap(font_file.get_object().get_data()).items():
+            text = corrected.get(glyph)
+            # Multi-character entries are ligatures, which the cmap cannot express
+            if text is None or (len(text) == 1 and ord(text) not in code_points):
+                corrected[glyph] = chr(min(code_points))
+        if corrected != to_unicode:
+            font[NameObject("/ToUnicode")] = _to_unicode_stream(corrected)
+            repaired += 1
+    return repaired
+
+
+def extract_page(task):
+    """Extract the text lines of one (path, page index, content hash) task.
+
+    Whitespace runs (the PDFs separate words with tabs) become single
+    spaces, and the page number is dropped, whether it is a line of its own
+    or was run into the last line.
+    """
+    path, index, content_hash = task
+    page = _reader(path).pages[index]
+    repair_to_unicode(page)
+    text = page.extract_text() or ""
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    lines = [line for line in lines if line]
+
+    page_number = str(index + 1)
+    if lines and lines[0] == page_number:
+        lines.pop(0)
+    if lines and lines[-1] == page_number:
+        lines.pop()
+    elif lines and lines[-1].endswith(" " + page_number):
+        lines[-1] = lines[-1][: -len(page_number) - 1]
+    return content_hash, lines
+
+
+# -- page cache -------------------------------------------------------------
+
+
+class PageCache:
+    """Extracted page text stored as one JSON file per content hash"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, content_hash):
+        return os.path.join(self.directory, f"{content_hash}.json")
+
+    def get(self, content_hash):
+        try:
+            with open(self._path(content_hash), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, content_hash, lines):
+        tmp_path = self._path(content_hash) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(lines, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(content_hash))
+
+
+def page_lines(pdf_paths, cache, workers):
+    """Yield the text lines of every page in document order.
+
+    Cached pages are yielded straight away; the rest are extracted by the
+    process pool and yielded as soon as all pages before them are done.
+    """
+    pages = []
+    for path in pdf_paths:
+        reader = PdfReader(path)
+        for index, page in enumerate(reader.pages):
+            pages.append((path, index, page_hash(page)))
+
+    cached = {content_hash: cache.get(content_hash) for _, _, content_hash in pages}
+    # Identical pages are extracted once
+    missing = list(
+        {page[2]: page for page in pages if cached[page[2]] is None}.values()
+    )
+    print(f"{len(pages)} pages, {len(missing)} to extract, the rest cached")
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        extracted = pool.map(extract_page, missing, chunksize=4)
+        for _, _, content_hash in pages:
+            lines = cached[content_hash]
+            if lines is None:
+                content_hash, lines = next(extracted)
+                cache.put(content_hash, lines)
+                cached[content_hash] = lines
+            yield lines
+
+
+# -- parsing ----------------------------------------------------------------
+
+
+class QuestionParser:
+    """Line-by-line state machine turning page text into questions.json entries.
+
+    A question starts with its printed number ("12." or "12)") when that
+    number follows the previous one or restarts at 1, options start with
+    α)/β)/γ) (or a)/b)/c)), and lines in between continue whatever came
+    before.  An "ΕΡΩΤΗΣΗ ΚΕΦ. 1 ΚΕΦ. 2 ..." line starts the answer table,
+    which is read with ``answer_key`` once every question has been seen.
+    """
+
+    def __init__(self):
+        self.chapter = None
+        self.question_number = 0
+        self.rel_number = 0
+        self.last_printed = 0
+        self.current = None
+        self.option = None
+        self.in_answer_key = False
+        # Highest printed question number per chapter
+        self.chapter_sizes = {}
+        # Chapters of the answer table columns, and its (number, letters) rows
+        self.answer_columns = []
+        self.answer_rows = []
+        self.warnings = []
+
+    def feed(self, lines):
+        """Consume one page of lines, yielding the questions it completes"""
+        for line in lines:
+            chapter = CHAPTER_RE.match(line)
+            if chapter:
+                yield from self._finish()
+                self.chapter = chapter.group(1)
+                self.rel_number = 0
+                self.last_printed = 0
+                self.in_answer_key = False
+                continue
+            table = ANSWER_TABLE_RE.match(line)
+            if table:
+                yield from self._finish()
+                self.in_answer_key = True
+                self.answer_columns = ANSWER_TABLE_CHAPTER_RE.findall(table.group(1))
+                continue
+            if self.in_answer_key:
+                row = ANSWER_ROW_RE.match(line)
+                if row:
+                    letters = [OPTION_LETTERS[letter.lower()] for letter in row.group(2).split()]
+                    self.answer_rows.append((row.group(1), letters))
+                continue
+
+            question = QUESTION_RE.match(line)
+            if question and int(question.group(1)) in (self.last_printed + 1, 1):
+                yield from self._finish()
+                self._start(int(question.group(1)), question.group(2))
+                continue
+
+            option = OPTION_RE.match(line)
+            if option and self.current is not None:
+                letter = OPTION_LETTERS[option.group(1).lower()]
+                # "c Τους ..." without a dot only counts as the next option
+                if option.group(2) or letter == "abc"[len(self.current["options"]) % 3]:
+                    self.current["options"][letter] = option.group(3)
+                    self.option = letter
+                    continue
+
+            if self.current is None:
+                continue
+            if self.option:
+                self.current["options"][self.option] += " " + line
+            else:
+                self.current["question"] += " " + line
+
+    def close(self):
+        yield from self._finish()
+
+    def answer_key(self):
+        """(chapter, printed number) -> answer letter, from the answer table.
+
+        Rows near the end are shorter, as they only have answers for the
+        chapters with that many questions; those chapters are known from
+        the questions parsed before the table.
+        """
+        key = {}
+        for number, letters in self.answer_rows:
+            chapters = [
+                chapter
+                for chapter in self.answer_columns
+                if self.chapter_sizes.get(chapter, 0) >= int(number)
+            ]
+            if len(chapters) != len(letters):
+                self.warnings.append(
+                    f"Answer table row {number} has {len(letters)} answers "
+                    f"but {len(chapters)} chapters have that question"
+                )
+                continue
+            for chapter, letter in zip(chapters, letters):
+                key[(chapter, number)] = letter
+        return key
+
+    def _start(self, printed_number, text):
+        if printed_number == 1 and self.last_printed:
+            # Numbering restarted without a chapter heading
+            self.rel_number = 0
+        self.question_number += 1
+        self.rel_number += 1
+        self.last_printed = printed_number
+        chapter = self.chapter or "1"
+        self.chapter_sizes[chapter] = max(self.chapter_sizes.get(chapter, 0), printed_number)
+        self.option = None
+        self.current = {
+            "question_number": str(self.question_number),
+            "chapter": chapter,
+            "question_number_rel": str(self.rel_number),
+            "question": text,
+            "options": {},
+            "correct_answer": None,
+            "_printed": str(printed_number),
+        }
+
+    def _finish(self):
+        question, self.current, self.option = self.current, None, None
+        if question is None:
+            return
+        question["question"] = clean_text(question["question"])
+        for letter, text in question["options"].items():
+            question["options"][letter] = clean_text(text)
+        if sorted(question["options"]) != ["a", "b", "c"]:
+            self.warnings.append(
+                f"Question {question['question_number']} has options "
+                f"{sorted(question['options'])}"
+            )
+        yield question
+
+
+def clean_text(text):
+    text = text.translate(TYPOGRAPHIC_QUOTES)
+    for wrong, right in ERRATA:
+        text = text.replace(wrong, right)
+    return text
+
+
+def apply_answer_key(question, answer_key):
+    printed = question.pop("_printed")
+    answer = answer_key.get((question["chapter"], printed))
+    if answer is not None:
+        question["correct_answer"] = answer
+    return question
+
+
+# -- reconciliation ---------------------------------------------------------
+
+
+def load_answers(path):
+    """Index answers.json by (chapter, relative question number)"""
+    with open(path, "r", encoding="utf-8") as f:
+        answers = json.load(f)
+    return {(a["chapter"], a["question_number_rel"]): a["correct_answer"] for a in answers}
+
+
+def load_questions(path):
+    """Index an existing questions file by (chapter, relative question number)"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            questions = json.load(f)
+    except FileNotFoundError:
+        return None
+    return {(q["chapter"], q["question_number_rel"]): q for q in questions}
+
+
+def question_texts(question):
+    return {"question": question["question"], **question["options"]}
+
+
+class Reconciliation:
+    """Checks questions one by one against answers.json and, when given,
+    the questions file they are about to replace"""
+
+    def __init__(self, answers, existing=None, allow_text_changes=False):
+        self.answers = answers
+        self.existing = existing
+        self.allow_text_changes = allow_text_changes
+        self.seen = set()
+        self.duplicates = []
+        self.mismatches = []
+        self.missing_answers = []
+        self.unanswered = []
+        self.not_greek = []
+        self.text_changes = []
+
+    def check(self, question):
+        """Compare one question with answers.json and the existing file"""
+        key = (question["chapter"], question["question_number_rel"])
+        if key in self.seen:
+            self.duplicates.append(key)
+        self.seen.add(key)
+
+        expected = self.answers.get(key)
+        if question.get("correct_answer") is None:
+            self.unanswered.append(key)
+        elif expected is None:
+            self.missing_answers.append(key)
+        elif question["correct_answer"] != expected:
+            self.mismatches.append((key, question["correct_answer"], expected))
+
+        texts = question_texts(question)
+        if any(NOT_GREEK_RE.search(text) for text in texts.values()):
+            self.not_greek.append(key)
+        if self.existing is not None:
+            old = self.existing.get(key)
+            old_texts = question_texts(old) if old is not None else {}
+            for field, text in texts.items():
+                if old_texts.get(field) != text:
+                    self.text_changes.append((key, field, old_texts.get(field), text))
+        return question
+
+    def report(self):
+        unmatched = sorted(set(self.answers) - self.seen)
+        count = len(self.seen) + len(self.duplicates)
+        print(f"Questions: {count}, answers: {len(self.answers)}")
+        problems = []
+        if count != len(self.answers):
+            problems.append(f"COUNT {count} questions but {len(self.answers)} answers")
+        problems += [f"DUPLICATE chapter {chapter} question {rel}" for chapter, rel in self.duplicates]
+        problems += [
+            f"MISMATCH chapter {chapter} question {rel}: {found} here, {expected} in answers.json"
+            for (chapter, rel), found, expected in self.mismatches
+        ]
+        problems += [
+            f"NO ANSWER IN PDF chapter {chapter} question {rel}" for chapter, rel in self.unanswered
+        ]
+        problems += [
+            f"MISSING ANSWER chapter {chapter} question {rel}" for chapter, rel in self.missing_answers
+        ]
+        problems += [
+            f"ANSWER WITHOUT QUESTION chapter {chapter} question {rel}" for chapter, rel in unmatched
+        ]
+        problems += [
+            f"NOT VALID GREEK chapter {chapter} question {rel} (wrong font encoding?)"
+            for chapter, rel in self.not_greek
+        ]
+        for message in problems:
+            print(message)
+
+        label = "TEXT CHANGE" if self.allow_text_changes else "TEXT DIFFERS"
+        for (chapter, rel), field, old, new in self.text_changes:
+            print(f"{label} chapter {chapter} question {rel} {field}:")
+            print(f"    was: {old}")
+            print(f"    now: {new}")
+        ok = not problems and (self.allow_text_changes or not self.text_changes)
+        if ok:
+            print("All questions match answers.json.")
+        return ok
+
+
+# -- output -----------------------------------------------------------------
+
+
+def write_json_stream(path, items):
+    """Write items as a JSON array one entry at a time, formatted like
+    json.dump(..., indent=4)"""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for item in items:
+            f.write(",\n    " if count else "\n    ")
+            f.write(json.dumps(item, ensure_ascii=False, indent=4).replace("\n", "\n    "))
+            count += 1
+        f.write("\n]" if count else "]")
+    return count
+
+
+def ingest(pdf_paths, output, answers_path, cache_dir, workers, allow_text_changes):
+    if PdfReader is None:
+        sys.exit("ERROR: extracting PDFs needs the pypdf package (pip install pypdf).")
+
+    reconciliation = Reconciliation(
+        load_answers(answers_path), load_questions(output), allow_text_changes
+    )
+    parser = QuestionParser()
+
+    def questions():
+        # The answer table comes after all questions, so they are held until
+        # the last page has been parsed
+        parsed = []
+        for lines in page_lines(pdf_paths, PageCache(cache_dir), workers):
+            parsed.extend(parser.feed(lines))
+        parsed.extend(parser.close())
+        answer_key = parser.answer_key()
+        for question in parsed:
+            yield reconciliation.check(apply_answer_key(question, answer_key))
+
+    new_path = output + ".new"
+    count = write_json_stream(new_path, questions())
+    for warning in parser.warnings:
+        print(f"WARNING: {warning}")
+    ok = reconciliation.report()
+    if ok:
+        os.replace(new_path, output)
+        print(f"Wrote {count} questions to {output}")
+    else:
+        print(f"{output} was not changed; the {count} extracted questions are in {new_path}")
+    return ok
+
+
+def check(questions_path, answers_path):
+    reconciliation = Reconciliation(load_answers(answers_path))
+    with open(questions_path, "r", encoding="utf-8") as f:
+        for question in json.load(f):
+            reconciliation.check(question)
+    return reconciliation.report()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("pdfs", nargs="*", default=DEFAULT_PDFS, help="question PDFs, in order")
+    parser.add_argument("--output", default="questions.json", help="questions file to write")
+    parser.add_argument("--answers", default="answers.json", help="answer key to reconcile against")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="where extracted pages are cached")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="extraction processes")
+    parser.add_argument(
+        "--allow-text-changes",
+        action="store_true",
+        help="replace --output even if question texts differ from it (after a PDF update)",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="only check --output against --answers"
+    )
+    args = parser.parse_args()
+
+    if args.check:
+        ok = check(args.output, args.answers)
+    else:
+        ok = ingest(
+            args.pdfs,
+            args.output,
+            args.answers,
+            args.cache_dir,
+            args.workers,
+            args.allow_text_changes,
+        )
+    sys.exit(0 if ok else 1)
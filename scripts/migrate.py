@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Script to apply the versioned schema migrations in migrations.py
+
+Creates missing tables, then applies every pending migration in version
+order, each in its own transaction together with its query plan checks.
+Stops at the first migration whose checks fail.  Run by scripts/deploy.sh
+before the containers are (re)started.
+
+    PYTHONPATH=. python scripts/migrate.py            # apply pending migrations
+    PYTHONPATH=. python scripts/migrate.py --status   # list applied and pending
+    PYTHONPATH=. python scripts/migrate.py --check    # re-run all plan checks
+"""
+import argparse
+import sys
+
+from app import app, db
+from db_profile import database_profile
+from migrations import MIGRATIONS, apply, applied_versions, check_all, pending_migrations
+
+
+def print_problems(problems):
+    for check, plan in problems:
+        print(f"  PLAN CHECK FAILED {check.description}:")
+        for line in plan:
+            print(f"    {line}")
+
+
+def migrate():
+    pending = pending_migrations()
+    if not pending:
+        print("Database schema is up to date.")
+        return True
+    for migration in pending:
+        print(f"Applying migration {migration.version}: {migration.name}...")
+        problems = database_profile.run_write(apply, migration)
+        if problems:
+            print_problems(problems)
+            print(f"Migration {migration.version} rolled back.")
+            return False
+        print(f"  {len(migration.checks)} query plan checks passed.")
+    return True
+
+
+def status():
+    applied = applied_versions()
+    for migration in MIGRATIONS:
+        state = "applied" if migration.version in applied else "pending"
+        print(f"{migration.version:>4}  {state:<8} {migration.name}")
+    return True
+
+
+def check():
+    if db.engine.dialect.name != "sqlite":
+        print("Query plan checks only run on SQLite.")
+        return True
+    ok = True
+    for migration, problems in check_all():
+        print(f"Migration {migration.version}: {len(migration.checks) - len(problems)}/{len(migration.checks)} plan checks passed")
+        print_problems(problems)
+        ok = ok and not problems
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    group.add_argument("--check", action="store_true", help="re-run the plan checks of applied migrations")
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        if args.status:
+            ok = status()
+        elif args.check:
+            ok = check()
+        else:
+            ok = migrate()
+    sys.exit(0 if ok else 1)
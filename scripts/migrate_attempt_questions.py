@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Migration that moves the per-attempt JSON snapshots (questions_data and
+user_answers) into the normalized question_revision / attempt_question tables.
+
+Attempts are streamed in batches ordered by ID, so memory use does not grow
+with the number of attempts, and every batch is committed on its own: the
+script can be interrupted and re-run safely.  Database size is reported
+before and after (SQLite only).
+"""
+import argparse
+import json
+
+from sqlalchemy import insert, text
+
+from app import app, db
+from models import AttemptQuestion, QuestionRevision, QuizAttempt
+
+BATCH_SIZE = 500
+
+
+def database_size():
+    """Return (allocated bytes, free bytes) of a SQLite database, or None"""
+    if db.engine.dialect.name != "sqlite":
+        return None
+    with db.engine.connect() as conn:
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        page_count = conn.execute(text("PRAGMA page_count")).scalar()
+        freelist = conn.execute(text("PRAGMA freelist_count")).scalar()
+    return page_size * page_count, page_size * freelist
+
+
+def format_size(size):
+    if size is None:
+        return "n/a (not SQLite)"
+    allocated, free = size
+    return f"{allocated / 1024 / 1024:.2f} MB ({free / 1024 / 1024:.2f} MB free pages)"
+
+
+def load_revision_index():
+    """Map (question_id, content_hash) to revision IDs for all revisions"""
+    rows = db.session.execute(
+        db.select(
+            QuestionRevision.question_id,
+            QuestionRevision.content_hash,
+            QuestionRevision.id,
+        )
+    )
+    return {(question_id, digest): rev_id for question_id, digest, rev_id in rows}
+
+
+def migrate_batch(attempts, revision_index):
+    """Convert one batch of (id, questions_data, user_answers) tuples"""
+    new_revisions = {}
+    parsed = []
+    for attempt_id, questions_data, user_answers in attempts:
+        questions = json.loads(questions_data)
+        answers = json.loads(user_answers) if user_answers else {}
+        parsed.append((attempt_id, questions, answers))
+        for question in questions:
+            digest = QuestionRevision.compute_hash(
+                question["question_text"], question["options"], question["correct_answer"]
+            )
+            key = (question["id"], digest)
+            if key not in revision_index and key not in new_revisions:
+                new_revisions[key] = QuestionRevision.from_dict(question)
+
+    if new_revisions:
+        db.session.add_all(new_revisions.values())
+        db.session.flush()
+        for key, revision in new_revisions.items():
+            revision_index[key] = revision.id
+
+    rows = []
+    for attempt_id, questions, answers in parsed:
+        for position, question in enumerate(questions):
+            digest = QuestionRevision.compute_hash(
+                question["question_text"], question["options"], question["correct_answer"]
+            )
+            rows.append(
+                {
+                    "attempt_id": attempt_id,
+                    "position": position,
+                    "question_id": question["id"],
+                    "revision_id": revision_index[(question["id"], digest)],
+                    "answer": answers.get(str(question["id"])) or None,
+                }
+            )
+    if rows:
+        db.session.execute(insert(AttemptQuestion), rows)
+
+    attempt_ids = [attempt_id for attempt_id, _, _ in parsed]
+    QuizAttempt.query.filter(QuizAttempt.id.in_(attempt_ids)).update(
+        {"questions_data": "", "user_answers": None}, synchronize_session=False
+    )
+    db.session.commit()
+    db.session.expunge_all()
+    return len(rows)
+
+
+def migrate(batch_size=BATCH_SIZE, vacuum=True):
+    db.create_all()
+    size_before = database_size()
+    print(f"Database size before: {format_size(size_before)}")
+
+    revision_index = load_revision_index()
+    last_id = 0
+    attempts_done = 0
+    rows_done = 0
+    while True:
+        batch = db.session.execute(
+            db.select(
+                QuizAttempt.id, QuizAttempt.questions_data, QuizAttempt.user_answers
+            )
+            .where(QuizAttempt.id > last_id, QuizAttempt.questions_data != "")
+            .order_by(QuizAttempt.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        rows_done += migrate_batch(batch, revision_index)
+        attempts_done += len(batch)
+        last_id = batch[-1][0]
+        print(f"Migrated {attempts_done} attempts ({rows_done} question rows)...")
+
+    print(f"Done: {attempts_done} attempts, {rows_done} question rows.")
+
+    if vacuum and db.engine.dialect.name == "sqlite":
+        print("Running VACUUM to reclaim space...")
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+    size_after = database_size()
+    print(f"Database size after: {format_size(size_after)}")
+    if size_before and size_after:
+        saved = size_before[0] - size_after[0]
+        print(f"Reclaimed {saved / 1024 / 1024:.2f} MB")
+
+
+# Run the migration
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--no-vacuum", action="store_true", help="skip VACUUM after migrating"
+    )
+    args = parser.parse_args()
+    with app.app_context():
+        migrate(batch_size=args.batch_size, vacuum=not args.no_vacuum)
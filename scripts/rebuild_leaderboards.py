@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+"""
+Script to recompute the weekly, monthly and all-time leaderboards from all
+completed quiz attempts
+
+Reads the attempt history in a single streaming pass and replaces the
+leaderboard tables in one write transaction; quiz submissions wait for it.
+"""
+import argparse
+
+from app import app
+from db_profile import database_profile
+import leaderboard
+
+
+def rebuild_leaderboards(chunk_size):
+    with app.app_context():
+        attempts, entries = database_profile.run_write(
+            leaderboard.rebuild,
+            chunk_size=chunk_size,
+            progress=lambda done: print(f"Processed {done} attempts..."),
+        )
+        print(f"Leaderboards rebuilt from {attempts} attempts ({entries} entries).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=leaderboard.REBUILD_CHUNK_SIZE,
+        help="attempts read per fetch",
+    )
+    args = parser.parse_args()
+    rebuild_leaderboards(args.chunk_size)
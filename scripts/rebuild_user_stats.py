@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+"""
+Script to recompute the per-user statistics aggregates from quiz history
+"""
+import argparse
+
+from app import app, db
+from models import User, UserStats
+
+BATCH_SIZE = 200
+
+
+def rebuild_user_stats(user_id=None):
+    with app.app_context():
+        if user_id is not None:
+            user_ids = [user_id]
+        else:
+            user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+
+        for count, uid in enumerate(user_ids, start=1):
+            UserStats.rebuild(uid)
+            if count % BATCH_SIZE == 0:
+                db.session.commit()
+                print(f"Rebuilt statistics for {count} users...")
+        db.session.commit()
+        print(f"Statistics rebuilt for {len(user_ids)} users.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--user", type=int, help="only rebuild this user ID")
+    args = parser.parse_args()
+    rebuild_user_stats(args.user)
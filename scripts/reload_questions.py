@@ -1,61 +1,50 @@
 #!/usr/bin/env python
 """
-Script to flush all questions from the database and reload from questions.json
+Script to synchronise the questions in the database with questions.json
+
+New questions are inserted, changed ones are updated in place and questions
+that are no longer in the file are deleted, so question IDs stay stable.
 """
-from app import app, db
+import argparse
+
+from app import app, create_schema, db
 from models import Question
-import json
+from question_import import import_questions_file
 
-def reload_questions():
+def reload_questions(path="questions.json", keep_missing=False, dry_run=False):
     with app.app_context():
-        # Count questions before deletion
+        create_schema()
         count_before = Question.query.count()
-        print(f"Questions before flush: {count_before}")
-        
-        # Delete all existing questions
-        Question.query.delete()
-        db.session.commit()
-        
-        print("All questions have been deleted from the database.")
-        
-        # Reload from questions.json
+        print(f"Questions before reload: {count_before}")
+
         try:
-            with open("questions.json", "r", encoding="utf-8") as f:
-                questions_data = json.load(f)
-            
-            count = 0
-            for q_data in questions_data:
-                # Format question text to include chapter and relative question number
-                chapter = q_data.get("chapter", "")
-                question_number_rel = q_data.get("question_number_rel", "")
-                formatted_question = f"[Κεφ. {chapter}, Ερ. {question_number_rel}] {q_data['question']}"
-                
-                question = Question(
-                    question_text=formatted_question,
-                    option_a=q_data["options"]["a"],
-                    option_b=q_data["options"]["b"],
-                    option_c=q_data["options"]["c"],
-                    option_d="",  # Adding empty option_d since it's required
-                    correct_answer=q_data["correct_answer"],
-                    # Add category and difficulty if they exist in the JSON
-                    category=q_data.get("chapter", None),  # Use chapter as category
-                    difficulty=None,
-                )
-                db.session.add(question)
-                count += 1
-            
-            db.session.commit()
-            print(f"Questions loaded successfully! Added {count} new questions.")
-            
+            report = import_questions_file(
+                path, delete_missing=not keep_missing, dry_run=dry_run
+            )
+            print(report)
+
             # Verify the reload
             count_after = Question.query.count()
             print(f"Questions after reload: {count_after}")
-            
+
         except FileNotFoundError:
-            print("ERROR: questions.json file not found.")
+            print(f"ERROR: {path} file not found.")
         except Exception as e:
             print(f"Error loading questions: {e}")
             db.session.rollback()
 
 if __name__ == "__main__":
-    reload_questions()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--file", default="questions.json", help="questions file to load")
+    parser.add_argument(
+        "--keep-missing",
+        action="store_true",
+        help="do not delete questions that are no longer in the file",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report what would change",
+    )
+    args = parser.parse_args()
+    reload_questions(args.file, keep_missing=args.keep_missing, dry_run=args.dry_run)
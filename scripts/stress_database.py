@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Stress test of concurrent database writes under gunicorn
+
+Starts gunicorn with several workers and threads against a copy of a seeded
+database, logs every client in as one of the seed users and then has all
+clients take quizzes back to back for a fixed time: start a quiz, fetch it,
+save the answers in two /submit_answers batches plus a few /submit_answer
+calls, and submit it.  Every one of those requests writes.
+
+The run fails (exit status 1) on any 5xx response, any SQLite "database is
+locked" error in the server log or any client that could not finish.  Write
+transactions that had to be retried are reported separately; they are
+expected under contention and are not errors.
+
+Example (from the repository root), at the production target of 4 workers
+with 8 threads each:
+    PYTHONPATH=. python scripts/stress_database.py --workers 4 --threads 8 --clients 32
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+
+from benchmark_quiz import (
+    BENCH_DIR,
+    LOCK_ERROR,
+    QUIZ_ID_RE,
+    SEED_ATTEMPTS_PER_USER,
+    SEED_PASSWORD,
+    SEED_SIZES,
+    HTTPSession,
+    ensure_seed,
+    start_gunicorn,
+    summarize,
+)
+
+RETRY_MESSAGE = "retrying write transaction"
+
+
+def take_quizzes(session, deadline, rng):
+    """Take quizzes until ``deadline``, returning (route, seconds, status) timings"""
+    timings = []
+
+    def call(route, method, path, **kwargs):
+        started = time.perf_counter()
+        status, body = session.request(method, path, **kwargs)
+        timings.append((route, time.perf_counter() - started, status))
+        return status, body
+
+    seq = 0
+    while time.monotonic() < deadline:
+        call("GET /start_quiz", "GET", "/start_quiz")
+        _, page = call("GET /quiz", "GET", "/quiz")
+        match = QUIZ_ID_RE.search(page)
+        if match is None:
+            raise RuntimeError("no quiz was started")
+        quiz_id = int(match.group(1))
+
+        _, body = call("GET /api/quiz/<id>", "GET", f"/api/quiz/{quiz_id}")
+        answers = []
+        for question in json.loads(body)["questions"]:
+            seq += 1
+            answers.append({"question_id": question["id"], "answer": rng.choice("abc"), "seq": seq})
+        half = len(answers) // 2
+        for batch in (answers[:half], answers[half:]):
+            call(
+                "POST /submit_answers", "POST", "/submit_answers",
+                payload={"quiz_id": quiz_id, "answers": batch},
+            )
+        for answer in answers[:3]:
+            call(
+                "POST /submit_answer", "POST", "/submit_answer",
+                payload={"quiz_id": quiz_id, "question_id": answer["question_id"], "answer": answer["answer"]},
+            )
+        call(
+            "POST /submit_quiz", "POST", "/submit_quiz",
+            payload={"quiz_id": quiz_id, "answers": answers},
+        )
+    return timings
+
+
+def stress(args):
+    users = -(-SEED_SIZES[args.seed] // SEED_ATTEMPTS_PER_USER)
+    if args.clients > users:
+        sys.exit(f"ERROR: the {args.seed} seed has {users} users, fewer than --clients.")
+
+    template = ensure_seed(args.seed)
+    run_db = os.path.join(BENCH_DIR, "run_stress.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(run_db + suffix):
+            os.remove(run_db + suffix)
+    shutil.copyfile(template, run_db)
+
+    log_path = os.path.join(BENCH_DIR, "stress_gunicorn.log")
+    server, base_url = start_gunicorn(f"sqlite:///{run_db}", args.workers, log_path, args.threads)
+
+    results, failures = [], []
+    deadline = [None]
+
+    def start_clock():
+        deadline[0] = time.monotonic() + args.seconds
+
+    # Logins hash passwords and are left out of the timed part
+    ready = threading.Barrier(args.clients + 1, action=start_clock)
+
+    def client(index):
+        session = HTTPSession(base_url)
+        try:
+            session.request(
+                "POST", "/login", form={"username": f"seed{index + 1}", "password": SEED_PASSWORD}
+            )
+        finally:
+            ready.wait()
+        try:
+            results.append(take_quizzes(session, deadline[0], random.Random(index)))
+        except Exception as e:
+            failures.append(f"seed{index + 1}: {e}")
+
+    try:
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        ready.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+        log = f.read()
+    timings = [timing for result in results for timing in result]
+    server_errors = sum(1 for _, _, status in timings if status >= 500)
+    lock_errors = log.count(LOCK_ERROR)
+    quizzes = sum(1 for route, _, status in timings if route == "POST /submit_quiz" and status == 200)
+
+    print(
+        f"{args.workers} workers x {args.threads} threads, {args.clients} clients, "
+        f"{duration:.1f}s: {len(timings)} requests ({len(timings) / duration:.1f} req/s), "
+        f"{quizzes} quizzes submitted"
+    )
+    print(f"{'route':<24}{'req':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, row in sorted(summarize(timings, duration).items()):
+        print(
+            f"{route:<24}{row['requests']:>7}{row['errors']:>5}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+    print(
+        f"server errors: {server_errors}, lock errors: {lock_errors}, "
+        f"retried write transactions: {log.count(RETRY_MESSAGE)}, failed clients: {len(failures)}"
+    )
+    for failure in failures:
+        print(f"FAILED {failure}")
+    if server_errors or lock_errors or failures:
+        print(f"FAIL, see {log_path}")
+        return False
+    print("OK")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--seconds", type=float, default=30, help="how long to keep writing")
+    parser.add_argument("--seed", choices=SEED_SIZES, default="1k", help="seeded attempts")
+    args = parser.parse_args()
+    sys.exit(0 if stress(args) else 1)
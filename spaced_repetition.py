@@ -0,0 +1,276 @@
+"""Spaced-repetition practice mode.
+
+Every question in the bank has a ``ReviewCard`` per user, scheduled with the
+SM-2 algorithm: a correct answer pushes the card out by a growing interval
+(1 day, 6 days, then the previous interval times the card's ease), a wrong
+answer brings it back after ``RELEARN_MINUTES`` and lowers its ease.  The
+quality of an answer (SM-2's 0-5 grade) comes from whether it was correct
+and how long it took.
+
+Cards are created when a user opens the practice page, so that GET writes
+on the first visit and after the question bank changes; ``ensure_cards``
+compares the card and bank IDs first and only then takes the write lock.
+Questions the user got wrong in quizzes (``UserQuestionStats``) start out
+due first.  The next
+cards to practise are one range scan of the covering index on
+``(user_id, due_at, question_id)``; their payloads come from the in-memory
+question bank, the same ``Question.to_dict`` payloads quizzes use.  The page
+sends reviews in batches, each applied with one executemany UPDATE.
+Practice does not create quiz attempts or touch quiz statistics.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, delete, insert, or_, update
+
+from db_profile import database_profile
+from models import db, ReviewCard, UserQuestionStats
+
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_MINUTES = 10
+# Correct answers given within these many seconds get SM-2 grade 5, then 4;
+# slower ones get 3
+FAST_SECONDS = 10
+NORMAL_SECONDS = 30
+WRONG_GRADE = 1
+
+card_table = ReviewCard.__table__
+
+UPDATE_CARD = (
+    update(card_table)
+    .where(
+        card_table.c.user_id == bindparam("b_user_id"),
+        card_table.c.question_id == bindparam("b_question_id"),
+        or_(
+            card_table.c.review_seq.is_(None),
+            card_table.c.review_seq < bindparam("b_seq"),
+        ),
+    )
+    .values(
+        ease=bindparam("b_ease"),
+        interval_days=bindparam("b_interval_days"),
+        repetitions=bindparam("b_repetitions"),
+        lapses=bindparam("b_lapses"),
+        due_at=bindparam("b_due_at"),
+        reviewed_at=bindparam("b_reviewed_at"),
+        review_seq=bindparam("b_seq"),
+    )
+)
+
+
+def grade(is_correct, seconds):
+    """SM-2 quality (0-5) of an answer"""
+    if not is_correct:
+        return WRONG_GRADE
+    if seconds is not None and seconds <= FAST_SECONDS:
+        return 5
+    if seconds is None or seconds <= NORMAL_SECONDS:
+        return 4
+    return 3
+
+
+def schedule(card, quality, now):
+    """Next state of a card ``{ease, interval_days, repetitions, lapses}``"""
+    ease = max(MIN_EASE, card["ease"] + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return {
+            "ease": ease,
+            "interval_days": 0,
+            "repetitions": 0,
+            "lapses": card["lapses"] + 1,
+            "due_at": now + timedelta(minutes=RELEARN_MINUTES),
+        }
+
+    repetitions = card["repetitions"] + 1
+    if repetitions == 1:
+        interval = 1
+    elif repetitions == 2:
+        interval = 6
+    else:
+        interval = max(1, round(card["interval_days"] * card["ease"]))
+    return {
+        "ease": ease,
+        "interval_days": interval,
+        "repetitions": repetitions,
+        "lapses": card["lapses"],
+        "due_at": now + timedelta(days=interval),
+    }
+
+
+def _card_ids(user_id):
+    return set(
+        db.session.execute(
+            db.select(ReviewCard.question_id).where(ReviewCard.user_id == user_id)
+        ).scalars()
+    )
+
+
+def ensure_cards(user_id, snapshot):
+    """Create the user's missing cards and drop those of deleted questions"""
+    bank_ids = set(snapshot.ids)
+    have = _card_ids(user_id)
+    if have == bank_ids:
+        return 0
+    return database_profile.run_write(_sync_cards, user_id, bank_ids)
+
+
+def _sync_cards(user_id, bank_ids):
+    # Diffed again inside the write transaction, which may be a retry
+    have = _card_ids(user_id)
+    missing = bank_ids - have
+    orphans = have - bank_ids
+    if orphans:
+        db.session.execute(
+            delete(ReviewCard).where(
+                ReviewCard.user_id == user_id, ReviewCard.question_id.in_(orphans)
+            )
+        )
+    if missing:
+        now = datetime.utcnow()
+        # Questions missed more often in quizzes become due earlier
+        wrong = dict(
+            db.session.execute(
+                db.select(
+                    UserQuestionStats.question_id,
+                    UserQuestionStats.times_served - UserQuestionStats.times_correct,
+                ).where(UserQuestionStats.user_id == user_id)
+            ).all()
+        )
+        db.session.execute(
+            insert(ReviewCard),
+            [
+                {
+                    "user_id": user_id,
+                    "question_id": question_id,
+                    "ease": DEFAULT_EASE,
+                    "interval_days": 0,
+                    "repetitions": 0,
+                    "lapses": 0,
+                    "due_at": now - timedelta(minutes=wrong.get(question_id, 0)),
+                }
+                for question_id in sorted(missing)
+            ],
+        )
+    db.session.commit()
+    return len(missing)
+
+
+def due_query(user_id, now, limit):
+    return (
+        db.select(ReviewCard.question_id)
+        .where(ReviewCard.user_id == user_id, ReviewCard.due_at <= now)
+        .order_by(ReviewCard.due_at)
+        .limit(limit)
+    )
+
+
+def due_cards(user_id, snapshot, limit):
+    """Payloads of the user's next due cards, most overdue first"""
+    question_ids = db.session.execute(
+        due_query(user_id, datetime.utcnow(), limit)
+    ).scalars()
+    return [
+        snapshot.payloads[snapshot.position_of[question_id]]
+        for question_id in question_ids
+        if question_id in snapshot.position_of
+    ]
+
+
+def due_count(user_id):
+    return db.session.execute(
+        db.select(db.func.count())
+        .select_from(ReviewCard)
+        .where(ReviewCard.user_id == user_id, ReviewCard.due_at <= datetime.utcnow())
+    ).scalar()
+
+
+def next_due_at(user_id):
+    return db.session.execute(
+        db.select(db.func.min(ReviewCard.due_at)).where(ReviewCard.user_id == user_id)
+    ).scalar()
+
+
+def parse_reviews(items):
+    """Validate a list of {question_id, answer, seq, seconds} dicts from the client.
+
+    Returns a list of (question_id, answer, seq, seconds) tuples, or None if
+    invalid.  ``seconds`` is optional.
+    """
+    if not isinstance(items, list):
+        return None
+    reviews = []
+    for item in items:
+        try:
+            question_id = int(item["question_id"])
+            seq = int(item["seq"])
+            answer = item["answer"]
+            seconds = item.get("seconds")
+            seconds = float(seconds) if seconds is not None else None
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+        if answer not in ("a", "b", "c", "d"):
+            return None
+        reviews.append((question_id, answer, seq, seconds))
+    return reviews
+
+
+def record_reviews(user_id, reviews, snapshot):
+    """Reschedule the reviewed cards and commit; returns how many were applied.
+
+    Reviews are applied in sequence order.  A review whose sequence number
+    is not newer than the card's last one (a replayed batch) is skipped.
+    """
+    question_ids = {question_id for question_id, _, _, _ in reviews}
+    cards = {
+        card.question_id: {
+            "ease": card.ease,
+            "interval_days": card.interval_days,
+            "repetitions": card.repetitions,
+            "lapses": card.lapses,
+            "review_seq": card.review_seq,
+        }
+        for card in db.session.execute(
+            db.select(ReviewCard).where(
+                ReviewCard.user_id == user_id, ReviewCard.question_id.in_(question_ids)
+            )
+        ).scalars()
+    }
+
+    now = datetime.utcnow()
+    updated = {}
+    for question_id, answer, seq, seconds in sorted(reviews, key=lambda review: review[2]):
+        card = cards.get(question_id)
+        position = snapshot.position_of.get(question_id)
+        if card is None or position is None:
+            continue
+        if card["review_seq"] is not None and seq <= card["review_seq"]:
+            continue
+        is_correct = answer == snapshot.payloads[position]["correct_answer"]
+        card.update(schedule(card, grade(is_correct, seconds), now), review_seq=seq)
+        updated[question_id] = card
+
+    if updated:
+        db.session.execute(
+            UPDATE_CARD,
+            [
+                {
+                    "b_user_id": user_id,
+                    "b_question_id": question_id,
+                    "b_ease": card["ease"],
+                    "b_interval_days": card["interval_days"],
+                    "b_repetitions": card["repetitions"],
+                    "b_lapses": card["lapses"],
+                    "b_due_at": card["due_at"],
+                    "b_reviewed_at": now,
+                    "b_seq": card["review_seq"],
+                }
+                for question_id, card in updated.items()
+            ],
+        )
+    db.session.commit()
+    return len(updated)
+
+
+def reset_user(user_id):
+    """Forget a user's practice schedule (caller commits)"""
+    db.session.execute(delete(ReviewCard).where(ReviewCard.user_id == user_id))
@@ -0,0 +1,148 @@
+// Answers waiting to be sent to the server. They are kept in IndexedDB, so
+// they survive reloads, lost connections and closed tabs. The quiz page and
+// the service worker both load this file; the service worker flushes the
+// queue when the connection comes back, even if the page is already gone.
+//
+// Only the answer with the highest sequence number is kept per question, and
+// /submit_answers ignores answers older than the stored one, so sending the
+// same batch twice (from the page and the service worker) is harmless.
+const answerQueue = (() => {
+    const dbName = 'quiz-offline';
+    const storeName = 'answers';
+    const batchSize = 100;
+    let dbPromise = null;
+    let flushing = null;
+    let flushAgain = null;
+
+    function openDb() {
+        if (!dbPromise) {
+            dbPromise = new Promise((resolve, reject) => {
+                const request = indexedDB.open(dbName, 1);
+                request.onupgradeneeded = () => {
+                    request.result.createObjectStore(storeName, { keyPath: ['quiz_id', 'question_id'] });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => {
+                    dbPromise = null;
+                    reject(request.error);
+                };
+            });
+        }
+        return dbPromise;
+    }
+
+    // Run `work(store)` in a transaction; resolves with what it returned once
+    // the transaction has completed
+    function withStore(mode, work) {
+        return openDb().then(db => new Promise((resolve, reject) => {
+            const tx = db.transaction(storeName, mode);
+            const result = work(tx.objectStore(storeName));
+            tx.oncomplete = () => resolve(result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        }));
+    }
+
+    function put(quizId, questionId, answer, seq) {
+        const item = { quiz_id: Number(quizId), question_id: Number(questionId), answer: answer, seq: seq };
+        return withStore('readwrite', store => {
+            const request = store.get([item.quiz_id, item.question_id]);
+            request.onsuccess = () => {
+                if (!request.result || request.result.seq < item.seq) {
+                    store.put(item);
+                }
+            };
+        });
+    }
+
+    function pending() {
+        return withStore('readonly', store => {
+            const items = [];
+            store.openCursor().onsuccess = e => {
+                const cursor = e.target.result;
+                if (cursor) {
+                    items.push(cursor.value);
+                    cursor.continue();
+                }
+            };
+            return items;
+        });
+    }
+
+    // Remove answers the server has seen, unless they were changed meanwhile
+    function acknowledge(items) {
+        return withStore('readwrite', store => {
+            items.forEach(item => {
+                const request = store.get([item.quiz_id, item.question_id]);
+                request.onsuccess = () => {
+                    if (request.result && request.result.seq <= item.seq) {
+                        store.delete([item.quiz_id, item.question_id]);
+                    }
+                };
+            });
+        });
+    }
+
+    function send(quizId, items) {
+        return fetch('/submit_answers', {
+            method: 'POST',
+            credentials: 'same-origin',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({
+                quiz_id: quizId,
+                answers: items.map(item => ({ question_id: item.question_id, answer: item.answer, seq: item.seq }))
+            })
+        }).then(response => {
+            // Logged out (redirected to the login page), busy or failing:
+            // keep the answers for the next attempt
+            if (response.redirected || response.status === 429 || response.status >= 500) {
+                throw new Error(`Answers not accepted (${response.status})`);
+            }
+            // Anything else is final, including a quiz that was already
+            // submitted, so the answers leave the queue
+            return acknowledge(items);
+        });
+    }
+
+    // Send everything in the queue, in batches per quiz. Rejects when a
+    // batch could not be delivered; what is left stays queued.
+    function flush() {
+        if (flushing) {
+            // Answers queued meanwhile are picked up by one more flush
+            if (!flushAgain) {
+                flushAgain = flushing.catch(() => null).then(() => {
+                    flushAgain = null;
+                    return flush();
+                });
+            }
+            return flushAgain;
+        }
+        flushing = pending()
+            .then(items => {
+                const byQuiz = {};
+                items.forEach(item => {
+                    (byQuiz[item.quiz_id] = byQuiz[item.quiz_id] || []).push(item);
+                });
+                let chain = Promise.resolve();
+                Object.entries(byQuiz).forEach(([quizId, quizItems]) => {
+                    for (let i = 0; i < quizItems.length; i += batchSize) {
+                        const batch = quizItems.slice(i, i + batchSize);
+                        chain = chain.then(() => send(Number(quizId), batch));
+                    }
+                });
+                return chain.then(() => items.length);
+            })
+            .finally(() => {
+                flushing = null;
+            });
+        return flushing;
+    }
+
+    return {
+        available: typeof indexedDB !== 'undefined',
+        put: put,
+        flush: flush,
+    };
+})();
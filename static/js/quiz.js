@@ -66,6 +66,62 @@ function startTimer(duration, display) {
     return interval;
 }
 
+// Fetch the questions of a quiz. The response carries an ETag, so a reload
+// only costs a conditional request answered with 304 Not Modified.
+function loadQuiz(quizId) {
+    return fetch(`/api/quiz/${quizId}`, {
+        headers: { 'Accept': 'application/json' }
+    }).then(response => response.json());
+}
+
+// Render question cards; only the first one is visible
+function renderQuestions(container, questions, answers) {
+    container.replaceChildren();
+    questions.forEach((question, index) => {
+        const card = document.createElement('div');
+        card.className = 'question-card card' + (index === 0 ? '' : ' d-none');
+        card.dataset.questionIndex = index;
+        card.dataset.questionId = question.id;
+
+        const header = document.createElement('div');
+        header.className = 'card-header';
+        const heading = document.createElement('h5');
+        heading.textContent = `Ερώτηση ${index + 1}`;
+        header.appendChild(heading);
+
+        const body = document.createElement('div');
+        body.className = 'card-body';
+        const title = document.createElement('h6');
+        title.className = 'card-title';
+        title.textContent = question.question_text;
+        const options = document.createElement('div');
+        options.className = 'options mt-3';
+
+        Object.entries(question.options).forEach(([key, text]) => {
+            const inputId = `q${question.id}_${key}`;
+            const option = document.createElement('div');
+            option.className = 'form-check mb-2';
+            const input = document.createElement('input');
+            input.className = 'form-check-input';
+            input.type = 'radio';
+            input.name = `question_${question.id}`;
+            input.id = inputId;
+            input.value = key;
+            input.checked = answers[question.id] === key;
+            const label = document.createElement('label');
+            label.className = 'form-check-label';
+            label.htmlFor = inputId;
+            label.textContent = `${key.toUpperCase()}. ${text}`;
+            option.append(input, label);
+            options.appendChild(option);
+        });
+
+        body.append(title, options);
+        card.append(header, body);
+        container.appendChild(card);
+    });
+}
+
 // Keyboard navigation for quiz
 document.addEventListener('keydown', function (e) {
     if (typeof currentQuestionIndex !== 'undefined') {
@@ -125,6 +181,14 @@ document.addEventListener('DOMContentLoaded', function () {
     }
 });
 
+// The service worker (templates/service_worker.js) caches the quiz page and
+// assets and sends queued answers when the connection comes back
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', () => {
+        navigator.serviceWorker.register('/service-worker.js').catch(() => null);
+    });
+}
+
 // Smooth scrolling for navigation
 function smoothScroll(target) {
     document.querySelector(target).scrollIntoView({
@@ -0,0 +1,148 @@
+"""Delivery of static assets and study materials.
+
+Files under static/css and static/js are read, fingerprinted and compressed
+once when the app starts.  ``url_for('static', ...)`` adds the content hash
+as a ``v`` query parameter, and such URLs are served with a one-year
+``immutable`` Cache-Control header in the best encoding the client accepts:
+brotli when the optional ``brotli`` package is installed, then gzip.
+
+Study materials in files/ are served by ``send_from_directory``, which
+already answers conditional and Range requests, so PDF viewers can fetch
+them piece by piece.  ``DirectoryListing`` caches the list of those files
+until the directory's mtime changes.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is used without it
+    brotli = None
+
+FINGERPRINTED_DIRS = ("css", "js")
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class Asset:
+    """One static file with its content hash and precompressed variants"""
+
+    def __init__(self, data, mimetype):
+        self.digest = hashlib.sha256(data).hexdigest()[:12]
+        self.mimetype = mimetype
+        self.variants = {"identity": data}
+        if brotli is not None:
+            self._add_variant("br", brotli.compress(data))
+        self._add_variant("gzip", gzip.compress(data, compresslevel=9, mtime=0))
+
+    def _add_variant(self, encoding, compressed):
+        if len(compressed) < len(self.variants["identity"]):
+            self.variants[encoding] = compressed
+
+    def choose_encoding(self, accept_encodings):
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accept_encodings[encoding] > 0:
+                return encoding
+        return "identity"
+
+
+class StaticAssets:
+    def __init__(self, app=None):
+        self.assets = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.assets = self.build(app.static_folder)
+        app.view_functions["static"] = self.serve
+        app.url_defaults(self._add_fingerprint)
+
+    def build(self, static_folder):
+        """Read and compress every fingerprinted file"""
+        assets = {}
+        for directory in FINGERPRINTED_DIRS:
+            for dirpath, _, filenames in os.walk(os.path.join(static_folder, directory)):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+                    filename = os.path.relpath(path, static_folder).replace(os.sep, "/")
+                    assets[filename] = Asset(data, mimetype)
+        return assets
+
+    def version(self):
+        """Hash over every asset, which changes whenever one of them does"""
+        digest = hashlib.sha256()
+        for filename in sorted(self.assets):
+            digest.update(f"{filename}:{self.assets[filename].digest}\n".encode("utf-8"))
+        return digest.hexdigest()[:12]
+
+    def _add_fingerprint(self, endpoint, values):
+        if endpoint != "static" or current_app.debug:
+            return
+        asset = self.assets.get(values.get("filename"))
+        if asset is not None:
+            values.setdefault("v", asset.digest)
+
+    def serve(self, filename):
+        asset = self.assets.get(filename)
+        # In debug mode files are read from disk so that edits show up
+        if asset is None or current_app.debug:
+            return current_app.send_static_file(filename)
+
+        encoding = asset.choose_encoding(request.accept_encodings)
+        response = current_app.response_class(asset.variants[encoding], mimetype=asset.mimetype)
+        response.vary.add("Accept-Encoding")
+        if encoding == "identity":
+            response.set_etag(asset.digest)
+        else:
+            response.headers["Content-Encoding"] = encoding
+            response.set_etag(f"{asset.digest}-{encoding}")
+
+        if request.args.get("v") == asset.digest:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+static_assets = StaticAssets()
+
+
+class DirectoryListing:
+    """Sorted names of the files in a directory, re-read when its mtime changes"""
+
+    def __init__(self, path):
+        self.path = path
+        self._cached = None
+
+    def files(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        cached = self._cached
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with os.scandir(self.path) as entries:
+            files = sorted(entry.name for entry in entries if entry.is_file())
+        self._cached = (mtime, files)
+        return files
+
+
+def send_study_file(directory, filename, as_attachment, max_age):
+    """Send a file with ETag, Last-Modified and byte-range support"""
+    response = send_from_directory(
+        directory, filename, as_attachment=as_attachment, max_age=max_age
+    )
+    # Only reachable after login, so shared caches must not keep it
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
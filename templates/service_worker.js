@@ -0,0 +1,135 @@
+// Service worker of the quiz application, served from /service-worker.js so
+// that it controls every page. Rendered by the app: the asset list and the
+// version change whenever a file under static/ changes.
+//
+// - Fingerprinted static files and the CDN libraries are precached.
+// - The quiz page, the dashboard and the quiz questions are fetched from the
+//   network and the last copy is kept, so an open quiz can be reloaded while
+//   offline. /quiz is never prefetched, since requesting it can start a quiz.
+// - Queued answers (answer_queue.js) are sent when the browser reports that
+//   the connection is back.
+importScripts({{ answer_queue_url|tojson }});
+
+const VERSION = {{ version|tojson }};
+const STATIC_CACHE = `static-${VERSION}`;
+const CDN_CACHE = 'cdn-v1';
+const PAGES_CACHE = 'pages-v1';
+const PRECACHE_URLS = {{ precache_urls|tojson }};
+// The libraries loaded by base.html
+const CDN_URLS = [
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap-icons@1.11.1/font/bootstrap-icons.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/js/bootstrap.bundle.min.js',
+    'https://cdn.jsdelivr.net/npm/chart.js',
+];
+const CDN_ORIGIN = 'https://cdn.jsdelivr.net';
+const OFFLINE_PAGES = ['/quiz', '/dashboard'];
+const SYNC_TAG = 'flush-answers';
+
+self.addEventListener('install', event => {
+    event.waitUntil(Promise.all([
+        caches.open(STATIC_CACHE).then(cache => cache.addAll(PRECACHE_URLS)),
+        // The CDN being unreachable must not stop the installation
+        caches.open(CDN_CACHE).then(cache => Promise.all(
+            CDN_URLS.map(url => cache.add(url).catch(() => null))
+        )),
+    ]).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+    const current = [STATIC_CACHE, CDN_CACHE, PAGES_CACHE];
+    event.waitUntil(
+        caches.keys()
+            .then(names => Promise.all(
+                names.filter(name => !current.includes(name)).map(name => caches.delete(name))
+            ))
+            .then(() => self.clients.claim())
+    );
+});
+
+// Serve from the cache, fetching and storing on a miss
+function cacheFirst(cacheName, request) {
+    return caches.open(cacheName).then(cache => cache.match(request).then(cached => {
+        if (cached) {
+            return cached;
+        }
+        return fetch(request).then(response => {
+            if (response.ok) {
+                cache.put(request, response.clone());
+            }
+            return response;
+        });
+    }));
+}
+
+// Serve from the cache if possible and refresh it in the background
+function staleWhileRevalidate(cacheName, event) {
+    return caches.open(cacheName).then(cache => cache.match(event.request).then(cached => {
+        const fetched = fetch(event.request).then(response => {
+            if (response.ok) {
+                cache.put(event.request, response.clone());
+            }
+            return response;
+        });
+        if (cached) {
+            event.waitUntil(fetched.catch(() => null));
+            return cached;
+        }
+        return fetched;
+    }));
+}
+
+// Fetch from the network and keep a copy for when it is unreachable
+function networkFirst(cacheName, request) {
+    return fetch(request)
+        .then(response => {
+            // Redirects (to the login page or the results) are not kept
+            if (response.ok && !response.redirected) {
+                const copy = response.clone();
+                caches.open(cacheName).then(cache => cache.put(request, copy));
+            }
+            return response;
+        })
+        .catch(error => caches.match(request, { cacheName: cacheName }).then(cached => {
+            if (cached) {
+                return cached;
+            }
+            throw error;
+        }));
+}
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') {
+        return;
+    }
+    const url = new URL(request.url);
+
+    if (url.origin === CDN_ORIGIN) {
+        event.respondWith(staleWhileRevalidate(CDN_CACHE, event));
+        return;
+    }
+    if (url.origin !== self.location.origin) {
+        return;
+    }
+
+    if (url.pathname === '/logout') {
+        // Cached pages belong to the user who is logging out
+        event.respondWith(caches.delete(PAGES_CACHE).then(() => fetch(request)));
+    } else if (url.pathname.startsWith('/static/')) {
+        // Fingerprinted URLs never change; others are revalidated
+        event.respondWith(url.searchParams.has('v')
+            ? cacheFirst(STATIC_CACHE, request)
+            : networkFirst(STATIC_CACHE, request));
+    } else if (OFFLINE_PAGES.includes(url.pathname) || url.pathname.startsWith('/api/quiz/')) {
+        event.respondWith(networkFirst(PAGES_CACHE, request));
+    }
+});
+
+// Background Sync: fired once the connection is back, and retried by the
+// browser for as long as the flush fails
+self.addEventListener('sync', event => {
+    if (event.tag === SYNC_TAG) {
+        event.waitUntil(answerQueue.flush());
+    }
+});
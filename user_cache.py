@@ -0,0 +1,114 @@
+"""Process-local cache of the users that Flask-Login loads on every request.
+
+Every authenticated request, including each ``/submit_answer`` call of a
+quiz, used to read the user's row to rebuild ``current_user``.  The loader
+now returns a small read-only ``CachedUser`` (id, username, is_superuser)
+kept in an LRU cache with a time to live.
+
+Entries are versioned through the single ``UserCacheVersion`` row, the way
+the question bank uses ``QuestionBankVersion``.  Deleting a user or changing
+their rights bumps it with ``mark_users_changed`` in the same transaction,
+and every worker checks it on each lookup, so a deleted user or a demoted
+admin is reloaded everywhere on their next request.  Reading the one-row
+counter by primary key is cheaper than rebuilding the user.  Entries also
+expire after ``USER_CACHE_TTL`` seconds, for changes made outside the app.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from flask_login import UserMixin
+
+from models import db, User, UserCacheVersion, UserStats
+
+VERSION_ROW_ID = 1
+
+
+class CachedUser(UserMixin):
+    """Detached, read-only stand-in for ``User`` as ``current_user``"""
+
+    def __init__(self, id, username, is_superuser, version, expires_at):
+        self.id = id
+        self.username = username
+        self.is_superuser = bool(is_superuser)
+        self.version = version
+        self.expires_at = expires_at
+
+    def get_statistics(self):
+        return UserStats.for_user(self.id).to_dict()
+
+
+def current_version():
+    version = db.session.execute(
+        db.select(UserCacheVersion.version).where(UserCacheVersion.id == VERSION_ROW_ID)
+    ).scalar()
+    return version or 0
+
+
+def mark_users_changed():
+    """Bump the user cache version in the current transaction.
+
+    Call this when a user is deleted or their rights change, before
+    ``db.session.commit()``, so that every process reloads its cached users.
+    """
+    state = db.session.get(UserCacheVersion, VERSION_ROW_ID)
+    if state is None:
+        db.session.add(UserCacheVersion(id=VERSION_ROW_ID, version=1))
+    else:
+        state.version = UserCacheVersion.version + 1
+
+
+class UserCache:
+    """LRU cache of ``CachedUser`` records with a time to live"""
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def init_app(self, app):
+        self.max_size = app.config["USER_CACHE_SIZE"]
+        self.ttl = app.config["USER_CACHE_TTL"]
+
+    def get(self, user_id):
+        """The cached user, reloaded when missing, expired or of an older version"""
+        version = current_version()
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+        if (
+            user is not None
+            and user.version == version
+            and user.expires_at > time.monotonic()
+        ):
+            return user
+
+        row = db.session.execute(
+            db.select(User.id, User.username, User.is_superuser).where(User.id == user_id)
+        ).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+        return self.remember(*row, version)
+
+    def remember(self, user_id, username, is_superuser, version):
+        user = CachedUser(user_id, username, is_superuser, version, time.monotonic() + self.ttl)
+        with self._lock:
+            self._users[user_id] = user
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()